@@ -8,6 +8,8 @@ This module needs to be imported in the main ETL script.
 # The src and stg tables are DROPPED and RECREATED as they will be loaded from scratch everytime
 # The core tables are not dropped everytime. They are created only if they are not present already.
 # This ensures that the data in the warehouse is never purged/deleted
+# The accident/trip src tables are dropped with CASCADE, which drops the stg views on them (stage view mode);
+# the views are recreated with the stg tables
 
 CREATE_TABLE_SRC_AIRPORT_CODES_SQL = '''
 DROP TABLE IF EXISTS "SRC_DB".stg_src_airport_codes;
@@ -19,7 +21,7 @@ PRIMARY KEY(ID));
 '''
 
 CREATE_TABLE_SRC_US_ACCIDENTS_SQL = '''
-DROP TABLE IF EXISTS "SRC_DB".stg_src_us_accidents;
+DROP TABLE IF EXISTS "SRC_DB".stg_src_us_accidents CASCADE;
 CREATE TABLE "SRC_DB".stg_src_us_accidents (
 ID VARCHAR(10),
 Source VARCHAR(15),
@@ -74,7 +76,7 @@ PRIMARY KEY(ID));
 '''
 
 CREATE_TABLE_SRC_DC_TAXI_TRIPS_SQL = '''
-DROP TABLE IF EXISTS "SRC_DB".stg_src_dc_taxi_trips;
+DROP TABLE IF EXISTS "SRC_DB".stg_src_dc_taxi_trips CASCADE;
 CREATE TABLE "SRC_DB".stg_src_dc_taxi_trips (
 Type VARCHAR(100),
 ProviderName VARCHAR(100),
@@ -114,6 +116,24 @@ PRIMARY KEY(ID));
 
 # Section for Create table SQLs for Stage tables
 
+# Normalized natural key of an address (city, state and zipcode columns parameterized) as a fixed width hash:
+# nulls as '', zipcode cut to 5 digits like stg_address, parts separated by a control character.
+# It is a stored generated column of stg_address/dim_address and of the stg accident/trip rows, so it is computed once
+# when the row is written, and every address lookup is one equality probe on the unique index of dim_address
+ADDRESS_KEY_SQL = "MD5(COALESCE({city},'')::TEXT || CHR(31) || COALESCE({state},'')::TEXT || CHR(31) || SUBSTR(COALESCE({zipcode},''),1,5)::TEXT)::UUID"
+
+# Drop a stg table or view (table parameterized), as the stg accident/trip tables are views in stage view mode
+# and DROP TABLE/DROP VIEW fail on the other kind of relation
+DROP_STAGE_RELATION_SQL = '''
+DO $$
+BEGIN
+IF TO_REGCLASS('{table}') IS NOT NULL THEN
+EXECUTE (SELECT CASE WHEN relkind = 'v' THEN 'DROP VIEW ' ELSE 'DROP TABLE ' END || '{table}'
+FROM pg_class WHERE oid = TO_REGCLASS('{table}'));
+END IF;
+END $$;
+'''
+
 CREATE_TABLE_STG_ADDRESS_SQL = '''
 DROP TABLE IF EXISTS "STG_DB".stg_address;
 CREATE TABLE "STG_DB".stg_address (
@@ -124,8 +144,9 @@ Create_TS TIMESTAMP,
 Create_User VARCHAR(10),
 Last_Updt_TS TIMESTAMP,
 Last_Updt_User VARCHAR(10),
+Address_Key UUID GENERATED ALWAYS AS ({address_key}) STORED,
 PRIMARY KEY(City, State, Zipcode));
-'''
+'''.format(address_key=ADDRESS_KEY_SQL.format(city='City', state='State', zipcode='Zipcode'))
 
 CREATE_TABLE_STG_ACCIDENT_CONDITION_SQL = '''
 DROP TABLE IF EXISTS "STG_DB".stg_accident_condition;
@@ -202,8 +223,7 @@ Last_Updt_User VARCHAR(10),
 PRIMARY KEY(Source_Name));
 '''
 
-CREATE_TABLE_STG_ACCIDENT_SQL = '''
-DROP TABLE IF EXISTS "STG_DB".stg_accident;
+CREATE_TABLE_STG_ACCIDENT_SQL = DROP_STAGE_RELATION_SQL.format(table='"STG_DB".stg_accident') + '''
 CREATE TABLE "STG_DB".stg_accident (
 ID VARCHAR(10),
 Source VARCHAR(15),
@@ -258,11 +278,11 @@ Create_TS TIMESTAMP,
 Create_User VARCHAR(10),
 Last_Updt_TS TIMESTAMP,
 Last_Updt_User VARCHAR(10),
+Address_Key UUID GENERATED ALWAYS AS ({address_key}) STORED,
 PRIMARY KEY(ID));
-'''
+'''.format(address_key=ADDRESS_KEY_SQL.format(city='City', state='State', zipcode='Zipcode'))
 
-CREATE_TABLE_STG_TRIP_SQL = '''
-DROP TABLE IF EXISTS "STG_DB".stg_trip;
+CREATE_TABLE_STG_TRIP_SQL = DROP_STAGE_RELATION_SQL.format(table='"STG_DB".stg_trip') + '''
 CREATE TABLE "STG_DB".stg_trip (
 Type VARCHAR(100),
 ProviderName VARCHAR(100),
@@ -300,12 +320,29 @@ Create_TS TIMESTAMP,
 Create_User VARCHAR(10),
 Last_Updt_TS TIMESTAMP,
 Last_Updt_User VARCHAR(10),
+Origin_Address_Key UUID GENERATED ALWAYS AS ({origin_address_key}) STORED,
+Destination_Address_Key UUID GENERATED ALWAYS AS ({destination_address_key}) STORED,
 PRIMARY KEY(ID));
-'''
+'''.format(origin_address_key=ADDRESS_KEY_SQL.format(city='OriginCity', state='OriginState', zipcode='OriginZip'),
+           destination_address_key=ADDRESS_KEY_SQL.format(city='DestinationCity', state='DestinationState', zipcode='DestinationZip'))
 
 
 # Section for Create table SQLs for LKP/DIM/FACT tables
 
+# Surrogate keys of the dim/lkp/fact tables are handed out by a sequence per table (table name + _sk_seq),
+# so concurrent loaders never collide and the loads do not need to sort their rows to number them.
+# The sequence is created with the table and moved past the largest key already in the table (tables loaded before the sequences existed).
+# CACHE pre-allocates a block of keys per session, and keys.KeyAllocator reserves blocks for Python side loaders.
+CREATE_SK_SEQUENCE_SQL = '''
+CREATE SEQUENCE IF NOT EXISTS "CORE_DB".{table}_sk_seq CACHE 100;
+SELECT SETVAL('"CORE_DB".{table}_sk_seq', MAX({sk}))
+FROM "CORE_DB".{table}
+HAVING MAX({sk}) >= (SELECT CASE WHEN is_called THEN last_value ELSE last_value - 1 END FROM "CORE_DB".{table}_sk_seq);
+'''
+
+# Every dim/lkp/fact table has a unique index on its natural key, which the loads upsert against (INSERT ... ON CONFLICT),
+# so finding the rows already loaded costs an index probe per incoming row instead of a join with the whole table.
+# Natural keys which can be NULL are indexed as COALESCE(key,''), the way the loads and the fact lookups compare them
 CREATE_TABLE_DIM_DATE_SQL = '''
 CREATE TABLE IF NOT EXISTS "CORE_DB".dim_date (
 Date_SK INTEGER,
@@ -325,6 +362,13 @@ Create_User VARCHAR(10),
 Last_Updt_TS TIMESTAMP,
 Last_Updt_User VARCHAR(10),
 PRIMARY KEY(Date_SK));
+CREATE UNIQUE INDEX IF NOT EXISTS idx_dim_date_nat_key ON "CORE_DB".dim_date (Date_DT);
+
+-- date key (yyyymmdd) of a date/timestamp in integer arithmetic; used by the dim_date generator and the fact loads alike,
+-- so a fact date key always matches the dim_date key. IMMUTABLE SQL functions are inlined by the planner
+CREATE OR REPLACE FUNCTION "CORE_DB".date_sk(ts TIMESTAMP) RETURNS INTEGER AS $$
+SELECT CAST(DATE_PART('YEAR',ts) * 10000 + DATE_PART('MONTH',ts) * 100 + DATE_PART('DAY',ts) AS INTEGER)
+$$ LANGUAGE SQL IMMUTABLE;
 '''
 
 CREATE_TABLE_DIM_TIME_SQL = '''
@@ -340,6 +384,13 @@ Create_User VARCHAR(10),
 Last_Updt_TS TIMESTAMP,
 Last_Updt_User VARCHAR(10),
 PRIMARY KEY(Time_SK));
+CREATE UNIQUE INDEX IF NOT EXISTS idx_dim_time_nat_key ON "CORE_DB".dim_time (Time_Desc);
+
+-- time key (seconds since midnight, fractions of a second truncated) of a timestamp in integer arithmetic;
+-- dim_time has one row per second of the day keyed the same way (Time_Desc = HH24:MI:SS of the key)
+CREATE OR REPLACE FUNCTION "CORE_DB".time_sk(ts TIMESTAMP) RETURNS INTEGER AS $$
+SELECT CAST(DATE_PART('HOUR',ts) * 3600 + DATE_PART('MINUTE',ts) * 60 + FLOOR(DATE_PART('SECOND',ts)) AS INTEGER)
+$$ LANGUAGE SQL IMMUTABLE;
 '''
 
 
@@ -353,8 +404,13 @@ Create_TS TIMESTAMP,
 Create_User VARCHAR(10),
 Last_Updt_TS TIMESTAMP,
 Last_Updt_User VARCHAR(10),
+Address_Key UUID GENERATED ALWAYS AS ({address_key}) STORED,
 PRIMARY KEY(Address_SK));
-'''
+-- tables created before the address key existed
+ALTER TABLE "CORE_DB".dim_address ADD COLUMN IF NOT EXISTS Address_Key UUID GENERATED ALWAYS AS ({address_key}) STORED;
+CREATE UNIQUE INDEX IF NOT EXISTS idx_dim_address_key ON "CORE_DB".dim_address (Address_Key);
+'''.format(address_key=ADDRESS_KEY_SQL.format(city='City', state='State', zipcode='Zipcode')) \
+    + CREATE_SK_SEQUENCE_SQL.format(table='dim_address', sk='Address_SK')
 
 
 CREATE_TABLE_DIM_ACC_COND_SQL = '''
@@ -382,7 +438,8 @@ Create_User VARCHAR(10),
 Last_Updt_TS TIMESTAMP,
 Last_Updt_User VARCHAR(10),
 PRIMARY KEY(Acc_Cond_SK));
-'''
+CREATE UNIQUE INDEX IF NOT EXISTS idx_dim_acc_cond_nat_key ON "CORE_DB".dim_acc_cond (Amenity, Bump, Crossing, Give_Way, Junction, No_Exit, Railway, Roundabout, Station, Stop, Traffic_Calming, Traffic_Signal, Turning_Loop, Sunrise_Sunset, Civil_Twilight, Nautical_Twilight, Astronomical_Twilight);
+''' + CREATE_SK_SEQUENCE_SQL.format(table='dim_acc_cond', sk='Acc_Cond_SK')
 
 
 CREATE_TABLE_DIM_AIRPORT_SQL = '''
@@ -396,7 +453,8 @@ Create_User VARCHAR(10),
 Last_Updt_TS TIMESTAMP,
 Last_Updt_User VARCHAR(10),
 PRIMARY KEY(Airport_SK));
-'''
+CREATE UNIQUE INDEX IF NOT EXISTS idx_dim_airport_nat_key ON "CORE_DB".dim_airport ((COALESCE(ID,'')));
+''' + CREATE_SK_SEQUENCE_SQL.format(table='dim_airport', sk='Airport_SK')
 
 CREATE_TABLE_DIM_WTHR_COND_SQL = '''
 CREATE TABLE IF NOT EXISTS "CORE_DB".dim_wthr_cond (
@@ -408,7 +466,8 @@ Create_User VARCHAR(10),
 Last_Updt_TS TIMESTAMP,
 Last_Updt_User VARCHAR(10),
 PRIMARY KEY(Weather_Cond_SK));
-'''
+CREATE UNIQUE INDEX IF NOT EXISTS idx_dim_wthr_cond_nat_key ON "CORE_DB".dim_wthr_cond (Wind_Direction, Weather_Condition);
+''' + CREATE_SK_SEQUENCE_SQL.format(table='dim_wthr_cond', sk='Weather_Cond_SK')
 
 CREATE_TABLE_LKP_PROVIDER_SQL = '''
 CREATE TABLE IF NOT EXISTS "CORE_DB".lkp_provider (
@@ -419,7 +478,8 @@ Create_User VARCHAR(10),
 Last_Updt_TS TIMESTAMP,
 Last_Updt_User VARCHAR(10),
 PRIMARY KEY(Provider_SK));
-'''
+CREATE UNIQUE INDEX IF NOT EXISTS idx_lkp_provider_nat_key ON "CORE_DB".lkp_provider (Provider_Name);
+''' + CREATE_SK_SEQUENCE_SQL.format(table='lkp_provider', sk='Provider_SK')
 
 CREATE_TABLE_LKP_SOURCE_SQL = '''
 CREATE TABLE IF NOT EXISTS "CORE_DB".lkp_source (
@@ -430,10 +490,27 @@ Create_User VARCHAR(10),
 Last_Updt_TS TIMESTAMP,
 Last_Updt_User VARCHAR(10),
 PRIMARY KEY(Source_SK));
+CREATE UNIQUE INDEX IF NOT EXISTS idx_lkp_source_nat_key ON "CORE_DB".lkp_source ((COALESCE(Source_Name,'')));
+''' + CREATE_SK_SEQUENCE_SQL.format(table='lkp_source', sk='Source_SK')
+
+
+# The fact tables are range partitioned by their start date key (yyyymmdd), one partition per period (see partitions module).
+# The partitions are created by the loads as they need them; the default partition holds the facts without a start date (-1).
+# A unique index of a partitioned table has to include the partition key, so the natural key index is (ID, Start_Date_FK).
+# A fact table created before the partitioning is renamed (with its primary key and index) to <table>_unpartitioned,
+# and its rows are moved into the partitions by the next load
+RENAME_UNPARTITIONED_FACT_SQL = '''
+DO $$
+BEGIN
+IF (SELECT relkind FROM pg_class WHERE oid = TO_REGCLASS('"CORE_DB".{table}')) = 'r' THEN
+ALTER TABLE "CORE_DB".{table} RENAME CONSTRAINT {table}_pkey TO {table}_unpartitioned_pkey;
+ALTER INDEX IF EXISTS "CORE_DB".{index} RENAME TO {index}_unpartitioned;
+ALTER TABLE "CORE_DB".{table} RENAME TO {table}_unpartitioned;
+END IF;
+END $$;
 '''
 
-
-CREATE_TABLE_FACT_ACCIDENT_SQL = '''
+CREATE_TABLE_FACT_ACCIDENT_SQL = RENAME_UNPARTITIONED_FACT_SQL.format(table='fact_accident', index='idx_AccidentID') + '''
 CREATE TABLE IF NOT EXISTS "CORE_DB".fact_accident (
 Accident_SK INTEGER,
 Source_FK INTEGER,
@@ -471,11 +548,16 @@ Create_TS TIMESTAMP,
 Create_User VARCHAR(10),
 Last_Updt_TS TIMESTAMP,
 Last_Updt_User VARCHAR(10),
-PRIMARY KEY(Accident_SK));
-'''
+PRIMARY KEY(Accident_SK, Start_Date_FK))
+PARTITION BY RANGE (Start_Date_FK);
+CREATE TABLE IF NOT EXISTS "CORE_DB".fact_accident_default PARTITION OF "CORE_DB".fact_accident DEFAULT;
+CREATE UNIQUE INDEX IF NOT EXISTS idx_fact_accident_nat_key ON "CORE_DB".fact_accident (Accident_ID, Start_Date_FK);
+-- superseded by the natural key index
+DROP INDEX IF EXISTS "CORE_DB".idx_AccidentID;
+''' + CREATE_SK_SEQUENCE_SQL.format(table='fact_accident', sk='Accident_SK')
 
 
-CREATE_TABLE_FACT_TRIP_SQL = '''
+CREATE_TABLE_FACT_TRIP_SQL = RENAME_UNPARTITIONED_FACT_SQL.format(table='fact_trip', index='idx_TripID') + '''
 CREATE TABLE IF NOT EXISTS "CORE_DB".fact_trip (
 Trip_SK INTEGER,
 Provider_FK INTEGER,
@@ -510,19 +592,243 @@ Create_TS TIMESTAMP,
 Create_User VARCHAR(10),
 Last_Updt_TS TIMESTAMP,
 Last_Updt_User VARCHAR(10),
-PRIMARY KEY(Trip_SK));
+PRIMARY KEY(Trip_SK, Start_Date_FK))
+PARTITION BY RANGE (Start_Date_FK);
+CREATE TABLE IF NOT EXISTS "CORE_DB".fact_trip_default PARTITION OF "CORE_DB".fact_trip DEFAULT;
+CREATE UNIQUE INDEX IF NOT EXISTS idx_fact_trip_nat_key ON "CORE_DB".fact_trip (Trip_ID, Start_Date_FK);
+-- superseded by the natural key index
+DROP INDEX IF EXISTS "CORE_DB".idx_TripID;
+''' + CREATE_SK_SEQUENCE_SQL.format(table='fact_trip', sk='Trip_SK')
+
+# Control table with the high watermark of each incrementally loaded source:
+# the max start timestamp loaded into the facts, and the IDs loaded at exactly that timestamp
+CREATE_TABLE_ETL_WATERMARK_SQL = '''
+CREATE TABLE IF NOT EXISTS "CORE_DB".etl_watermark (
+Source_Name VARCHAR(100),
+Watermark_TS TIMESTAMP,
+Boundary_IDs VARCHAR(100)[],
+Create_TS TIMESTAMP,
+Create_User VARCHAR(10),
+Last_Updt_TS TIMESTAMP,
+Last_Updt_User VARCHAR(10),
+PRIMARY KEY(Source_Name));
 '''
 
+# Control table with the progress of each chunked fact load: the run loading it, the upper key of the last committed chunk,
+# the chunks and rows committed so far, and whether the load completed
+CREATE_TABLE_ETL_CHECKPOINT_SQL = '''
+CREATE TABLE IF NOT EXISTS "CORE_DB".etl_checkpoint (
+Load_Name VARCHAR(100),
+Run_ID VARCHAR(250),
+Last_Key VARCHAR(100),
+Chunks INTEGER,
+Rows_Loaded BIGINT,
+Completed BOOLEAN,
+Create_TS TIMESTAMP,
+Create_User VARCHAR(10),
+Last_Updt_TS TIMESTAMP,
+Last_Updt_User VARCHAR(10),
+PRIMARY KEY(Load_Name));
+'''
 
-# Section for COPY statements to load Source tables from source .csv files (tablename and file name parameterized)
+# Control table with the checksum of the DDL last applied to each core table (see schema_deploy module),
+# so a deployment only runs the DDL which changed since
+CREATE_TABLE_ETL_SCHEMA_VERSION_SQL = '''
+CREATE TABLE IF NOT EXISTS "CORE_DB".etl_schema_version (
+Object_Name VARCHAR(100),
+DDL_Checksum VARCHAR(32),
+Create_TS TIMESTAMP,
+Create_User VARCHAR(10),
+Last_Updt_TS TIMESTAMP,
+Last_Updt_User VARCHAR(10),
+PRIMARY KEY(Object_Name));
+'''
+
+
+# Section for Create view SQLs for Stage tables (stage view mode)
+# The stg accident/trip tables are then views over the src tables instead of a copy of every row of them.
+# The views have the columns of the stg tables: the audit columns are filled in when the view is read, i.e. during the fact load,
+# and the address keys are computed on read. The filter (parameterized) limits the rows, e.g. to those past the high watermark
+
+STG_ACCIDENT_VIEW_SQL = DROP_STAGE_RELATION_SQL.format(table='"STG_DB".stg_accident') + '''
+CREATE VIEW "STG_DB".stg_accident AS
+SELECT
+src.id,
+src.source,
+src.tmc,
+src.severity,
+src.start_time,
+src.end_time,
+src.start_lat,
+src.start_lng,
+src.end_lat,
+src.end_lng,
+src.distance_mi,
+src.description,
+src.number,
+src.street,
+src.side,
+src.city,
+src.county,
+src.state,
+src.zipcode,
+src.country,
+src.timezone,
+src.airport_code,
+src.weather_timestamp,
+src.temperature_f,
+src.wind_chill_f,
+src.humidity_pct,
+src.pressure_in,
+src.visibility_mi,
+src.wind_direction,
+src.wind_speed_mph,
+src.precipitation_in,
+src.weather_condition,
+src.amenity,
+src.bump,
+src.crossing,
+src.give_way,
+src.junction,
+src.no_exit,
+src.railway,
+src.roundabout,
+src.station,
+src.stop,
+src.traffic_calming,
+src.traffic_signal,
+src.turning_loop,
+src.sunrise_sunset,
+src.civil_twilight,
+src.nautical_twilight,
+src.astronomical_twilight,
+CAST(CURRENT_TIMESTAMP AS TIMESTAMP) Create_TS,
+CAST('ETL_USR' AS VARCHAR(10)) Create_User,
+CAST(CURRENT_TIMESTAMP AS TIMESTAMP) Last_Updt_TS,
+CAST('ETL_USR' AS VARCHAR(10)) Last_Updt_User,
+{address_key} Address_Key
+FROM "SRC_DB".stg_src_us_accidents src
+{filter};
+'''
+
+STG_TRIP_VIEW_SQL = DROP_STAGE_RELATION_SQL.format(table='"STG_DB".stg_trip') + '''
+CREATE VIEW "STG_DB".stg_trip AS
+SELECT
+src.type,
+src.providername,
+src.startdatetime,
+src.datecreated,
+src.id,
+src.externalid,
+src.fareamount,
+src.gratuityamount,
+src.surchargeamount,
+src.extrafareamount,
+src.tollamount,
+src.totalamount,
+src.paymenttype,
+src.startdatetime1,
+src.enddatetime,
+src.originstreetnumber,
+src.originstreetname,
+src.origincity,
+src.originstate,
+src.originzip,
+src.originlatitude,
+src.originlongitude,
+src.destinationstreetnumber,
+src.destinationstreetname,
+src.destinationcity,
+src.destinationstate,
+src.destinationzip,
+src.destinationlatitude,
+src.destinationlongitude,
+src.milage,
+src.duration,
+src.misc,
+CAST(CURRENT_TIMESTAMP AS TIMESTAMP) Create_TS,
+CAST('ETL_USR' AS VARCHAR(10)) Create_User,
+CAST(CURRENT_TIMESTAMP AS TIMESTAMP) Last_Updt_TS,
+CAST('ETL_USR' AS VARCHAR(10)) Last_Updt_User,
+{origin_address_key} Origin_Address_Key,
+{destination_address_key} Destination_Address_Key
+FROM "SRC_DB".stg_src_dc_taxi_trips src
+{filter};
+'''
+
+CREATE_VIEW_STG_ACCIDENT_SQL = STG_ACCIDENT_VIEW_SQL.format(
+    address_key=ADDRESS_KEY_SQL.format(city='src.City', state='src.State', zipcode='src.Zipcode'), filter='')
+
+CREATE_VIEW_STG_TRIP_SQL = STG_TRIP_VIEW_SQL.format(
+    origin_address_key=ADDRESS_KEY_SQL.format(city='src.OriginCity', state='src.OriginState', zipcode='src.OriginZip'),
+    destination_address_key=ADDRESS_KEY_SQL.format(city='src.DestinationCity', state='src.DestinationState', zipcode='src.DestinationZip'),
+    filter='')
+
+# Incremental mode: the views show only the rows past the high watermark of the source, like INSERT_STG_ACCIDENT_INCR_SQL/INSERT_STG_TRIP_INCR_SQL
+# (the watermark table is created first, in case the stg views are created before the core tables are deployed)
+
+CREATE_VIEW_STG_ACCIDENT_INCR_SQL = CREATE_TABLE_ETL_WATERMARK_SQL + STG_ACCIDENT_VIEW_SQL.format(
+    address_key=ADDRESS_KEY_SQL.format(city='src.City', state='src.State', zipcode='src.Zipcode'),
+    filter='''LEFT OUTER JOIN "CORE_DB".etl_watermark wm
+ON wm.Source_Name = 'us_accidents'
+WHERE wm.Source_Name IS NULL
+OR src.Start_Time IS NULL
+OR src.Start_Time > wm.Watermark_TS
+OR (src.Start_Time = wm.Watermark_TS AND NOT src.ID = ANY(wm.Boundary_IDs))''')
+
+CREATE_VIEW_STG_TRIP_INCR_SQL = CREATE_TABLE_ETL_WATERMARK_SQL + STG_TRIP_VIEW_SQL.format(
+    origin_address_key=ADDRESS_KEY_SQL.format(city='src.OriginCity', state='src.OriginState', zipcode='src.OriginZip'),
+    destination_address_key=ADDRESS_KEY_SQL.format(city='src.DestinationCity', state='src.DestinationState', zipcode='src.DestinationZip'),
+    filter='''LEFT OUTER JOIN "CORE_DB".etl_watermark wm
+ON wm.Source_Name = 'dc_taxi_trips'
+WHERE wm.Source_Name IS NULL
+OR src.StartDateTime IS NULL
+OR src.StartDateTime > wm.Watermark_TS
+OR (src.StartDateTime = wm.Watermark_TS AND NOT src.ID = ANY(wm.Boundary_IDs))''')
+
+
+# Section for COPY statements to load Source tables from source .csv files (tablename parameterized)
+# The file is streamed from the airflow worker (see loaders module), so the postgres server does not need access to it
 
 COPY_SQL = """
 COPY {}
-FROM '{}'
+FROM STDIN
 CSV HEADER
 DELIMITER ','
 """
 
+# Used for the byte ranges of a partitioned load; only the first range holds the header, which the loader skips itself
+COPY_PARTITION_SQL = """
+COPY {}
+FROM STDIN
+CSV
+DELIMITER ','
+"""
+
+TRUNCATE_TABLE_SQL = """
+TRUNCATE TABLE {}
+"""
+
+# Used by a partitioned load, which loads the byte ranges without the primary key and adds it back after the load
+PRIMARY_KEY_CONSTRAINT_SQL = """
+SELECT conname, pg_get_constraintdef(oid) FROM pg_constraint WHERE conrelid = TO_REGCLASS('{}') AND contype = 'p'
+"""
+
+DROP_CONSTRAINT_SQL = """
+ALTER TABLE {} DROP CONSTRAINT {}
+"""
+
+ADD_CONSTRAINT_SQL = """
+ALTER TABLE {} ADD CONSTRAINT {} {}
+"""
+
+# Used by the bulk load mode; the table must be created or truncated in the same transaction for FREEZE to be allowed
+COPY_FREEZE_SQL = """
+COPY {}
+FROM STDIN
+WITH (FORMAT CSV, HEADER TRUE, DELIMITER ',', FREEZE TRUE)
+"""
+
 
 # Section for INSERT/UPDATE statements to load Stage/Core tables from Source tables (ETL statements)
 
@@ -746,141 +1052,195 @@ FROM "SRC_DB".stg_src_dc_taxi_trips;
 '''
 
 
-# Section for INSERT/UPDATE statements to load Core tables from Stage tables
+# Incremental mode: load only the rows past the high watermark of the source into the stage tables
+# (all rows when the source has no watermark yet; rows without a start timestamp are always passed on)
 
-# Generate and load dates from 1/1/2010 till 12/31/2030
-INSERT_UPDATE_DIM_DATE_SQL = '''
-WITH RECURSIVE GEN_DIM_DATE AS (
+INSERT_STG_ACCIDENT_INCR_SQL = '''
+INSERT INTO "STG_DB".stg_accident
+SELECT 
+src.id,
+src.source,
+src.tmc,
+src.severity,
+src.start_time,
+src.end_time,
+src.start_lat,
+src.start_lng,
+src.end_lat,
+src.end_lng,
+src.distance_mi,
+src.description,
+src.number,
+src.street,
+src.side,
+src.city,
+src.county,
+src.state,
+src.zipcode,
+src.country,
+src.timezone,
+src.airport_code,
+src.weather_timestamp,
+src.temperature_f,
+src.wind_chill_f,
+src.humidity_pct,
+src.pressure_in,
+src.visibility_mi,
+src.wind_direction,
+src.wind_speed_mph,
+src.precipitation_in,
+src.weather_condition,
+src.amenity,
+src.bump,
+src.crossing,
+src.give_way,
+src.junction,
+src.no_exit,
+src.railway,
+src.roundabout,
+src.station,
+src.stop,
+src.traffic_calming,
+src.traffic_signal,
+src.turning_loop,
+src.sunrise_sunset,
+src.civil_twilight,
+src.nautical_twilight,
+src.astronomical_twilight,
+CURRENT_TIMESTAMP,
+'ETL_USR',
+CURRENT_TIMESTAMP,
+'ETL_USR'
+FROM "SRC_DB".stg_src_us_accidents src
+LEFT OUTER JOIN "CORE_DB".etl_watermark wm
+ON wm.Source_Name = 'us_accidents'
+WHERE wm.Source_Name IS NULL
+OR src.Start_Time IS NULL
+OR src.Start_Time > wm.Watermark_TS
+OR (src.Start_Time = wm.Watermark_TS AND NOT src.ID = ANY(wm.Boundary_IDs));
+'''
 
-SELECT
-CAST(TO_CHAR(TO_DATE('01/01/2010','MM/DD/YYYY'),'YYYYMMDD') AS INTEGER) AS Date_SK,
-TO_DATE('01/01/2010','MM/DD/YYYY') AS Date_DT,
-DATE_PART('ISODOW',TO_DATE('01/01/2010','MM/DD/YYYY')) AS DOW_No,
-INITCAP(TO_CHAR(TO_DATE('01/01/2010','MM/DD/YYYY'),'DAY')) AS Day_Name,
-CASE WHEN DATE_PART('ISODOW',TO_DATE('01/01/2010','MM/DD/YYYY')) BETWEEN 6 AND 7 THEN False
-ELSE True 
-END AS Week_Day_Ind,
-DATE_PART('WEEK',TO_DATE('01/01/2010','MM/DD/YYYY')) AS Week_No,
-DATE_PART('MONTH',TO_DATE('01/01/2010','MM/DD/YYYY')) AS Month_No,
-INITCAP(TO_CHAR(TO_DATE('01/01/2010','MM/DD/YYYY'),'MONTH')) AS Month_Name,
-DATE_PART('QUARTER',TO_DATE('01/01/2010','MM/DD/YYYY')) AS Quarter_No,
-'Quarter - ' || DATE_PART('QUARTER',TO_DATE('01/01/2010','MM/DD/YYYY')) AS Quarter_Desc,
-DATE_PART('YEAR',TO_DATE('01/01/2010','MM/DD/YYYY')) AS Year_No,
-CASE WHEN (CAST(DATE_PART('YEAR',TO_DATE('01/01/2010','MM/DD/YYYY')) AS INTEGER) % 4 = 0) 
-AND ((CAST(DATE_PART('YEAR',TO_DATE('01/01/2010','MM/DD/YYYY')) AS INTEGER) % 100 <> 0) 
-	 OR (CAST(DATE_PART('YEAR',TO_DATE('01/01/2010','MM/DD/YYYY')) AS INTEGER) % 400 = 0)) THEN True
-ELSE 'False'
-END AS Leap_Year_Ind,
-CURRENT_TIMESTAMP AS Create_TS,
-'ETL_USR' AS Create_User,
-CURRENT_TIMESTAMP AS Last_Updt_TS,
-'ETL_USR' AS Last_Updt_User
+INSERT_STG_TRIP_INCR_SQL = '''
+INSERT INTO "STG_DB".stg_trip
+SELECT 
+src.type,
+src.providername,
+src.startdatetime,
+src.datecreated,
+src.id,
+src.externalid,
+src.fareamount,
+src.gratuityamount,
+src.surchargeamount,
+src.extrafareamount,
+src.tollamount,
+src.totalamount,
+src.paymenttype,
+src.startdatetime1,
+src.enddatetime,
+src.originstreetnumber,
+src.originstreetname,
+src.origincity,
+src.originstate,
+src.originzip,
+src.originlatitude,
+src.originlongitude,
+src.destinationstreetnumber,
+src.destinationstreetname,
+src.destinationcity,
+src.destinationstate,
+src.destinationzip,
+src.destinationlatitude,
+src.destinationlongitude,
+src.milage,
+src.duration,
+src.misc,
+CURRENT_TIMESTAMP,
+'ETL_USR',
+CURRENT_TIMESTAMP,
+'ETL_USR'
+FROM "SRC_DB".stg_src_dc_taxi_trips src
+LEFT OUTER JOIN "CORE_DB".etl_watermark wm
+ON wm.Source_Name = 'dc_taxi_trips'
+WHERE wm.Source_Name IS NULL
+OR src.StartDateTime IS NULL
+OR src.StartDateTime > wm.Watermark_TS
+OR (src.StartDateTime = wm.Watermark_TS AND NOT src.ID = ANY(wm.Boundary_IDs));
+'''
 
-UNION ALL
 
+# Section for INSERT/UPDATE statements to load Core tables from Stage tables
+
+# Generate dates of a range (start and end date parameterized, 'YYYY-MM-DD') in one set operation with GENERATE_SERIES
+# Only the dates missing in dim_date are inserted (ON CONFLICT on the primary key), so the range can be extended at any time
+GEN_DIM_DATE_SQL = '''
+INSERT INTO "CORE_DB".dim_date
 SELECT
-CAST(TO_CHAR(Date_DT+1,'YYYYMMDD') AS INTEGER) AS Date_SK,
-Date_DT+1 AS Date_DT,
-DATE_PART('ISODOW',Date_DT+1) AS DOW_No,
-INITCAP(TO_CHAR(Date_DT+1,'DAY')) AS Day_Name,
-CASE WHEN DATE_PART('ISODOW',Date_DT+1) BETWEEN 6 AND 7 THEN False
-ELSE True 
+"CORE_DB".date_sk(gen.Date_DT) AS Date_SK,
+gen.Date_DT,
+DATE_PART('ISODOW',gen.Date_DT) AS DOW_No,
+INITCAP(TO_CHAR(gen.Date_DT,'DAY')) AS Day_Name,
+CASE WHEN DATE_PART('ISODOW',gen.Date_DT) BETWEEN 6 AND 7 THEN False
+ELSE True
 END AS Week_Day_Ind,
-DATE_PART('WEEK',Date_DT+1) AS Week_No,
-DATE_PART('MONTH',Date_DT+1) AS Month_No,
-INITCAP(TO_CHAR(Date_DT+1,'MONTH')) AS Month_Name,
-DATE_PART('QUARTER',Date_DT+1) AS Quarter_No,
-'Quarter - ' || DATE_PART('QUARTER',Date_DT+1) AS Quarter_Desc,
-DATE_PART('YEAR',Date_DT+1) AS Year_No,
-CASE WHEN (CAST(DATE_PART('YEAR',Date_DT+1) AS INTEGER) % 4 = 0) 
-AND ((CAST(DATE_PART('YEAR',Date_DT+1) AS INTEGER) % 100 <> 0) 
-	 OR (CAST(DATE_PART('YEAR',Date_DT+1) AS INTEGER) % 400 = 0)) THEN True
-ELSE 'False'
+DATE_PART('WEEK',gen.Date_DT) AS Week_No,
+DATE_PART('MONTH',gen.Date_DT) AS Month_No,
+INITCAP(TO_CHAR(gen.Date_DT,'MONTH')) AS Month_Name,
+DATE_PART('QUARTER',gen.Date_DT) AS Quarter_No,
+'Quarter - ' || DATE_PART('QUARTER',gen.Date_DT) AS Quarter_Desc,
+DATE_PART('YEAR',gen.Date_DT) AS Year_No,
+CASE WHEN (CAST(DATE_PART('YEAR',gen.Date_DT) AS INTEGER) % 4 = 0)
+AND ((CAST(DATE_PART('YEAR',gen.Date_DT) AS INTEGER) % 100 <> 0)
+	 OR (CAST(DATE_PART('YEAR',gen.Date_DT) AS INTEGER) % 400 = 0)) THEN True
+ELSE False
 END AS Leap_Year_Ind,
 CURRENT_TIMESTAMP AS Create_TS,
 'ETL_USR' AS Create_User,
 CURRENT_TIMESTAMP AS Last_Updt_TS,
 'ETL_USR' AS Last_Updt_User
-FROM GEN_DIM_DATE
-WHERE Date_DT < TO_DATE('12/31/2030','MM/DD/YYYY')
-)
-
-INSERT INTO "CORE_DB".dim_date
-SELECT * FROM GEN_DIM_DATE
-WHERE Date_SK NOT IN (
-SELECT Date_SK FROM "CORE_DB".dim_date
-);
+FROM (
+SELECT CAST(GENERATE_SERIES(DATE '{}', DATE '{}', INTERVAL '1 DAY') AS DATE) AS Date_DT
+) gen
+ON CONFLICT (Date_SK) DO NOTHING;
 '''
 
-# Generate and load seconds data from 12 AM to 12 PM (86400 in total)
-INSERT_UPDATE_DIM_TIME_SQL = '''
-WITH RECURSIVE GEN_DIM_TIME AS (
-
-SELECT 
-CURRENT_DATE + INTERVAL '0 SECOND' AS MidNight,
-0 Time_SK,
-0 AS Hour,
-0 AS Minute,
-0 AS Second,
-'00:00:00' Time_Desc,
-'Mid Night' Day_Phase_Desc,
-CURRENT_TIMESTAMP AS Create_TS,
-'ETL_USR' AS Create_User,
-CURRENT_TIMESTAMP AS Last_Updt_TS,
-'ETL_USR' AS Last_Updt_User
-
-UNION ALL
+# Generate and load dates from 1/1/2010 till 12/31/2030
+INSERT_UPDATE_DIM_DATE_SQL = GEN_DIM_DATE_SQL.format('2010-01-01', '2030-12-31')
 
-SELECT 
-MidNight + INTERVAL '1 SECOND' MidNight,
-Time_SK+1 AS Time_SK,
-CAST(DATE_PART('HOUR',MidNight + INTERVAL '1 SECOND') AS INTEGER) AS Hour,
-CAST(DATE_PART('MINUTE',MidNight + INTERVAL '1 SECOND') AS INTEGER) AS Minute,
-CAST(DATE_PART('SECOND',MidNight + INTERVAL '1 SECOND') AS INTEGER) AS Second,
-CASE WHEN CAST(DATE_PART('HOUR',MidNight + INTERVAL '1 SECOND') AS INTEGER) < 10 THEN '0' ELSE '' END ||
-CAST(CAST(DATE_PART('HOUR',MidNight + INTERVAL '1 SECOND') AS INTEGER) AS VARCHAR(2)) || ':' || 
-CASE WHEN CAST(DATE_PART('MINUTE',MidNight + INTERVAL '1 SECOND') AS INTEGER) < 10 THEN '0' ELSE '' END ||
-CAST(CAST(DATE_PART('MINUTE',MidNight + INTERVAL '1 SECOND') AS INTEGER) AS VARCHAR(2)) || ':' || 
-CASE WHEN CAST(DATE_PART('SECOND',MidNight + INTERVAL '1 SECOND') AS INTEGER) < 10 THEN '0' ELSE '' END ||
-CAST(CAST(DATE_PART('SECOND',MidNight + INTERVAL '1 SECOND') AS INTEGER) AS VARCHAR(2)) Time_Desc,
-CASE WHEN CAST(DATE_PART('HOUR',MidNight + INTERVAL '1 SECOND') AS INTEGER) BETWEEN 0 AND 4 THEN 'Mid Night'
-	 WHEN CAST(DATE_PART('HOUR',MidNight + INTERVAL '1 SECOND') AS INTEGER) BETWEEN 5 AND 7 THEN 'Early Morning'
-	 WHEN CAST(DATE_PART('HOUR',MidNight + INTERVAL '1 SECOND') AS INTEGER) BETWEEN 8 AND 11 THEN 'Morning'
-	 WHEN CAST(DATE_PART('HOUR',MidNight + INTERVAL '1 SECOND') AS INTEGER) BETWEEN 12 AND 16 THEN 'Afternoon'
-	 WHEN CAST(DATE_PART('HOUR',MidNight + INTERVAL '1 SECOND') AS INTEGER) BETWEEN 17 AND 19 THEN 'Evening'
-	 WHEN CAST(DATE_PART('HOUR',MidNight + INTERVAL '1 SECOND') AS INTEGER) BETWEEN 20 AND 23 THEN 'Night'
+# Generate the times of a day at a grain (seconds, parameterized) in one set operation with GENERATE_SERIES
+# Time_SK is the number of seconds since midnight; only the times missing in dim_time are inserted (ON CONFLICT on the primary key)
+GEN_DIM_TIME_SQL = '''
+INSERT INTO "CORE_DB".dim_time
+SELECT
+gen.Time_SK,
+gen.Time_SK / 3600 AS Hour,
+gen.Time_SK / 60 % 60 AS Minute,
+gen.Time_SK % 60 AS Second,
+TO_CHAR(TIME '00:00:00' + gen.Time_SK * INTERVAL '1 SECOND','HH24:MI:SS') AS Time_Desc,
+CASE WHEN gen.Time_SK / 3600 BETWEEN 0 AND 4 THEN 'Mid Night'
+	 WHEN gen.Time_SK / 3600 BETWEEN 5 AND 7 THEN 'Early Morning'
+	 WHEN gen.Time_SK / 3600 BETWEEN 8 AND 11 THEN 'Morning'
+	 WHEN gen.Time_SK / 3600 BETWEEN 12 AND 16 THEN 'Afternoon'
+	 WHEN gen.Time_SK / 3600 BETWEEN 17 AND 19 THEN 'Evening'
+	 WHEN gen.Time_SK / 3600 BETWEEN 20 AND 23 THEN 'Night'
 END AS Day_Phase_Desc,
 CURRENT_TIMESTAMP AS Create_TS,
 'ETL_USR' AS Create_User,
 CURRENT_TIMESTAMP AS Last_Updt_TS,
 'ETL_USR' AS Last_Updt_User
-FROM GEN_DIM_TIME
-WHERE Time_SK < 86399
-)
-
-INSERT INTO "CORE_DB".dim_time
-SELECT
-Time_SK,
-Hour,
-Minute,
-Second,
-Time_Desc,
-Day_Phase_Desc,
-Create_TS,
-Create_User,
-Last_Updt_TS,
-Last_Updt_User
-FROM GEN_DIM_TIME
-WHERE Time_SK NOT IN (
-SELECT Time_SK FROM "CORE_DB".dim_time
-);
+FROM GENERATE_SERIES(0, 86399, {}) AS gen(Time_SK)
+ON CONFLICT (Time_SK) DO NOTHING;
 '''
 
+# Generate and load seconds data from 12 AM to 12 PM (86400 in total)
+INSERT_UPDATE_DIM_TIME_SQL = GEN_DIM_TIME_SQL.format(1)
+
+# Dim/lkp loads: upsert the stage rows on the natural key. The NOT EXISTS probe of the natural key index skips the rows
+# already loaded before they draw a surrogate key from the sequence; ON CONFLICT covers the rows loaded concurrently
 INSERT_UPDATE_DIM_ADDRESS_SQL = '''
 INSERT INTO "CORE_DB".dim_address
 SELECT 
-(SELECT COALESCE(MAX(Address_SK),0) MAX_Address_SK FROM "CORE_DB".dim_address) + 
-ROW_NUMBER() OVER(ORDER BY stg.City, stg.State, stg.ZipCode) Address_SK,
+NEXTVAL('"CORE_DB".dim_address_sk_seq') Address_SK,
 stg.City,
 stg.State,
 stg.Zipcode,
@@ -889,18 +1249,17 @@ CURRENT_TIMESTAMP,
 CURRENT_TIMESTAMP,
 'ETL_USR'
 FROM "STG_DB".stg_address stg
-LEFT OUTER JOIN "CORE_DB".dim_address dim_add
-ON COALESCE(stg.City,'') = COALESCE(dim_add.City,'')
-AND COALESCE(stg.State,'') = COALESCE(dim_add.State,'')
-AND COALESCE(stg.Zipcode,'') = COALESCE(dim_add.Zipcode,'')
-WHERE dim_add.Address_SK IS NULL;
+WHERE NOT EXISTS (
+SELECT 1 FROM "CORE_DB".dim_address dim_add
+WHERE dim_add.Address_Key = stg.Address_Key
+)
+ON CONFLICT (Address_Key) DO NOTHING;
 '''
 
 INSERT_UPDATE_DIM_ACC_COND_SQL = '''
 INSERT INTO "CORE_DB".dim_acc_cond
 SELECT 
-(SELECT COALESCE(MAX(Acc_Cond_SK),0) MAX_Acc_Cond_SK FROM "CORE_DB".dim_acc_cond) + 
-ROW_NUMBER() OVER(ORDER BY stg.amenity) Acc_Cond_SK,
+NEXTVAL('"CORE_DB".dim_acc_cond_sk_seq') Acc_Cond_SK,
 stg.amenity,
 stg.bump,
 stg.crossing,
@@ -923,32 +1282,45 @@ CURRENT_TIMESTAMP,
 CURRENT_TIMESTAMP,
 'ETL_USR'
 FROM "STG_DB".stg_accident_condition stg
-LEFT OUTER JOIN "CORE_DB".dim_acc_cond dim
-ON COALESCE(stg.amenity,'False') = COALESCE(dim.amenity,'False')
-AND COALESCE(stg.bump,'False') = COALESCE(dim.bump,'False')
-AND COALESCE(stg.crossing,'False') = COALESCE(dim.crossing,'False')
-AND COALESCE(stg.give_way,'False') = COALESCE(dim.give_way,'False')
-AND COALESCE(stg.junction,'False') = COALESCE(dim.junction,'False')
-AND COALESCE(stg.no_exit,'False') = COALESCE(dim.no_exit,'False')
-AND COALESCE(stg.railway,'False') = COALESCE(dim.railway,'False')
-AND COALESCE(stg.roundabout,'False') = COALESCE(dim.roundabout,'False')
-AND COALESCE(stg.station,'False') = COALESCE(dim.station,'False')
-AND COALESCE(stg.stop,'False') = COALESCE(dim.stop,'False')
-AND COALESCE(stg.traffic_calming,'False') = COALESCE(dim.traffic_calming,'False')
-AND COALESCE(stg.traffic_signal,'False') = COALESCE(dim.traffic_signal,'False')
-AND COALESCE(stg.turning_loop,'False') = COALESCE(dim.turning_loop,'False')
-AND COALESCE(stg.sunrise_sunset,'False') = COALESCE(dim.sunrise_sunset,'False')
-AND COALESCE(stg.civil_twilight,'False') = COALESCE(dim.civil_twilight,'False')
-AND COALESCE(stg.nautical_twilight,'False') = COALESCE(dim.nautical_twilight,'False')
-AND COALESCE(stg.astronomical_twilight,'False') = COALESCE(dim.astronomical_twilight,'False')
-WHERE dim.Acc_Cond_SK IS NULL;
+WHERE NOT EXISTS (
+SELECT 1 FROM "CORE_DB".dim_acc_cond dim
+WHERE dim.amenity = stg.amenity
+AND dim.bump = stg.bump
+AND dim.crossing = stg.crossing
+AND dim.give_way = stg.give_way
+AND dim.junction = stg.junction
+AND dim.no_exit = stg.no_exit
+AND dim.railway = stg.railway
+AND dim.roundabout = stg.roundabout
+AND dim.station = stg.station
+AND dim.stop = stg.stop
+AND dim.traffic_calming = stg.traffic_calming
+AND dim.traffic_signal = stg.traffic_signal
+AND dim.turning_loop = stg.turning_loop
+AND dim.sunrise_sunset = stg.sunrise_sunset
+AND dim.civil_twilight = stg.civil_twilight
+AND dim.nautical_twilight = stg.nautical_twilight
+AND dim.astronomical_twilight = stg.astronomical_twilight
+)
+ON CONFLICT (Amenity, Bump, Crossing, Give_Way, Junction, No_Exit, Railway, Roundabout, Station, Stop, Traffic_Calming, Traffic_Signal, Turning_Loop, Sunrise_Sunset, Civil_Twilight, Nautical_Twilight, Astronomical_Twilight) DO NOTHING;
 '''
 
+# dim_airport: the city and name of an airport already loaded are updated when they changed, then the new airports
+# are inserted behind the NOT EXISTS probe like the other dims
 INSERT_UPDATE_DIM_AIRPORT_SQL = '''
+UPDATE "CORE_DB".dim_airport dim
+SET
+City = stg.City,
+Name = stg.Name,
+Last_Updt_TS = CURRENT_TIMESTAMP,
+Last_Updt_User = 'ETL_USR'
+FROM "STG_DB".stg_airport stg
+WHERE COALESCE(dim.ID,'') = COALESCE(stg.ID,'')
+AND (dim.City, dim.Name) IS DISTINCT FROM (stg.City, stg.Name);
+
 INSERT INTO "CORE_DB".dim_airport
 SELECT 
-(SELECT COALESCE(MAX(Airport_SK),0) MAX_Airport_SK  FROM "CORE_DB".dim_airport) + 
-ROW_NUMBER() OVER(ORDER BY stg.ID) Airport_SK,
+NEXTVAL('"CORE_DB".dim_airport_sk_seq') Airport_SK,
 stg.ID,
 stg.City,
 stg.Name,
@@ -957,16 +1329,17 @@ CURRENT_TIMESTAMP,
 CURRENT_TIMESTAMP,
 'ETL_USR'
 FROM "STG_DB".stg_airport stg
-LEFT OUTER JOIN "CORE_DB".dim_airport dim
-ON COALESCE(stg.ID,'') = COALESCE(dim.ID,'')
-WHERE dim.Airport_SK IS NULL;
+WHERE NOT EXISTS (
+SELECT 1 FROM "CORE_DB".dim_airport dim
+WHERE COALESCE(dim.ID,'') = COALESCE(stg.ID,'')
+)
+ON CONFLICT ((COALESCE(ID,''))) DO NOTHING;
 '''
 
 INSERT_UPDATE_DIM_WTHR_COND_SQL = '''
 INSERT INTO "CORE_DB".dim_wthr_cond
 SELECT 
-(SELECT COALESCE(MAX(Weather_Cond_SK),0) MAX_Weather_Cond_SK FROM "CORE_DB".dim_wthr_cond) + 
-ROW_NUMBER() OVER(ORDER BY stg.Wind_Direction) Weather_Cond_SK,
+NEXTVAL('"CORE_DB".dim_wthr_cond_sk_seq') Weather_Cond_SK,
 stg.Wind_Direction,
 stg.Weather_Condition,
 CURRENT_TIMESTAMP,
@@ -974,60 +1347,65 @@ CURRENT_TIMESTAMP,
 CURRENT_TIMESTAMP,
 'ETL_USR'
 FROM "STG_DB".stg_weather_condition stg
-LEFT OUTER JOIN "CORE_DB".dim_wthr_cond dim
-ON COALESCE(stg.Wind_Direction,'') = COALESCE(dim.Wind_Direction,'')
-AND COALESCE(stg.Weather_Condition,'') = COALESCE(dim.Weather_Condition,'')
-WHERE dim.Weather_Cond_SK IS NULL;
+WHERE NOT EXISTS (
+SELECT 1 FROM "CORE_DB".dim_wthr_cond dim
+WHERE dim.Wind_Direction = stg.Wind_Direction
+AND dim.Weather_Condition = stg.Weather_Condition
+)
+ON CONFLICT (Wind_Direction, Weather_Condition) DO NOTHING;
 '''
 
 INSERT_UPDATE_LKP_PROVIDER_SQL = '''
 INSERT INTO "CORE_DB".lkp_provider
 SELECT 
-(SELECT COALESCE(MAX(Provider_SK),0) MAX_Provider_SK FROM "CORE_DB".lkp_provider) + 
-ROW_NUMBER() OVER(ORDER BY stg.Provider_Name) Provider_SK,
+NEXTVAL('"CORE_DB".lkp_provider_sk_seq') Provider_SK,
 stg.Provider_Name,
 CURRENT_TIMESTAMP,
 'ETL_USR',
 CURRENT_TIMESTAMP,
 'ETL_USR'
 FROM "STG_DB".stg_provider stg
-LEFT OUTER JOIN "CORE_DB".lkp_provider dim
-ON COALESCE(stg.Provider_Name,'') = COALESCE(dim.Provider_Name,'')
-WHERE dim.Provider_SK IS NULL;
+WHERE NOT EXISTS (
+SELECT 1 FROM "CORE_DB".lkp_provider dim
+WHERE dim.Provider_Name = stg.Provider_Name
+)
+ON CONFLICT (Provider_Name) DO NOTHING;
 '''
 
 INSERT_UPDATE_LKP_SOURCE_SQL = '''
 INSERT INTO "CORE_DB".lkp_source
 SELECT 
-(SELECT COALESCE(MAX(Source_SK),0) MAX_Source_SK FROM "CORE_DB".lkp_source) + 
-ROW_NUMBER() OVER(ORDER BY stg.Source_Name) Source_SK,
+NEXTVAL('"CORE_DB".lkp_source_sk_seq') Source_SK,
 stg.Source_Name,
 CURRENT_TIMESTAMP,
 'ETL_USR',
 CURRENT_TIMESTAMP,
 'ETL_USR'
 FROM "STG_DB".stg_source stg
-LEFT OUTER JOIN "CORE_DB".lkp_source dim
-ON COALESCE(stg.Source_Name,'') = COALESCE(dim.Source_Name,'')
-WHERE dim.Source_SK IS NULL;
+WHERE NOT EXISTS (
+SELECT 1 FROM "CORE_DB".lkp_source dim
+WHERE COALESCE(dim.Source_Name,'') = COALESCE(stg.Source_Name,'')
+)
+ON CONFLICT ((COALESCE(Source_Name,''))) DO NOTHING;
 '''
 
-INSERT_UPDATE_FACT_ACCIDENT_SQL = '''
+# Load the facts of the stage rows which are not in the fact table yet (NOT EXISTS probe of the natural key index,
+# ON CONFLICT on it); chunk_filter (parameterized) limits the stage rows, see the chunked fact load below
+FACT_ACCIDENT_SQL = '''
 INSERT INTO "CORE_DB".fact_accident
 SELECT 
-(SELECT COALESCE(MAX(Accident_SK),0) MAX_Accident_SK  FROM "CORE_DB".fact_accident) + 
-ROW_NUMBER() OVER(ORDER BY stg.ID) Accident_SK,
+NEXTVAL('"CORE_DB".fact_accident_sk_seq') Accident_SK,
 COALESCE(dim_src.Source_SK,-1) Source_FK,
-COALESCE(dim_add.Address_SK-1) Address_FK,
+COALESCE(dim_add.Address_SK,-1) Address_FK,
 COALESCE(dim_ap.Airport_SK,-1) Airport_FK,
 COALESCE(dim_wc.Weather_Cond_SK,-1) Weather_Cond_FK,
 COALESCE(dim_ac.Acc_Cond_SK,-1) Acc_Cond_FK,
-CAST(TO_CHAR(CAST(stg.Start_Time AS DATE),'YYYYMMDD') AS INTEGER) Start_Date_FK,
-dim_st.Time_SK Start_Time_FK,
-CAST(TO_CHAR(CAST(stg.End_Time AS DATE),'YYYYMMDD') AS INTEGER) End_Date_FK,
-dim_et.Time_SK End_Time_FK,
-CAST(TO_CHAR(CAST(stg.Weather_TImestamp AS DATE),'YYYYMMDD') AS INTEGER) Weather_Date_FK,
-dim_wt.Time_SK Weather_Time_FK,
+COALESCE("CORE_DB".date_sk(stg.Start_Time),-1) Start_Date_FK,
+"CORE_DB".time_sk(stg.Start_Time) Start_Time_FK,
+"CORE_DB".date_sk(stg.End_Time) End_Date_FK,
+"CORE_DB".time_sk(stg.End_Time) End_Time_FK,
+"CORE_DB".date_sk(stg.Weather_TImestamp) Weather_Date_FK,
+"CORE_DB".time_sk(stg.Weather_TImestamp) Weather_Time_FK,
 stg.ID,
 stg.TMC,
 stg.Severity,
@@ -1053,14 +1431,10 @@ CURRENT_TIMESTAMP,
 CURRENT_TIMESTAMP,
 'ETL_USR'
 FROM "STG_DB".stg_accident stg
-LEFT OUTER JOIN "CORE_DB".fact_accident fact
-ON COALESCE(stg.ID,'') = COALESCE(fact.Accident_ID,'')
 LEFT OUTER JOIN "CORE_DB".lkp_source dim_src
 ON COALESCE(stg.Source,'') = COALESCE(dim_src.Source_Name,'')
 LEFT OUTER JOIN "CORE_DB".dim_address dim_add
-ON COALESCE(stg.City,'') = COALESCE(dim_add.City,'')
-AND COALESCE(stg.State,'') = COALESCE(dim_add.State,'')
-AND COALESCE(stg.Zipcode,'') = COALESCE(dim_add.Zipcode,'')
+ON stg.Address_Key = dim_add.Address_Key
 LEFT OUTER JOIN "CORE_DB".dim_airport dim_ap
 ON COALESCE(stg.airport_code,'') = COALESCE(dim_ap.ID,'')
 LEFT OUTER JOIN "CORE_DB".dim_wthr_cond dim_wc
@@ -1084,31 +1458,30 @@ AND COALESCE(stg.sunrise_sunset,'') = COALESCE(dim_ac.sunrise_sunset,'')
 AND COALESCE(stg.civil_twilight,'') = COALESCE(dim_ac.civil_twilight,'')
 AND COALESCE(stg.nautical_twilight,'') = COALESCE(dim_ac.nautical_twilight,'')
 AND COALESCE(stg.astronomical_twilight,'') = COALESCE(dim_ac.astronomical_twilight,'')
-LEFT OUTER JOIN "CORE_DB".dim_time dim_st
-ON TO_CHAR(stg.Start_Time,'HH24:MI:SS') = dim_st.time_desc
-LEFT OUTER JOIN "CORE_DB".dim_time dim_et
-ON TO_CHAR(stg.End_Time,'HH24:MI:SS') = dim_et.time_desc
-LEFT OUTER JOIN "CORE_DB".dim_time dim_wt
-ON TO_CHAR(stg.Weather_TImestamp,'HH24:MI:SS') = dim_wt.time_desc
-WHERE fact.Accident_SK IS NULL;
+WHERE NOT EXISTS (
+SELECT 1 FROM "CORE_DB".fact_accident fact
+WHERE fact.Accident_ID = stg.ID
+){chunk_filter}
+ON CONFLICT (Accident_ID, Start_Date_FK) DO NOTHING;
 '''
 
-INSERT_UPDATE_FACT_TRIP_SQL = '''
+INSERT_UPDATE_FACT_ACCIDENT_SQL = FACT_ACCIDENT_SQL.format(chunk_filter='')
+
+FACT_TRIP_SQL = '''
 INSERT INTO "CORE_DB".fact_trip
 SELECT 
-(SELECT COALESCE(MAX(Trip_SK),0) MAX_Trip_SK  FROM "CORE_DB".fact_trip) + 
-ROW_NUMBER() OVER(ORDER BY stg.ID) Trip_SK,
+NEXTVAL('"CORE_DB".fact_trip_sk_seq') Trip_SK,
 COALESCE(dim_prv.Provider_SK,-1) Provider_FK,
 COALESCE(dim_add_o.Address_SK,-1) Origin_Address_FK,
 COALESCE(dim_add_d.Address_SK,-1) Destination_Address_FK,
-CAST(TO_CHAR(CAST(stg.StartDateTime AS DATE),'YYYYMMDD') AS INTEGER) Start_Date_FK,
-dim_st.Time_SK Start_Time_FK,
-CAST(TO_CHAR(CAST(stg.DateCreated AS DATE),'YYYYMMDD') AS INTEGER) DateCreated_Date_FK,
-dim_dct.Time_SK DateCreated_Time_FK,
-CAST(TO_CHAR(CAST(stg.StartDateTime1 AS DATE),'YYYYMMDD') AS INTEGER) Start1_Date_FK,
-dim_s1t.Time_SK Start1_Time_FK,
-CAST(TO_CHAR(CAST(stg.EndDateTime AS DATE),'YYYYMMDD') AS INTEGER) End_Date_FK,
-dim_et.Time_SK End_Time_FK,
+COALESCE("CORE_DB".date_sk(stg.StartDateTime),-1) Start_Date_FK,
+"CORE_DB".time_sk(stg.StartDateTime) Start_Time_FK,
+"CORE_DB".date_sk(stg.DateCreated) DateCreated_Date_FK,
+"CORE_DB".time_sk(stg.DateCreated) DateCreated_Time_FK,
+"CORE_DB".date_sk(stg.StartDateTime1) Start1_Date_FK,
+"CORE_DB".time_sk(stg.StartDateTime1) Start1_Time_FK,
+"CORE_DB".date_sk(stg.EndDateTime) End_Date_FK,
+"CORE_DB".time_sk(stg.EndDateTime) End_Time_FK,
 stg.ID,
 stg.Type,
 stg.ExternalID,
@@ -1131,43 +1504,261 @@ CURRENT_TIMESTAMP,
 CURRENT_TIMESTAMP,
 'ETL_USR'
 FROM "STG_DB".stg_trip stg
-LEFT OUTER JOIN "CORE_DB".fact_trip fact
-ON COALESCE(stg.ID,'') = COALESCE(fact.Trip_ID,'')
 LEFT OUTER JOIN "CORE_DB".lkp_provider dim_prv
 ON COALESCE(ProviderName,'') = COALESCE(dim_prv.Provider_Name,'')
 LEFT OUTER JOIN "CORE_DB".dim_address dim_add_o
-ON COALESCE(stg.OriginCity,'') = COALESCE(dim_add_o.City,'')
-AND COALESCE(stg.OriginState,'') = COALESCE(dim_add_o.State,'')
-AND COALESCE(stg.OriginZip,'') = COALESCE(dim_add_o.Zipcode,'')
+ON stg.Origin_Address_Key = dim_add_o.Address_Key
 LEFT OUTER JOIN "CORE_DB".dim_address dim_add_d
-ON COALESCE(stg.DestinationCity,'') = COALESCE(dim_add_d.City,'')
-AND COALESCE(stg.DestinationState,'') = COALESCE(dim_add_d.State,'')
-AND COALESCE(stg.DestinationZip,'') = COALESCE(dim_add_d.Zipcode,'')
-LEFT OUTER JOIN "CORE_DB".dim_time dim_st
-ON TO_CHAR(stg.StartDateTime,'HH24:MI:SS') = dim_st.time_desc
-LEFT OUTER JOIN "CORE_DB".dim_time dim_dct
-ON TO_CHAR(stg.DateCreated,'HH24:MI:SS') = dim_dct.time_desc
-LEFT OUTER JOIN "CORE_DB".dim_time dim_s1t
-ON TO_CHAR(stg.StartDateTime1,'HH24:MI:SS') = dim_s1t.time_desc
-LEFT OUTER JOIN "CORE_DB".dim_time dim_et
-ON TO_CHAR(stg.EndDateTime,'HH24:MI:SS') = dim_et.time_desc
-WHERE fact.Trip_SK IS NULL;
-'''
-
-CREATE_INDEXES = '''
-CREATE INDEX IF NOT EXISTS idx_Address ON "STG_DB".stg_accident (City, State, Zipcode);
-CREATE INDEX IF NOT EXISTS idx_AccCond ON "STG_DB".stg_accident (Amenity, Bump, Crossing, Give_Way, Junction, No_Exit, Railway, Roundabout, Station, Stop, Traffic_Calming, Traffic_Signal, Turning_Loop, Sunrise_Sunset, Civil_Twilight, Nautical_Twilight, Astronomical_Twilight);
-CREATE INDEX IF NOT EXISTS idx_AccidentID ON "CORE_DB".fact_accident (Accident_ID);
-
-CREATE INDEX IF NOT EXISTS idx_OriginAddress ON "STG_DB".stg_trip (OriginCity, OriginState, OriginZip);
-CREATE INDEX IF NOT EXISTS idx_DestinationAddress ON "STG_DB".stg_trip (DestinationCity, DestinationState, DestinationZip);
-CREATE INDEX IF NOT EXISTS idx_TripID ON "CORE_DB".fact_trip (Trip_ID);
+ON stg.Destination_Address_Key = dim_add_d.Address_Key
+WHERE NOT EXISTS (
+SELECT 1 FROM "CORE_DB".fact_trip fact
+WHERE fact.Trip_ID = stg.ID
+){chunk_filter}
+ON CONFLICT (Trip_ID, Start_Date_FK) DO NOTHING;
+'''
+
+INSERT_UPDATE_FACT_TRIP_SQL = FACT_TRIP_SQL.format(chunk_filter='')
+
+# Chunked fact load: the facts of the stage rows of one key range only (low exclusive, high inclusive; psycopg2 parameters).
+# Each chunk is committed with its checkpoint (etl_checkpoint table), see chunks module
+FACT_CHUNK_FILTER = '''
+AND stg.ID > %(low)s AND stg.ID <= %(high)s'''
+
+INSERT_UPDATE_FACT_ACCIDENT_CHUNK_SQL = FACT_ACCIDENT_SQL.format(chunk_filter=FACT_CHUNK_FILTER)
+
+INSERT_UPDATE_FACT_TRIP_CHUNK_SQL = FACT_TRIP_SQL.format(chunk_filter=FACT_CHUNK_FILTER)
+
+# Partition by partition fact load: the facts of the stage rows whose start date key falls in one partition
+# (start timestamp column parameterized; low inclusive, high exclusive, psycopg2 parameters), so each INSERT writes one partition
+FACT_PERIOD_FILTER = '''
+AND COALESCE("CORE_DB".date_sk({start}),-1) >= %(low)s AND COALESCE("CORE_DB".date_sk({start}),-1) < %(high)s'''
+
+INSERT_UPDATE_FACT_ACCIDENT_PERIOD_SQL = FACT_ACCIDENT_SQL.format(chunk_filter=FACT_PERIOD_FILTER.format(start='stg.Start_Time'))
+
+INSERT_UPDATE_FACT_TRIP_PERIOD_SQL = FACT_TRIP_SQL.format(chunk_filter=FACT_PERIOD_FILTER.format(start='stg.StartDateTime'))
+
+# Incremental mode: move the high watermark of the source to the max start timestamp of the rows just loaded.
+# These run after the facts are committed, in their own transaction: should they fail, the watermark stays behind
+# and the same rows are upserted into the facts again on the next run
+
+UPDATE_WATERMARK_ACCIDENT_SQL = '''
+WITH DELTA AS (
+SELECT MAX(Start_Time) Max_TS FROM "STG_DB".stg_accident
+)
+INSERT INTO "CORE_DB".etl_watermark
+SELECT
+'us_accidents',
+DELTA.Max_TS,
+ARRAY(SELECT stg.ID FROM "STG_DB".stg_accident stg WHERE stg.Start_Time = DELTA.Max_TS),
+CURRENT_TIMESTAMP,
+'ETL_USR',
+CURRENT_TIMESTAMP,
+'ETL_USR'
+FROM DELTA
+WHERE DELTA.Max_TS IS NOT NULL
+ON CONFLICT (Source_Name) DO UPDATE SET
+Boundary_IDs = CASE WHEN etl_watermark.Watermark_TS = EXCLUDED.Watermark_TS
+THEN ARRAY(SELECT DISTINCT UNNEST(etl_watermark.Boundary_IDs || EXCLUDED.Boundary_IDs))
+ELSE EXCLUDED.Boundary_IDs
+END,
+Watermark_TS = EXCLUDED.Watermark_TS,
+Last_Updt_TS = CURRENT_TIMESTAMP,
+Last_Updt_User = 'ETL_USR'
+WHERE EXCLUDED.Watermark_TS >= etl_watermark.Watermark_TS;
+'''
+
+UPDATE_WATERMARK_TRIP_SQL = '''
+WITH DELTA AS (
+SELECT MAX(StartDateTime) Max_TS FROM "STG_DB".stg_trip
+)
+INSERT INTO "CORE_DB".etl_watermark
+SELECT
+'dc_taxi_trips',
+DELTA.Max_TS,
+ARRAY(SELECT stg.ID FROM "STG_DB".stg_trip stg WHERE stg.StartDateTime = DELTA.Max_TS),
+CURRENT_TIMESTAMP,
+'ETL_USR',
+CURRENT_TIMESTAMP,
+'ETL_USR'
+FROM DELTA
+WHERE DELTA.Max_TS IS NOT NULL
+ON CONFLICT (Source_Name) DO UPDATE SET
+Boundary_IDs = CASE WHEN etl_watermark.Watermark_TS = EXCLUDED.Watermark_TS
+THEN ARRAY(SELECT DISTINCT UNNEST(etl_watermark.Boundary_IDs || EXCLUDED.Boundary_IDs))
+ELSE EXCLUDED.Boundary_IDs
+END,
+Watermark_TS = EXCLUDED.Watermark_TS,
+Last_Updt_TS = CURRENT_TIMESTAMP,
+Last_Updt_User = 'ETL_USR'
+WHERE EXCLUDED.Watermark_TS >= etl_watermark.Watermark_TS;
+'''
+
+# Section with strings used by the index lifecycle manager (indexes module)
+
+# index of a table (concurrently is '' or 'CONCURRENTLY ')
+CREATE_INDEX_SQL = '''
+CREATE INDEX {concurrently}IF NOT EXISTS {name} ON {table} ({columns})
+'''
+
+DROP_INDEX_SQL = '''
+DROP INDEX {concurrently}IF EXISTS {index}
+'''
+
+# whether an index is valid (NULL when it does not exist); a failed CREATE INDEX CONCURRENTLY leaves an invalid index behind
+INDEX_IS_VALID_SQL = '''
+SELECT (SELECT indisvalid FROM pg_index WHERE indexrelid = TO_REGCLASS('{}'))
+'''
+
+# Section with strings used by the key allocation service (keys module)
+
+ALLOCATE_KEYS_SQL = '''
+SELECT NEXTVAL('{}') FROM GENERATE_SERIES(1, %s)
+'''
+
+# Section with strings used by the vectorized fact builder (facts module)
+
+# natural key -> surrogate key map of a dimension (natural key columns, surrogate key and table parameterized)
+DIM_KEY_MAP_SQL = '''
+SELECT {columns}, {sk} FROM {table}
+'''
+
+# stage rows of one partition (by hash of the natural key) which are not in the fact table yet
+FACT_STAGE_ROWS_SQL = '''
+SELECT {columns}
+FROM {stage_table} stg
+WHERE NOT EXISTS (
+SELECT 1 FROM {fact_table} fact
+WHERE fact.{fact_key} = stg.{stage_key}
+)
+AND (HASHTEXT(stg.{stage_key}) & 2147483647) % {partitions} = {partition}
+'''
+
+# COPY into the listed columns of a table; NULL is \N, so empty strings stay empty strings
+COPY_COLUMNS_SQL = """
+COPY {} ({})
+FROM STDIN
+WITH (FORMAT CSV, NULL '\\N')
+"""
+
+# Section with strings used by the partitioning of the fact tables (partitions module)
+
+# start date keys of the stage rows, truncated to the period of a partition (divisor parameterized: 10000 for years, 100 for months)
+STAGE_PERIODS_SQL = '''
+SELECT DISTINCT "CORE_DB".date_sk(stg.{start}) / {divisor} FROM {table} stg WHERE stg.{start} IS NOT NULL
+'''
+
+FACT_PERIODS_SQL = '''
+SELECT DISTINCT Start_Date_FK / {divisor} FROM {table} WHERE Start_Date_FK >= 0
+'''
+
+CREATE_PARTITION_SQL = '''
+CREATE TABLE IF NOT EXISTS {partition} PARTITION OF {table} FOR VALUES FROM ({low}) TO ({high})
+'''
+
+DETACH_PARTITION_SQL = '''
+ALTER TABLE {table} DETACH PARTITION {partition}
+'''
+
+ATTACH_PARTITION_SQL = '''
+ALTER TABLE {table} ATTACH PARTITION {partition} FOR VALUES FROM ({low}) TO ({high})
+'''
+
+# move the rows of a fact table created before the partitioning into the partitioned table (columns listed by name),
+# then move the sequence of its surrogate key past the keys moved: the sequence was created with the partitioned table,
+# while it was still empty
+MIGRATE_UNPARTITIONED_FACT_SQL = '''
+UPDATE {unpartitioned} SET Start_Date_FK = -1 WHERE Start_Date_FK IS NULL;
+INSERT INTO {table} ({columns}) SELECT {columns} FROM {unpartitioned};
+DROP TABLE {unpartitioned};
+SELECT SETVAL('{sequence}', MAX({sk}))
+FROM {table}
+HAVING MAX({sk}) >= (SELECT CASE WHEN is_called THEN last_value ELSE last_value - 1 END FROM {sequence});
+'''
+
+# Section with strings used by the chunked fact load (chunks module)
+
+GET_CHECKPOINT_SQL = '''
+SELECT Run_ID, Last_Key, Chunks, Rows_Loaded, Completed FROM "CORE_DB".etl_checkpoint WHERE Load_Name = %(load_name)s
+'''
+
+# upper key and number of rows of the next chunk of a stage table (stage table and key column parameterized)
+NEXT_CHUNK_SQL = '''
+SELECT MAX(chunk.{key}), COUNT(*) FROM (
+SELECT stg.{key} FROM {table} stg
+WHERE stg.{key} > %(low)s
+ORDER BY stg.{key}
+LIMIT %(rows)s
+) chunk
+'''
+
+SAVE_CHECKPOINT_SQL = '''
+INSERT INTO "CORE_DB".etl_checkpoint
+VALUES (%(load_name)s, %(run_id)s, %(last_key)s, %(chunks)s, %(rows)s, %(completed)s, CURRENT_TIMESTAMP, 'ETL_USR', CURRENT_TIMESTAMP, 'ETL_USR')
+ON CONFLICT (Load_Name) DO UPDATE SET
+Run_ID = EXCLUDED.Run_ID,
+Last_Key = EXCLUDED.Last_Key,
+Chunks = EXCLUDED.Chunks,
+Rows_Loaded = EXCLUDED.Rows_Loaded,
+Completed = EXCLUDED.Completed,
+Last_Updt_TS = CURRENT_TIMESTAMP,
+Last_Updt_User = 'ETL_USR'
+'''
+
+# Section with strings used by the schema deployment (schema_deploy module)
+
+# lock held until the end of the deployment transaction, so the deployments of two runs do not interleave
+SCHEMA_DEPLOY_LOCK_SQL = '''
+SELECT PG_ADVISORY_XACT_LOCK(HASHTEXT('schema deployment'))
+'''
+
+SCHEMA_VERSIONS_SQL = '''
+SELECT Object_Name, DDL_Checksum FROM "CORE_DB".etl_schema_version
+'''
+
+SAVE_SCHEMA_VERSION_SQL = '''
+INSERT INTO "CORE_DB".etl_schema_version
+VALUES (%(object_name)s, %(checksum)s, CURRENT_TIMESTAMP, 'ETL_USR', CURRENT_TIMESTAMP, 'ETL_USR')
+ON CONFLICT (Object_Name) DO UPDATE SET
+DDL_Checksum = EXCLUDED.DDL_Checksum,
+Last_Updt_TS = CURRENT_TIMESTAMP,
+Last_Updt_User = 'ETL_USR'
+'''
+
+# Section with strings used to decide whether a load can be skipped
+
+TABLE_EXISTS_SQL = '''
+SELECT TO_REGCLASS('{}') IS NOT NULL
+'''
+
+TABLE_HAS_ROWS_SQL = '''
+SELECT EXISTS (SELECT 1 FROM {})
+'''
+
+# Section with strings used by the bulk load mode (primary key of src/stg tables is added after the load)
+
+HAS_PRIMARY_KEY_SQL = '''
+SELECT EXISTS (SELECT 1 FROM pg_index WHERE indrelid = TO_REGCLASS('{}') AND indisprimary)
+'''
+
+ADD_PRIMARY_KEY_SQL = '''
+ALTER TABLE {} ADD PRIMARY KEY ({})
 '''
 
 # Section with strings related to validation after tables are loaded
 
-VALIDATE_ROW_CNT_SQL = '''
-SELECT COUNT(*) CNT FROM {}
+# The row count validation does not count every row of the tables (see row_counts module)
+
+# estimate of the rows of a table as of its last VACUUM/ANALYZE, summed over its partitions (a partitioned table has
+# no rows of its own); a table never analyzed (-1 from PostgreSQL 14) counts as 0
+ESTIMATE_ROW_CNT_SQL = '''
+SELECT COALESCE(SUM(GREATEST(c.reltuples, 0)), 0)::BIGINT FROM pg_class c
+WHERE c.oid = TO_REGCLASS('{0}')
+OR c.oid IN (SELECT inhrelid FROM pg_inherits WHERE inhparent = TO_REGCLASS('{0}'))
+'''
+
+# rows of a table up to a limit (the minimum rows expected), reading at most limit rows
+PROBE_ROW_CNT_SQL = '''
+SELECT COUNT(*) CNT FROM (SELECT 1 FROM {} LIMIT %(limit)s) probe
 '''
 
 VALIDATE_NAT_KEYS_DUP_SQL = '''
@@ -1309,3 +1900,51 @@ DICT_NAT_KEYS_DUP_VALDTN = [
 'natural_key' : 'Trip_ID'
 }
 ]
+
+# Dictionary which has the src/stg tables that are dropped and recreated every run, and their create table SQL
+DICT_TRANSIENT_TABLES = [
+{
+'table' : '"SRC_DB".stg_src_airport_codes',
+'create_sql' : CREATE_TABLE_SRC_AIRPORT_CODES_SQL
+},
+{
+'table' : '"SRC_DB".stg_src_us_accidents',
+'create_sql' : CREATE_TABLE_SRC_US_ACCIDENTS_SQL
+},
+{
+'table' : '"SRC_DB".stg_src_dc_taxi_trips',
+'create_sql' : CREATE_TABLE_SRC_DC_TAXI_TRIPS_SQL
+},
+{
+'table' : '"STG_DB".stg_address',
+'create_sql' : CREATE_TABLE_STG_ADDRESS_SQL
+},
+{
+'table' : '"STG_DB".stg_accident_condition',
+'create_sql' : CREATE_TABLE_STG_ACCIDENT_CONDITION_SQL
+},
+{
+'table' : '"STG_DB".stg_airport',
+'create_sql' : CREATE_TABLE_STG_AIRPORT_SQL
+},
+{
+'table' : '"STG_DB".stg_weather_condition',
+'create_sql' : CREATE_TABLE_STG_WEATHER_CONDITION_SQL
+},
+{
+'table' : '"STG_DB".stg_provider',
+'create_sql' : CREATE_TABLE_STG_PROVIDER_SQL
+},
+{
+'table' : '"STG_DB".stg_source',
+'create_sql' : CREATE_TABLE_STG_SOURCE_SQL
+},
+{
+'table' : '"STG_DB".stg_accident',
+'create_sql' : CREATE_TABLE_STG_ACCIDENT_SQL
+},
+{
+'table' : '"STG_DB".stg_trip',
+'create_sql' : CREATE_TABLE_STG_TRIP_SQL
+}
+]
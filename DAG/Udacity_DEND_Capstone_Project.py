@@ -12,13 +12,15 @@ Below are the steps that the module performs:
 
 # Import necessary modules
 import datetime
+import json
 import logging
-import pandas as pd
-from pandas import DataFrame
-import time
+import os
 import sys
+import time
 
 from airflow import DAG
+from airflow.exceptions import AirflowSkipException
+from airflow.models import Variable
 from airflow.operators.python_operator import PythonOperator
 from airflow.hooks.postgres_hook import PostgresHook
 from airflow.operators.bash_operator import BashOperator
@@ -26,18 +28,124 @@ from airflow.operators.dummy_operator import DummyOperator
 
 # import the SQLs module, which contains necessary SQL statements to perform ETL operations
 import SQLs
-from SQLs import *
+from SQLs import (CREATE_TABLE_SRC_US_ACCIDENTS_SQL, CREATE_TABLE_SRC_DC_TAXI_TRIPS_SQL, CREATE_VIEW_STG_ACCIDENT_SQL,
+                  CREATE_VIEW_STG_TRIP_SQL, CREATE_VIEW_STG_ACCIDENT_INCR_SQL, CREATE_VIEW_STG_TRIP_INCR_SQL,
+                  INSERT_STG_ADDRESS_SQL, INSERT_STG_ACCIDENT_CONDITION_SQL, INSERT_STG_AIRPORT_SQL,
+                  INSERT_STG_WEATHER_CONDITION_SQL, INSERT_STG_PROVIDER_SQL, INSERT_STG_SOURCE_SQL,
+                  INSERT_STG_ACCIDENT_SQL, INSERT_STG_TRIP_SQL, INSERT_STG_ACCIDENT_INCR_SQL, INSERT_STG_TRIP_INCR_SQL,
+                  INSERT_UPDATE_DIM_DATE_SQL, INSERT_UPDATE_DIM_TIME_SQL, INSERT_UPDATE_DIM_ADDRESS_SQL,
+                  INSERT_UPDATE_DIM_ACC_COND_SQL, INSERT_UPDATE_DIM_AIRPORT_SQL, INSERT_UPDATE_DIM_WTHR_COND_SQL,
+                  INSERT_UPDATE_LKP_PROVIDER_SQL, INSERT_UPDATE_LKP_SOURCE_SQL, INSERT_UPDATE_FACT_ACCIDENT_CHUNK_SQL,
+                  INSERT_UPDATE_FACT_TRIP_CHUNK_SQL, INSERT_UPDATE_FACT_ACCIDENT_PERIOD_SQL,
+                  INSERT_UPDATE_FACT_TRIP_PERIOD_SQL, UPDATE_WATERMARK_ACCIDENT_SQL, UPDATE_WATERMARK_TRIP_SQL,
+                  TABLE_EXISTS_SQL, TABLE_HAS_ROWS_SQL, VALIDATE_NAT_KEYS_DUP_SQL, DICT_ROW_CNT_VALDTN,
+                  DICT_NAT_KEYS_DUP_VALDTN, DICT_TRANSIENT_TABLES)
+
+# import the http_cache module, which caches the airport code pages on disk
+import http_cache
+
+# import the loaders module, which streams the source files into the src tables
+import loaders
+
+# import the bulk_load module, which creates and loads the src/stg tables in bulk load mode
+import bulk_load
+
+# import the fingerprints module, which detects source files that did not change since the last run
+import fingerprints
+
+# The airports, landing, prevalidate and facts modules load pandas/numpy/pyarrow, so they are imported inside the
+# task functions which use them: the scheduler parses this file over and over, and only needs the task definitions.
+# Check the parse time of this file with parse_time.py
+
+# import the chunks module, which loads the fact tables in checkpointed chunks
+import chunks
+
+# import the partitions module, which creates the partitions of the fact tables and loads them partition by partition
+import partitions
+
+# import the indexes module, which drops the secondary indexes of the tables before their load and builds them after it
+import indexes
+
+# import the dataflow module, which generates the dependencies of the tasks from the tables they read and write
+import dataflow
+
+# import the connection_pool module, which shares a pool of database connections between the task functions of a process
+import connection_pool
+
+# import the schema_deploy module, which deploys the DDL of the src/stg/core tables in a few transactions
+import schema_deploy
+
+# import the row_counts module, which finds the row counts of the tables without counting every row
+import row_counts
+
+# directory of the local postgres server, where the source files are placed
+DATA_DIR = '/mnt/c/Program Files/PostgreSQL/12/data/'
+
+# directory of the on-disk http cache for the airport code pages
+AIRPORTS_CACHE_DIR = os.path.expanduser('~/airflow/cache/airports')
+
+# number of byte ranges (and connections) used to load the large source files in parallel
+COPY_PARTITIONS = 4
+
+# number of worker processes (and connections) used to build a fact table in vectorized fact mode
+FACT_BUILDER_WORKERS = 4
+
+# maximum number of connections of the connection pool of a process
+POOL_MAX_SIZE = 8
+
+# default number of stage rows per chunk in chunked fact mode (airflow variable fact_chunk_rows)
+FACT_CHUNK_ROWS = 250000
+
+# directory of the parquet landing zone
+PARQUET_DIR = DATA_DIR + 'landing/'
+
+# directory of the reject files of the pre-load validation
+REJECTS_DIR = DATA_DIR + 'rejects/'
 
-# create dataframe out of a dictionary, which has necessary information to perform row count validation
-DF_ROW_CNT_VALDTN = DataFrame(DICT_ROW_CNT_VALDTN)
+# create table SQL of each src/stg table (lower case table name as key)
+TABLE_CREATE_SQL = dict((row['table'].lower(), row['create_sql']) for row in DICT_TRANSIENT_TABLES)
 
-# create dataframe out of a dictionary, which has necessary information to perform duplicate row count validation
-DF_NAT_KEYS_DUP_VALDTN = DataFrame(DICT_NAT_KEYS_DUP_VALDTN)
+# file with the load time of the src/stg tables per mode, used to report the speedup of the bulk load mode
+LOAD_STATS_FILE = os.path.expanduser('~/airflow/cache/load_stats.json')
+
+# file with the fingerprints of the source files of the last successful run
+SOURCE_FINGERPRINTS_FILE = os.path.expanduser('~/airflow/cache/source_fingerprints.json')
+
+# directory with the row counts of the last run of each row count validation (<task_id>.json),
+# reused for the tables of unchanged sources; a file per validation, as the validations run in parallel
+ROW_COUNTS_DIR = os.path.expanduser('~/airflow/cache/row_counts')
+
+# stage tables which hold only the rows past the watermark in incremental mode
+INCREMENTAL_STG_TABLES = ['"stg_db".stg_accident', '"stg_db".stg_trip']
+
+# stage tables which are views over their src table in stage view mode, with their view SQL and the view SQL of incremental mode
+STAGE_VIEW_TABLES = {
+    '"stg_db".stg_accident' : (CREATE_VIEW_STG_ACCIDENT_SQL, CREATE_VIEW_STG_ACCIDENT_INCR_SQL),
+    '"stg_db".stg_trip' : (CREATE_VIEW_STG_TRIP_SQL, CREATE_VIEW_STG_TRIP_INCR_SQL)
+}
+
+# source files which are fingerprinted (task_id of the fingerprint task as key), with the tables loaded from them.
+# When a file is unchanged since the last successful run, the create/copy/insert/fact tasks of these tables are skipped
+SOURCE_FILES = {
+    'fingerprint_us_accidents_file' : {
+        'filename' : 'US_Accidents_Dec19.csv',
+        'tables' : ['"SRC_DB".stg_src_us_accidents', '"STG_DB".stg_accident', '"CORE_DB".fact_accident']
+    },
+    'fingerprint_dc_taxi_trips_file' : {
+        'filename' : 'taxi_final.csv',
+        'tables' : ['"SRC_DB".stg_src_dc_taxi_trips', '"STG_DB".stg_trip', '"CORE_DB".fact_trip']
+    }
+}
 
 # Instantiate the DAG with a name and start_date
+# The start_date is fixed (a start_date of now() changes on every parse); the DAG is run on manual triggers.
+# Tasks run when none of their upstream tasks failed, as the tasks of unchanged sources are skipped
 dag = DAG(
 'udacity-dend-capstone-project',
-start_date=datetime.datetime.now()
+start_date=datetime.datetime(2020, 1, 1),
+schedule_interval=None,
+catchup=False,
+default_args={'trigger_rule' : 'none_failed'}
 )
 
 # function to create airports file
@@ -46,99 +154,544 @@ def create_airports_file():
     The function creates .csv files with list of all US airport codes.
     It utilizes 2 websites to arrive at the final list.
     First website provides list of all US state codes.
-    Second website provides list of all airport codes for each state code
+    Second website provides list of all airport codes for each state code.
+    The state pages are fetched concurrently, throttled by a per-host rate limit (see airports module),
+    through an on-disk http cache (see http_cache module).
+    Set the airflow variable airports_offline to true to build the file only from the cache; the task fails when a
+    page is not cached, so an incomplete offline run never replaces the airports file.
+    The requests to airnav.com are limited to airports.DEFAULT_REQUESTS_PER_SEC, the rate the site is known to tolerate;
+    set the airflow variable airports_requests_per_sec to opt in to a higher rate.
+    If the parsed airport codes are the same as in the existing file, the file is left alone and 'unchanged' is returned,
+    so the downstream airport tasks can skip. Otherwise 'changed' is returned.
     '''
 
-    us_state_codes_df = pd.read_html('https://developers.google.com/public-data/docs/canonical/states_csv')
-    us_state_codes = list(us_state_codes_df[0]['state'])
-    airport_codes = DataFrame(columns=['ID', 'City', 'Name'])
-    for state_code in us_state_codes:
+    # import the airports module, which fetches the list of US airport codes
+    import airports
+
+    offline = Variable.get('airports_offline', default_var='false').lower() == 'true'
+    fetch = http_cache.CachingFetcher(AIRPORTS_CACHE_DIR, offline=offline)
+    requests_per_sec = float(Variable.get('airports_requests_per_sec', default_var=airports.DEFAULT_REQUESTS_PER_SEC))
+    airport_codes = airports.fetch_airport_codes(fetch=fetch, requests_per_sec=requests_per_sec)
+    logging.info('Airport pages from the cache : ' + str(fetch.stats))
+    if fetch.missing:
+        logging.error('Airport pages not in the cache : ' + ', '.join(sorted(fetch.missing)))
+        raise http_cache.CacheMissError('Offline mode: {} airport pages are not cached, the airports file is left as is'
+                                        .format(len(fetch.missing)))
+
+    filename = DATA_DIR + 'airnav_airport_codes.csv'
+    digest = airports.table_digest(airport_codes)
+    digest_filename = os.path.join(AIRPORTS_CACHE_DIR, 'airnav_airport_codes.sha256')
+    if os.path.exists(filename) and os.path.exists(digest_filename):
+        with open(digest_filename) as digest_file:
+            if digest_file.read().strip() == digest:
+                logging.info('Airport codes are unchanged, ' + filename + ' is left as is')
+                return 'unchanged'
+    airport_codes.to_csv(filename, index=False)
+    with open(digest_filename, 'w') as digest_file:
+        digest_file.write(digest)
+    return 'changed'
+
+# function to return the connection pool of the local postgres database
+def pg_pool():
+    '''
+    Return the connection pool of the local postgres database, shared by the task functions run in this process.
+    The connections of the parallel copy (one per byte range, for the duration of the load) and of the fact builder
+    worker processes are not pooled
+    '''
+    return connection_pool.shared_pool('postgres_local', PostgresHook('postgres_local').get_conn, POOL_MAX_SIZE)
+
+# function to run SQL statements over a pooled connection
+def run_sql(SQL, fetch=False):
+    '''Run the SQL statements over a connection of the pool and commit them; returns the first row when fetch is True'''
+    with pg_pool().connection() as conn:
+        cursor = conn.cursor()
         try:
-            # wait for 5 seconds before the next call; the code will fail with service unavailable if run continuously without any wait
-            time.sleep(5)
-            df = pd.read_html('https://www.airnav.com/airports/us/' + state_code)
-            airport_codes = airport_codes.append(df[3][['ID', 'City', 'Name']])
-            print('https://www.airnav.com/airports/us/' + state_code)
-        except:
-            continue
-    airport_codes.sort_values(by=['ID'], inplace=True)
-    airport_codes.to_csv('/mnt/c/Program Files/PostgreSQL/12/data/airnav_airport_codes.csv',index=False)
+            cursor.execute(SQL)
+            row = cursor.fetchone() if fetch else None
+            conn.commit()
+        finally:
+            cursor.close()
+    return row
+
+# function to check whether the upstream task reported the source of a table as unchanged
+def source_unchanged(unchanged_check, context):
+    '''
+    unchanged_check is a dictionary with the upstream task_id and the table loaded from its source.
+    Return True if the upstream task returned 'unchanged' and the table is already loaded.
+    '''
+    if unchanged_check is None:
+        return False
+    if context['ti'].xcom_pull(task_ids=unchanged_check['task_id']) != 'unchanged':
+        return False
+    table = unchanged_check['table']
+    return bool(run_sql(TABLE_EXISTS_SQL.format(table), fetch=True)[0] and run_sql(TABLE_HAS_ROWS_SQL.format(table), fetch=True)[0])
+
+# function to skip a task when the upstream task reported its source as unchanged
+def skip_if_unchanged(unchanged_check, context):
+    '''Skip the task (AirflowSkipException) if the source of the table of unchanged_check is unchanged and the table is already loaded'''
+    if source_unchanged(unchanged_check, context):
+        raise AirflowSkipException('Source of ' + unchanged_check['table'] + ' is unchanged and the table is already loaded')
+
+# function to fingerprint a source file
+def fingerprint_source(filename, **context):
+    '''
+    Compute the fingerprint of the source file and compare it with the one of the last successful run.
+    The fingerprint is pushed to xcom (key fingerprint) and stored by record_source_fingerprints at the end of the run.
+    Returns 'unchanged' or 'changed', so the load chain of the file can skip when it is unchanged.
+    '''
+    store = fingerprints.FingerprintStore(SOURCE_FINGERPRINTS_FILE)
+    path = DATA_DIR + filename
+    previous = store.get(path)
+    fingerprint = fingerprints.file_fingerprint(path, previous)
+    context['ti'].xcom_push(key='fingerprint', value=fingerprint)
+    if fingerprints.is_unchanged(previous, fingerprint):
+        logging.info(path + ' is unchanged since the last successful run')
+        return 'unchanged'
+    return 'changed'
+
+# function to store the fingerprints of the source files after a successful run
+def record_source_fingerprints(**context):
+    '''Store the fingerprints computed at the start of the run, as the run has loaded and validated the source files'''
+    store = fingerprints.FingerprintStore(SOURCE_FINGERPRINTS_FILE)
+    for task_id in SOURCE_FILES:
+        fingerprint = context['ti'].xcom_pull(task_ids=task_id, key='fingerprint')
+        if fingerprint is not None:
+            store.put(fingerprint)
+
+# function to return the unchanged_check of a table loaded from a fingerprinted source file
+def source_unchanged_check(table):
+    '''Return the unchanged_check (see skip_if_unchanged) for a table loaded from one of SOURCE_FILES'''
+    for task_id, source in SOURCE_FILES.items():
+        if table in source['tables']:
+            return {'task_id' : task_id, 'table' : table}
+    raise KeyError(table)
+
+# function to return the unchanged_check of a src/stg table
+def stage_unchanged_check(table):
+    '''
+    Return the unchanged_check (see skip_if_unchanged) of the src/stg table: the airport codes table is loaded from
+    the airports file, the accident/trip tables from SOURCE_FILES. None for the tables loaded from other tables
+    '''
+    if table.lower() == '"src_db".stg_src_airport_codes':
+        return {'task_id' : 'create_airports_file', 'table' : table}
+    for source in SOURCE_FILES.values():
+        if table.lower() in [source_table.lower() for source_table in source['tables']]:
+            return source_unchanged_check(table)
+    return None
+
+# function to return the tables loaded from unchanged source files
+def unchanged_source_tables(context):
+    '''Return the set of tables (lower case) loaded from the SOURCE_FILES which are unchanged since the last successful run'''
+    unchanged_tables = set()
+    for task_id, source in SOURCE_FILES.items():
+        if context['ti'].xcom_pull(task_ids=task_id) == 'unchanged':
+            unchanged_tables.update(table.lower() for table in source['tables'])
+    return unchanged_tables
+
+# function to push the number of rows a task loaded into a table
+def push_row_count(context, table, rows):
+    '''Push the number of rows the task wrote into the table to XCom (key row_count), for the row count validation'''
+    context['ti'].xcom_push(key='row_count', value={'table' : table, 'rows' : rows})
+
+# function to return the number of rows the tasks of the run loaded into tables
+def loaded_row_counts(context, tables):
+    '''
+    Return a dictionary of table and (rows written by its load task in the run, whether it is the exact row count),
+    from the row_count XComs of the tasks writing the tables (see dataflow module). The rows written into a src/stg
+    table, created empty in the run, are its exact row count; a core table also has the rows of previous runs
+    '''
+    task_ids = sorted(set(task_id for table in tables for task_id in dataflow.writers(table)))
+    if not task_ids:
+        return {}
+    pushed = dict((row_count['table'].lower(), row_count['rows'])
+                  for row_count in context['ti'].xcom_pull(task_ids=task_ids, key='row_count') or ()
+                  if row_count is not None)
+    return dict((table, (pushed[table.lower()], bulk_load.is_transient(table))) for table in tables
+                if table.lower() in pushed)
+
+# function to check whether the src/stg tables are loaded in bulk load mode
+def bulk_load_mode():
+    '''
+    Return True when the airflow variable bulk_load_mode is set to true in this environment.
+    In bulk load mode the src/stg tables are UNLOGGED, loaded with COPY FREEZE where possible,
+    and get their primary key after the load (see bulk_load module)
+    '''
+    return Variable.get('bulk_load_mode', default_var='false').lower() == 'true'
 
-# function to create table in local postgres database
-def create_table(SQL):
-    '''Create tables in the local postgres database'''
-    pghook = PostgresHook('postgres_local')
-    pghook.run(SQL)
+# function to check whether the accidents and trips are loaded incrementally
+def incremental_load_mode():
+    '''
+    Return True when the airflow variable incremental_load_mode is set to true in this environment.
+    In incremental mode only the accidents/trips past the high watermark of their source (etl_watermark table)
+    are inserted into the stage tables and the facts, and the watermark is moved after the facts are committed
+    '''
+    return Variable.get('incremental_load_mode', default_var='false').lower() == 'true'
+
+# function to check whether the src tables are loaded from the parquet landing zone
+def parquet_landing_mode():
+    '''
+    Return True when the airflow variable parquet_landing_mode is set to true in this environment.
+    The accident and taxi files are then converted once into typed parquet files, and the src tables are loaded from them
+    '''
+    return Variable.get('parquet_landing_mode', default_var='false').lower() == 'true'
+
+# function to check whether the source files are validated before they are loaded
+def prevalidate_mode():
+    '''
+    Return True when the airflow variable prevalidate_mode is set to true in this environment.
+    The rows of a source file are then validated against the src table schema before COPY,
+    and the rows failing validation are written to a reject file instead of failing the load (see prevalidate module)
+    '''
+    return Variable.get('prevalidate_mode', default_var='false').lower() == 'true'
+
+# function to check whether the fact tables are built by the vectorized fact builder
+def vectorized_fact_mode():
+    '''
+    Return True when the airflow variable vectorized_fact_mode is set to true in this environment.
+    The fact tables are then built outside of postgres by worker processes, which resolve the foreign keys
+    from in-memory dimension maps and COPY the fact rows (see facts module), instead of by the fact SQLs
+    '''
+    return Variable.get('vectorized_fact_mode', default_var='false').lower() == 'true'
+
+# function to check whether the fact tables are loaded in chunks
+def chunked_fact_mode():
+    '''
+    Return True when the airflow variable chunked_fact_mode is set to true in this environment.
+    The fact tables are then loaded in chunks of stage keys, each committed with a checkpoint (see chunks module)
+    '''
+    return Variable.get('chunked_fact_mode', default_var='false').lower() == 'true'
+
+# function to return the number of stage rows per chunk of the chunked fact load
+def fact_chunk_rows():
+    '''Return the airflow variable fact_chunk_rows, the number of stage rows per chunk (FACT_CHUNK_ROWS by default)'''
+    return int(Variable.get('fact_chunk_rows', default_var=FACT_CHUNK_ROWS))
+
+# function to return the psycopg2 connection arguments of an airflow connection
+def connect_kwargs(pghook):
+    '''Return the psycopg2.connect arguments of the connection of the hook, for worker processes to open their own connections'''
+    connection = pghook.get_connection(pghook.postgres_conn_id)
+    return {'host' : connection.host, 'port' : connection.port or 5432, 'user' : connection.login,
+            'password' : connection.password, 'dbname' : connection.schema}
+
+# function to check whether the stg accident/trip tables are views over the src tables
+def stage_view_mode():
+    '''
+    Return True when the airflow variable stage_view_mode is set to true in this environment.
+    The stg accident/trip tables are then created as views over their src tables instead of being loaded with a copy
+    of every src row; their audit columns are filled in when the fact load reads them
+    '''
+    return Variable.get('stage_view_mode', default_var='false').lower() == 'true'
+
+# function to return the path of the parquet file of a source file
+def parquet_path(filename):
+    '''Return the path of the parquet file for the source file in the landing zone'''
+    return PARQUET_DIR + os.path.splitext(filename)[0] + '.parquet'
+
+# function to convert a source file into the parquet landing zone
+def convert_to_parquet(filename, create_sql, fingerprint_task_id, **context):
+    '''
+    Convert the source .csv file into a parquet file typed with the schema of its src table (create_sql).
+    Skipped when not in parquet landing mode, or when the file is unchanged and its parquet file exists already
+    '''
+    if not parquet_landing_mode():
+        raise AirflowSkipException('Not in parquet landing mode')
+    path = parquet_path(filename)
+    if context['ti'].xcom_pull(task_ids=fingerprint_task_id) == 'unchanged' and os.path.exists(path):
+        raise AirflowSkipException(filename + ' is unchanged and already converted to ' + path)
+    # import the landing module, which converts the source files into typed parquet files
+    import landing
+    landing.csv_to_parquet(DATA_DIR + filename, path, create_sql)
+
+# function to create or update the core tables in local postgres database
+def deploy_core_schema():
+    '''
+    Create the core tables, or apply the changes of their DDL since the last deployment, in one transaction
+    (see schema_deploy module); nothing is run when the schema is current.
+    Returns the seconds spent on each DDL (pushed to XCom)
+    '''
+    with pg_pool().connection() as conn:
+        return schema_deploy.deploy(conn, schema_deploy.CORE_SCHEMA, versioned=True)
+
+# function to create the src/stg tables in local postgres database
+def deploy_stage_schema(**context):
+    '''
+    Drop and create the src/stg tables for the load of the run, in one transaction (see schema_deploy module).
+    The tables of unchanged sources which are already loaded are kept.
+    In bulk load mode the tables are created UNLOGGED and without their primary key.
+    In stage view mode the stg accident/trip tables are created as views over their src table (with the watermark
+    filter in incremental mode). Returns the seconds spent on each DDL (pushed to XCom)
+    '''
+    view_mode = stage_view_mode()
+    bulk_mode = bulk_load_mode()
+    incremental_mode = incremental_load_mode()
+    schema = []
+    for ddl in schema_deploy.STAGE_SCHEMA:
+        if source_unchanged(stage_unchanged_check(ddl.table), context):
+            logging.info('Source of ' + ddl.table + ' is unchanged and the table is already loaded, it is kept')
+            continue
+        if view_mode and ddl.table.lower() in STAGE_VIEW_TABLES:
+            view_SQL, incremental_view_SQL = STAGE_VIEW_TABLES[ddl.table.lower()]
+            schema.append(ddl._replace(sql=incremental_view_SQL if incremental_mode else view_SQL))
+        elif bulk_mode:
+            schema.append(ddl._replace(sql=bulk_load.bulk_load_ddl(ddl.sql)))
+        else:
+            schema.append(ddl)
+    with pg_pool().connection() as conn:
+        return schema_deploy.deploy(conn, schema)
 
 # function to copy the source file into src_db schema table in local postgres database
-def copy_table(tablename, filename):
-    '''Copy data from source files (.csv files) into src stage tables in the local postgres database'''
+def copy_table(tablename, filename, partitions=1, unchanged_check=None, **context):
+    '''
+    Copy data from source files (.csv files) into src stage tables in the local postgres database.
+    The file is streamed from the worker with COPY FROM STDIN (.gz/.zst files are decompressed on the fly).
+    With partitions > 1 the file is split into byte ranges which are copied in parallel over separate connections,
+    without the primary key of the table, which is added back after the load.
+    In bulk load mode a single stream load uses COPY FREEZE, and the primary key is added after the load.
+    In parquet landing mode the table is loaded from the parquet file of the source file, when there is one.
+    In pre-load validation mode only the rows passing validation are loaded, the others go to a reject file.
+    The number of rows copied is pushed to XCom for the row count validation
+    '''
+    skip_if_unchanged(unchanged_check, context)
+    bulk_mode = bulk_load_mode()
     pghook = PostgresHook('postgres_local')
-    pghook.run(COPY_SQL.format(tablename, filename))
+    started = time.monotonic()
+    if parquet_landing_mode() and os.path.exists(parquet_path(filename)):
+        import landing
+        with pg_pool().connection() as conn:
+            stats = landing.copy_from_parquet(conn, tablename, parquet_path(filename))
+            if bulk_mode:
+                bulk_load.ensure_primary_key(conn.cursor(), tablename)
+            conn.commit()
+    elif prevalidate_mode():
+        # import the prevalidate module, which quarantines the malformed rows of a source file before it is loaded
+        import prevalidate
+        validator = prevalidate.PreLoadValidator(TABLE_CREATE_SQL[tablename.lower()])
+        with pg_pool().connection() as conn:
+            stats = loaders.copy_from_chunks(conn, tablename, validator.iter_clean_csv(DATA_DIR + filename, REJECTS_DIR + filename + '.rejects.csv'))
+            if bulk_mode:
+                bulk_load.ensure_primary_key(conn.cursor(), tablename)
+            conn.commit()
+        if validator.rejected:
+            logging.warning(str(validator.rejected) + ' rows of ' + filename + ' failed validation, see ' + REJECTS_DIR + filename + '.rejects.csv')
+    elif bulk_mode and partitions <= 1:
+        with pg_pool().connection() as conn:
+            stats = loaders.copy_from_file(conn, tablename, DATA_DIR + filename, freeze=True)
+            bulk_load.ensure_primary_key(conn.cursor(), tablename)
+            conn.commit()
+    else:
+        stats = loaders.copy_from_file_parallel(pghook.get_conn, tablename, DATA_DIR + filename, partitions)
+        if bulk_mode:
+            with pg_pool().connection() as conn:
+                bulk_load.ensure_primary_key(conn.cursor(), tablename)
+                conn.commit()
+    push_row_count(context, tablename, stats['rows'])
+    bulk_load.record_load_time(LOAD_STATS_FILE, tablename, bulk_mode, time.monotonic() - started)
 
 # function to INSERT/UPDATE data into the table in local postgres database
-def insert_update_table(SQL):
-    '''INSERT/UPDATE data into the table in local postgres database'''
-    pghook = PostgresHook('postgres_local')
-    pghook.run(SQL)
+def insert_update_table(SQL, incremental_SQL=None, unchanged_check=None, **context):
+    '''
+    INSERT/UPDATE data into the table in local postgres database.
+    In incremental mode incremental_SQL, if given, is run instead of SQL.
+    In bulk load mode the primary key of a stg table is added after the INSERT, in the same transaction.
+    In stage view mode nothing is inserted into the stg tables which are views.
+    The number of rows inserted into a stg table is pushed to XCom for the row count validation
+    '''
+    if stage_view_mode() and bulk_load.inserted_table(SQL).lower() in STAGE_VIEW_TABLES:
+        raise AirflowSkipException(bulk_load.inserted_table(SQL) + ' is a view over its src table in stage view mode')
+    skip_if_unchanged(unchanged_check, context)
+    if incremental_SQL is not None and incremental_load_mode():
+        SQL = incremental_SQL
+    tablename = bulk_load.inserted_table(SQL)
+    if not bulk_load.is_transient(tablename):
+        run_sql(SQL)
+        return
+    bulk_mode = bulk_load_mode()
+    started = time.monotonic()
+    with pg_pool().connection() as conn:
+        cursor = conn.cursor()
+        try:
+            cursor.execute(SQL)
+            rows = max(cursor.rowcount, 0)
+            if bulk_mode:
+                bulk_load.ensure_primary_key(cursor, tablename)
+            conn.commit()
+        finally:
+            cursor.close()
+    push_row_count(context, tablename, rows)
+    bulk_load.record_load_time(LOAD_STATS_FILE, tablename, bulk_mode, time.monotonic() - started)
+
+# function to INSERT data into a fact table in local postgres database
+def insert_update_fact_table(SQL, chunk_SQL=None, watermark_SQL=None, unchanged_check=None, **context):
+    '''
+    INSERT data into the partitioned fact table in local postgres database, partition by partition with SQL
+    (a fact SQL limited to the start date keys of one partition, see partitions module), committing each partition.
+    The partitions the stage rows need are created first.
+    In vectorized fact mode the fact table is built by the facts module instead, with FACT_BUILDER_WORKERS processes.
+    In chunked fact mode it is loaded with chunk_SQL, one committed and checkpointed chunk of stage keys at a time
+    (see chunks module); a retry of the task resumes after the last committed chunk.
+    In incremental mode the watermark is moved with watermark_SQL, once all the facts are committed.
+    The secondary indexes of the fact table (see indexes module) are dropped before a full load and built after the load;
+    incremental loads, which add few rows, maintain them instead.
+    The number of facts loaded by the run (by the attempts before a chunked load resumed, too) is pushed to XCom
+    for the row count validation
+    '''
+    skip_if_unchanged(unchanged_check, context)
+    # import the facts module, which builds the fact tables with in-memory dimension maps
+    import facts
+    tablename = bulk_load.inserted_table(SQL)
+    pool = pg_pool()
+    with pool.connection() as conn:
+        if not incremental_load_mode():
+            indexes.drop_indexes(conn.cursor(), tablename)
+            conn.commit()
+        if vectorized_fact_mode():
+            partitions.ensure_partitions(conn.cursor(), tablename)
+            conn.commit()
+            metrics = facts.build_fact(tablename, connect_kwargs(PostgresHook('postgres_local')), FACT_BUILDER_WORKERS)
+            logging.info('Foreign keys not found in their dimension : ' + str(metrics['unresolved']))
+        elif chunk_SQL is not None and chunked_fact_mode():
+            partitions.ensure_partitions(conn.cursor(), tablename)
+            conn.commit()
+            loader = chunks.ChunkedFactLoader(conn, tablename, context['run_id'], chunk_SQL,
+                                              facts.FACTS[tablename]['stage_table'], chunk_rows=fact_chunk_rows())
+            metrics = loader.load()
+        else:
+            metrics = partitions.load_by_partition(conn, tablename, SQL)
+    push_row_count(context, tablename, metrics.get('run_rows', metrics['rows']))
+    indexes.build_indexes(pool.acquire, [tablename], release=pool.release)
+    if watermark_SQL is not None and incremental_load_mode():
+        run_sql(watermark_SQL)
 
 # function to crate indexes on the tables for faster query performance
-def create_indexes(SQL):
-    '''Create indexes on the tables to improve query performance'''
-    pghook = PostgresHook('postgres_local')
-    pghook.run(SQL)
+def create_indexes(tables):
+    '''
+    Create indexes on the tables to improve query performance.
+    The registered indexes of the tables (see indexes module) are built in parallel, the indexes of the stg tables
+    which are views in stage view mode excepted. Returns the seconds spent on each index build (pushed to XCom)
+    '''
+    if stage_view_mode():
+        tables = [table for table in tables if table.lower() not in STAGE_VIEW_TABLES]
+    pool = pg_pool()
+    return indexes.build_indexes(pool.acquire, tables, release=pool.release)
 
 # funcation to validate the row count in the tables
-def validate_row_count(schema):
+def validate_row_count(schema, tables=None, **context):
     '''
-    Validate row count for each table.
+    Validate row count for each table of the schema (of tables only, if given).
     If the row count for a table is less than the minimum defined for that table, then log an error and fail the task
     If the row count for a table is greater than the minimum defined for that table, then log the info and succeed the task
+    The tables are not counted row by row: the rows written by their load in the run, the catalog estimate or a probe of
+    at most the minimum rows are used instead, and the tables which need a query are checked in parallel (see row_counts module)
+    The tables of a source file which is unchanged since the last run are not counted again when the previous count was
+    exact (the rows loaded into a src/stg table); only the exact counts are saved, a lower bound or an estimate is not
+    The validations of the src/stg tables gate the next loads of their source (see dataflow module)
     '''
 
-    # extract only the required tables from the dataframe (src/stg/core tables list)
-    DF_STG_SRC_TABLES = DF_ROW_CNT_VALDTN[DF_ROW_CNT_VALDTN['table'].str.contains(schema+'.')]
-    pghook = PostgresHook('postgres_local')
-    conn = pghook.get_conn()
-    cursor = conn.cursor()
+    # tables loaded from source files which are unchanged since the last successful run
+    unchanged_tables = unchanged_source_tables(context)
+
+    # in incremental mode the stage tables of the accidents/trips only hold the rows past the watermark
+    incremental_mode = incremental_load_mode()
+    row_counts_file = os.path.join(ROW_COUNTS_DIR, context['ti'].task_id + '.json')
+    try:
+        with open(row_counts_file) as row_counts_json:
+            saved_counts = json.load(row_counts_json)
+    except (OSError, ValueError):
+        saved_counts = {}
+
+    # extract only the required tables from the dictionary (src/stg/core tables list)
+    schema_tables = [row for row in DICT_ROW_CNT_VALDTN if schema + '.' in row['table']
+                     and (tables is None or row['table'].lower() in [table.lower() for table in tables])]
+    minimums = {}
+    for row in schema_tables:
+        min_rows = int(row['min_row_cnt'])
+        if incremental_mode and row['table'].lower() in INCREMENTAL_STG_TABLES:
+            min_rows = 0
+        minimums[row['table']] = min_rows
+
+    # the previous count of the tables of unchanged sources, and the rows written by the loads of the run for the others
+    counts = {}
+    for table in minimums:
+        if table.lower() in unchanged_tables and table.lower() in saved_counts:
+            logging.info('Source of ' + table + ' is unchanged, reusing the previous row count')
+            counts[table] = row_counts.RowCount(saved_counts[table.lower()], row_counts.PREVIOUS_RUN)
+    loaded = loaded_row_counts(context, [table for table in minimums if table not in counts])
+    pool = pg_pool()
+    counts.update(row_counts.row_counts(pool.acquire, dict((table, min_rows) for table, min_rows in minimums.items()
+                                                           if table not in counts),
+                                        loaded, release=pool.release))
 
     # validate the row count for each table
-    for ix, row in DF_STG_SRC_TABLES.iterrows():
-        table = row[0]
-        min_rows = int(row[1])
-        cursor.execute(VALIDATE_ROW_CNT_SQL.format(table))
-        result = cursor.fetchall()
-        row_cnt = int(result[0][0])
+    failed = False
+    for row in schema_tables:
+        table = row['table']
+        min_rows = minimums[table]
+        row_cnt, method = counts[table]
+        if row_counts.is_exact(counts[table]):
+            saved_counts[table.lower()] = row_cnt
+        else:
+            saved_counts.pop(table.lower(), None)
+        lower_bound = method in (row_counts.PROBE, row_counts.LOADED_LOWER_BOUND) and row_cnt >= min_rows
+        rows_desc = ('at least ' if lower_bound else '') + str(row_cnt) + ' (' + method + ')'
         if row_cnt < min_rows:
-            logging.error('Row count validation FAILED for : '+table+'. Number of rows in the table = '+str(row_cnt)+', Minimum rows expected = '+str(min_rows))
-            sys.exit(200)
+            logging.error('Row count validation FAILED for : '+table+'. Number of rows in the table = '+rows_desc+', Minimum rows expected = '+str(min_rows))
+            failed = True
         else:
-            logging.info('Row count validation PASSED for : '+table+'. Number of rows in the table = '+str(row_cnt))
+            logging.info('Row count validation PASSED for : '+table+'. Number of rows in the table = '+rows_desc)
+    if failed:
+        sys.exit(200)
+
+    os.makedirs(ROW_COUNTS_DIR, exist_ok=True)
+    with open(row_counts_file, 'w') as row_counts_json:
+        json.dump(saved_counts, row_counts_json, indent=2)
 
 
 # funcation to validate for duplicates in core tables based on natural keys
-def validate_nat_keys_dup():
+def validate_nat_keys_dup(**context):
     '''
     Validate duplicates for each core table based on natural key
     For a natural key, there should be only one row in the table.
     If there are more than one row, then that indicates an issue. So the validation task will be marked as FAIL
+    The tables of a source file which is unchanged since the last run received no rows, so they are not validated again
     '''
 
-    pghook = PostgresHook('postgres_local')
-    conn = pghook.get_conn()
-    cursor = conn.cursor()
-
-    # validate the row count for each table based on natural key
-    for ix, row in DF_NAT_KEYS_DUP_VALDTN.iterrows():
-        table = row[0]
-        columns = row[1]
-        cursor.execute(VALIDATE_NAT_KEYS_DUP_SQL.format(table, columns))
-        result = cursor.fetchall()
-        if len(result) > 0:
-            logging.error('Duplicate row count validation FAILED for : '+table+'. There are duplicates for natural keys = {'+columns+'}, Please check the downstream pipeline/source data for any data issues.')
-            sys.exit(300)
-        else:
-            logging.info('Duplicate row count validation PASSED for : '+table)
+    # tables loaded from source files which are unchanged since the last successful run
+    unchanged_tables = unchanged_source_tables(context)
+
+    # validate the row count for each table based on natural key, over a pooled connection which is released
+    # before the task fails
+    with pg_pool().connection() as conn:
+        cursor = conn.cursor()
+        try:
+            for row in DICT_NAT_KEYS_DUP_VALDTN:
+                table = row['table']
+                columns = row['natural_key']
+                if table.lower() in unchanged_tables:
+                    logging.info('Source of ' + table + ' is unchanged, duplicate row count validation is not repeated')
+                    continue
+                cursor.execute(VALIDATE_NAT_KEYS_DUP_SQL.format(table, columns))
+                result = cursor.fetchall()
+                if len(result) > 0:
+                    logging.error('Duplicate row count validation FAILED for : '+table+'. There are duplicates for natural keys = {'+columns+'}, Please check the downstream pipeline/source data for any data issues.')
+                    sys.exit(300)
+                else:
+                    logging.info('Duplicate row count validation PASSED for : '+table)
+        finally:
+            cursor.close()
+
+
+# function to report the critical path of the run
+def report_critical_path(**context):
+    '''
+    Log the critical path of the run (see dataflow module): the chain of tasks and dependencies which bounded
+    the wall time of the run. Returns the path (pushed to XCom)
+    '''
+    timings = dict((ti.task_id, (ti.start_date, ti.end_date)) for ti in context['dag_run'].get_task_instances()
+                   if ti.task_id != context['ti'].task_id)
+    upstream = dict((task_id, list(task.upstream_task_ids)) for task_id, task in context['dag'].task_dict.items())
+    path = dataflow.critical_path(timings, upstream)
+    dataflow.log_critical_path(path)
+    return path
 
 
 # Define various airflow tasks
@@ -157,160 +710,67 @@ create_airports_file_task = PythonOperator (
 )
 
 
-# Define tasks to create src/stg/core tables
-
-create_stg_src_airport_codes_table_task = PythonOperator(
-    task_id = 'create_stg_src_airport_codes_table',
-    dag = dag,
-    op_kwargs = {'SQL' : CREATE_TABLE_SRC_AIRPORT_CODES_SQL},
-    python_callable=create_table
-)
-
-create_stg_src_us_accidents_table_task = PythonOperator(
-    task_id = 'create_stg_src_us_accidents_table',
-    dag = dag,
-    op_kwargs = {'SQL' : CREATE_TABLE_SRC_US_ACCIDENTS_SQL},
-    python_callable=create_table
-)
-
-create_stg_src_dc_taxi_trips_table_task = PythonOperator(
-    task_id = 'create_stg_src_dc_trips_table',
-    dag = dag,
-    op_kwargs = {'SQL' : CREATE_TABLE_SRC_DC_TAXI_TRIPS_SQL},
-    python_callable=create_table
-)
-
-create_stg_address_table_task = PythonOperator(
-    task_id = 'create_stg_address_table',
-    dag = dag,
-    op_kwargs = {'SQL' : CREATE_TABLE_STG_ADDRESS_SQL},
-    python_callable=create_table
-)
-
-create_stg_accident_condition_table_task = PythonOperator(
-    task_id = 'create_stg_accident_condition_table',
-    dag = dag,
-    op_kwargs = {'SQL' : CREATE_TABLE_STG_ACCIDENT_CONDITION_SQL},
-    python_callable=create_table
-)
-
-create_stg_airport_table_task = PythonOperator(
-    task_id = 'create_stg_airport_table',
-    dag = dag,
-    op_kwargs = {'SQL' : CREATE_TABLE_STG_AIRPORT_SQL},
-    python_callable=create_table
-)
-
-create_stg_weather_condition_table_task = PythonOperator(
-    task_id = 'create_stg_weather_condition_table',
-    dag = dag,
-    op_kwargs = {'SQL' : CREATE_TABLE_STG_WEATHER_CONDITION_SQL},
-    python_callable=create_table
-)
-
-create_stg_provider_table_task = PythonOperator(
-    task_id = 'create_stg_provider_table',
-    dag = dag,
-    op_kwargs = {'SQL' : CREATE_TABLE_STG_PROVIDER_SQL},
-    python_callable=create_table
-)
-
-create_stg_source_table_task = PythonOperator(
-    task_id = 'create_stg_source_table',
-    dag = dag,
-    op_kwargs = {'SQL' : CREATE_TABLE_STG_SOURCE_SQL},
-    python_callable=create_table
-)
-
-create_stg_accident_table_task = PythonOperator(
-    task_id = 'create_stg_accident_table',
-    dag = dag,
-    op_kwargs = {'SQL' : CREATE_TABLE_STG_ACCIDENT_SQL},
-    python_callable=create_table
-)
-
-create_stg_trip_table_task = PythonOperator(
-    task_id = 'create_stg_trip_table',
-    dag = dag,
-    op_kwargs = {'SQL' : CREATE_TABLE_STG_TRIP_SQL},
-    python_callable=create_table
-)
-
-create_dim_date_table_task = PythonOperator(
-    task_id = 'create_dim_date_table',
-    dag = dag,
-    op_kwargs = {'SQL' : CREATE_TABLE_DIM_DATE_SQL},
-    python_callable=create_table
-)
-
-create_dim_time_table_task = PythonOperator(
-    task_id = 'create_dim_time_table',
-    dag = dag,
-    op_kwargs = {'SQL' : CREATE_TABLE_DIM_TIME_SQL},
-    python_callable=create_table
-)
-
-create_dim_address_table_task = PythonOperator(
-    task_id = 'create_dim_address_table',
+# tasks to fingerprint the source files, so the load of an unchanged file can be skipped
+fingerprint_us_accidents_file_task = PythonOperator(
+    task_id = 'fingerprint_us_accidents_file',
     dag = dag,
-    op_kwargs = {'SQL' : CREATE_TABLE_DIM_ADDRESS_SQL},
-    python_callable=create_table
+    op_kwargs = {'filename' : SOURCE_FILES['fingerprint_us_accidents_file']['filename']},
+    provide_context = True,
+    python_callable = fingerprint_source
 )
 
-create_dim_acc_cond_task = PythonOperator(
-    task_id = 'create_dim_acc_cond_table',
+fingerprint_dc_taxi_trips_file_task = PythonOperator(
+    task_id = 'fingerprint_dc_taxi_trips_file',
     dag = dag,
-    op_kwargs = {'SQL' : CREATE_TABLE_DIM_ACC_COND_SQL},
-    python_callable=create_table
+    op_kwargs = {'filename' : SOURCE_FILES['fingerprint_dc_taxi_trips_file']['filename']},
+    provide_context = True,
+    python_callable = fingerprint_source
 )
 
-create_dim_airport_task = PythonOperator(
-    task_id = 'create_dim_airport_table',
+# tasks to convert the source files into the parquet landing zone (parquet landing mode only)
+convert_us_accidents_to_parquet_task = PythonOperator(
+    task_id = 'convert_us_accidents_to_parquet',
     dag = dag,
-    op_kwargs = {'SQL' : CREATE_TABLE_DIM_AIRPORT_SQL},
-    python_callable=create_table
+    op_kwargs = {'filename' : 'US_Accidents_Dec19.csv',
+                 'create_sql' : CREATE_TABLE_SRC_US_ACCIDENTS_SQL,
+                 'fingerprint_task_id' : 'fingerprint_us_accidents_file'},
+    provide_context = True,
+    python_callable = convert_to_parquet
 )
 
-create_dim_wthr_cond_task = PythonOperator(
-    task_id = 'create_dim_wthr_cond_table',
+convert_dc_taxi_trips_to_parquet_task = PythonOperator(
+    task_id = 'convert_dc_taxi_trips_to_parquet',
     dag = dag,
-    op_kwargs = {'SQL' : CREATE_TABLE_DIM_WTHR_COND_SQL},
-    python_callable=create_table
+    op_kwargs = {'filename' : 'taxi_final.csv',
+                 'create_sql' : CREATE_TABLE_SRC_DC_TAXI_TRIPS_SQL,
+                 'fingerprint_task_id' : 'fingerprint_dc_taxi_trips_file'},
+    provide_context = True,
+    python_callable = convert_to_parquet
 )
 
-create_lkp_provider_task = PythonOperator(
-    task_id = 'create_lkp_provider_table',
-    dag = dag,
-    op_kwargs = {'SQL' : CREATE_TABLE_LKP_PROVIDER_SQL},
-    python_callable=create_table
-)
 
-create_lkp_source_task = PythonOperator(
-    task_id = 'create_lkp_source_table',
-    dag = dag,
-    op_kwargs = {'SQL' : CREATE_TABLE_LKP_SOURCE_SQL},
-    python_callable=create_table
-)
+# Define tasks to deploy the DDL of the core tables and of the src/stg tables
 
-create_fact_accident_task = PythonOperator(
-    task_id = 'create_fact_accident_table',
+deploy_core_schema_task = PythonOperator(
+    task_id = 'deploy_core_schema',
     dag = dag,
-    op_kwargs = {'SQL' : CREATE_TABLE_FACT_ACCIDENT_SQL},
-    python_callable=create_table
+    python_callable = deploy_core_schema
 )
 
-create_fact_trip_task = PythonOperator(
-    task_id = 'create_fact_trip_table',
+deploy_stage_schema_task = PythonOperator(
+    task_id = 'deploy_stage_schema',
     dag = dag,
-    op_kwargs = {'SQL' : CREATE_TABLE_FACT_TRIP_SQL},
-    python_callable=create_table
+    provide_context = True,
+    python_callable = deploy_stage_schema
 )
 
 copy_stg_src_airport_codes_task = PythonOperator(
     task_id = 'copy_stg_src_airport_codes_table',
     dag = dag,
     op_kwargs = {'tablename' : '"SRC_DB".stg_src_airport_codes',
-                 'filename' : 'airnav_airport_codes.csv'},
+                 'filename' : 'airnav_airport_codes.csv',
+                 'unchanged_check' : {'task_id' : 'create_airports_file', 'table' : '"SRC_DB".stg_src_airport_codes'}},
+    provide_context = True,
     python_callable=copy_table
 )
 
@@ -319,16 +779,24 @@ copy_stg_src_airport_codes_task = PythonOperator(
 copy_stg_src_us_accidents_task = PythonOperator(
     task_id = 'copy_stg_src_us_accidents_table',
     dag = dag,
+    trigger_rule = 'none_failed',
     op_kwargs = {'tablename' : '"SRC_DB".stg_src_us_accidents',
-                 'filename' : 'US_Accidents_Dec19.csv'},
+                 'filename' : 'US_Accidents_Dec19.csv',
+                 'partitions' : COPY_PARTITIONS,
+                 'unchanged_check' : source_unchanged_check('"SRC_DB".stg_src_us_accidents')},
+    provide_context = True,
     python_callable=copy_table
 )
 
 copy_stg_src_dc_taxi_trips_task = PythonOperator(
     task_id = 'copy_stg_src_dc_taxi_trips_table',
     dag = dag,
+    trigger_rule = 'none_failed',
     op_kwargs = {'tablename' : '"SRC_DB".stg_src_dc_taxi_trips',
-                 'filename' : 'taxi_final.csv'},
+                 'filename' : 'taxi_final.csv',
+                 'partitions' : COPY_PARTITIONS,
+                 'unchanged_check' : source_unchanged_check('"SRC_DB".stg_src_dc_taxi_trips')},
+    provide_context = True,
     python_callable=copy_table
 )
 
@@ -338,6 +806,7 @@ insert_stg_address_task = PythonOperator(
     task_id = 'insert_stg_address_table',
     dag = dag,
     op_kwargs = {'SQL' : INSERT_STG_ADDRESS_SQL},
+    provide_context = True,
     python_callable=insert_update_table
 )
 
@@ -345,6 +814,7 @@ insert_stg_accident_condition_task = PythonOperator(
     task_id = 'insert_stg_accident_condition_table',
     dag = dag,
     op_kwargs = {'SQL' : INSERT_STG_ACCIDENT_CONDITION_SQL},
+    provide_context = True,
     python_callable=insert_update_table
 )
 
@@ -352,6 +822,7 @@ insert_stg_airport_task = PythonOperator(
     task_id = 'insert_stg_airport_table',
     dag = dag,
     op_kwargs = {'SQL' : INSERT_STG_AIRPORT_SQL},
+    provide_context = True,
     python_callable=insert_update_table
 )
 
@@ -359,6 +830,7 @@ insert_stg_weather_condition_task = PythonOperator(
     task_id = 'insert_stg_weather_condition_table',
     dag = dag,
     op_kwargs = {'SQL' : INSERT_STG_WEATHER_CONDITION_SQL},
+    provide_context = True,
     python_callable=insert_update_table
 )
 
@@ -366,6 +838,7 @@ insert_stg_provider_task = PythonOperator(
     task_id = 'insert_stg_provider_table',
     dag = dag,
     op_kwargs = {'SQL' : INSERT_STG_PROVIDER_SQL},
+    provide_context = True,
     python_callable=insert_update_table
 )
 
@@ -373,20 +846,27 @@ insert_stg_source_task = PythonOperator(
     task_id = 'insert_stg_source_table',
     dag = dag,
     op_kwargs = {'SQL' : INSERT_STG_SOURCE_SQL},
+    provide_context = True,
     python_callable=insert_update_table
 )
 
 insert_stg_accident_task = PythonOperator(
     task_id = 'insert_stg_accident_table',
     dag = dag,
-    op_kwargs = {'SQL' : INSERT_STG_ACCIDENT_SQL},
+    op_kwargs = {'SQL' : INSERT_STG_ACCIDENT_SQL,
+                 'incremental_SQL' : INSERT_STG_ACCIDENT_INCR_SQL,
+                 'unchanged_check' : source_unchanged_check('"STG_DB".stg_accident')},
+    provide_context = True,
     python_callable=insert_update_table
 )
 
 insert_stg_trip_task = PythonOperator(
     task_id = 'insert_stg_trip_table',
     dag = dag,
-    op_kwargs = {'SQL' : INSERT_STG_TRIP_SQL},
+    op_kwargs = {'SQL' : INSERT_STG_TRIP_SQL,
+                 'incremental_SQL' : INSERT_STG_TRIP_INCR_SQL,
+                 'unchanged_check' : source_unchanged_check('"STG_DB".stg_trip')},
+    provide_context = True,
     python_callable=insert_update_table
 )
 
@@ -449,39 +929,103 @@ ins_upd_lkp_source_task = PythonOperator(
 ins_upd_fact_accident_task = PythonOperator(
     task_id = 'insert_update_fact_accident_table',
     dag = dag,
-    op_kwargs = {'SQL' : INSERT_UPDATE_FACT_ACCIDENT_SQL},
-    python_callable=insert_update_table
+    op_kwargs = {'SQL' : INSERT_UPDATE_FACT_ACCIDENT_PERIOD_SQL,
+                 'chunk_SQL' : INSERT_UPDATE_FACT_ACCIDENT_CHUNK_SQL,
+                 'watermark_SQL' : UPDATE_WATERMARK_ACCIDENT_SQL,
+                 'unchanged_check' : source_unchanged_check('"CORE_DB".fact_accident')},
+    provide_context = True,
+    python_callable=insert_update_fact_table
 )
 
 ins_upd_fact_trip_task = PythonOperator(
     task_id = 'insert_update_fact_trip_table',
     dag = dag,
-    op_kwargs = {'SQL' : INSERT_UPDATE_FACT_TRIP_SQL},
-    python_callable=insert_update_table
+    op_kwargs = {'SQL' : INSERT_UPDATE_FACT_TRIP_PERIOD_SQL,
+                 'chunk_SQL' : INSERT_UPDATE_FACT_TRIP_CHUNK_SQL,
+                 'watermark_SQL' : UPDATE_WATERMARK_TRIP_SQL,
+                 'unchanged_check' : source_unchanged_check('"CORE_DB".fact_trip')},
+    provide_context = True,
+    python_callable=insert_update_fact_table
 )
 
 
-# task to create index for faster query performance
-create_indexes_task = PythonOperator(
-    task_id = 'create_indexes',
+# tasks to create the indexes of the tables of each fact load, for faster query performance
+create_accident_indexes_task = PythonOperator(
+    task_id = 'create_accident_indexes',
+    dag = dag,
+    op_kwargs = {'tables' : ['"STG_DB".stg_accident', '"CORE_DB".dim_acc_cond', '"CORE_DB".dim_wthr_cond']},
+    python_callable=create_indexes
+)
+
+create_trip_indexes_task = PythonOperator(
+    task_id = 'create_trip_indexes',
     dag = dag,
-    op_kwargs = {'SQL' : CREATE_INDEXES},
+    op_kwargs = {'tables' : ['"STG_DB".stg_trip', '"CORE_DB".lkp_provider']},
     python_callable=create_indexes
 )
 
-# task for validating the data in src tables
-validate_row_cnt_stg_src_tables_task = PythonOperator(
-    task_id = 'validate_row_cnt_stg_src_tables',
+# tasks for validating the data in src tables, one per source file, each gating the stg loads of its source
+validate_row_cnt_stg_src_airport_codes_task = PythonOperator(
+    task_id = 'validate_row_cnt_stg_src_airport_codes_table',
     dag = dag,
-    op_kwargs={'schema': '"SRC_DB"'},
+    op_kwargs={'schema': '"SRC_DB"', 'tables': [dataflow.SRC_AIRPORT_CODES]},
+    trigger_rule = 'none_failed',
+    provide_context = True,
     python_callable = validate_row_count
 )
 
-# task for validating the data in stg tables
-validate_row_cnt_stg_tables_task = PythonOperator(
-    task_id = 'validate_row_cnt_stg_tables',
+validate_row_cnt_stg_src_us_accidents_task = PythonOperator(
+    task_id = 'validate_row_cnt_stg_src_us_accidents_table',
     dag = dag,
-    op_kwargs={'schema': '"STG_DB"'},
+    op_kwargs={'schema': '"SRC_DB"', 'tables': [dataflow.SRC_US_ACCIDENTS]},
+    trigger_rule = 'none_failed',
+    provide_context = True,
+    python_callable = validate_row_count
+)
+
+validate_row_cnt_stg_src_dc_taxi_trips_task = PythonOperator(
+    task_id = 'validate_row_cnt_stg_src_dc_taxi_trips_table',
+    dag = dag,
+    op_kwargs={'schema': '"SRC_DB"', 'tables': [dataflow.SRC_DC_TAXI_TRIPS]},
+    trigger_rule = 'none_failed',
+    provide_context = True,
+    python_callable = validate_row_count
+)
+
+# tasks for validating the data in stg tables, per source, each gating the core loads of its source
+validate_row_cnt_stg_address_task = PythonOperator(
+    task_id = 'validate_row_cnt_stg_address_table',
+    dag = dag,
+    op_kwargs={'schema': '"STG_DB"', 'tables': [dataflow.STG_ADDRESS]},
+    trigger_rule = 'none_failed',
+    provide_context = True,
+    python_callable = validate_row_count
+)
+
+validate_row_cnt_stg_airport_task = PythonOperator(
+    task_id = 'validate_row_cnt_stg_airport_table',
+    dag = dag,
+    op_kwargs={'schema': '"STG_DB"', 'tables': [dataflow.STG_AIRPORT]},
+    trigger_rule = 'none_failed',
+    provide_context = True,
+    python_callable = validate_row_count
+)
+
+validate_row_cnt_stg_accident_tables_task = PythonOperator(
+    task_id = 'validate_row_cnt_stg_accident_tables',
+    dag = dag,
+    op_kwargs={'schema': '"STG_DB"', 'tables': dataflow.STG_ACCIDENT_TABLES},
+    trigger_rule = 'none_failed',
+    provide_context = True,
+    python_callable = validate_row_count
+)
+
+validate_row_cnt_stg_trip_tables_task = PythonOperator(
+    task_id = 'validate_row_cnt_stg_trip_tables',
+    dag = dag,
+    op_kwargs={'schema': '"STG_DB"', 'tables': dataflow.STG_TRIP_TABLES},
+    trigger_rule = 'none_failed',
+    provide_context = True,
     python_callable = validate_row_count
 )
 
@@ -490,6 +1034,8 @@ validate_row_cnt_core_tables_task = PythonOperator(
     task_id = 'validate_row_cnt_core_tables',
     dag = dag,
     op_kwargs={'schema': '"CORE_DB"'},
+    trigger_rule = 'none_failed',
+    provide_context = True,
     python_callable = validate_row_count
 )
 
@@ -497,25 +1043,16 @@ validate_row_cnt_core_tables_task = PythonOperator(
 validate_nat_keys_dup_tables_task = PythonOperator(
     task_id = 'validate_nat_keys_dup_core_tables',
     dag = dag,
+    provide_context = True,
     python_callable = validate_nat_keys_dup
 )
 
-# dummy task to link multiple sets of tasks
-dummy_task = DummyOperator(
-    task_id = 'stg_src_tables_created',
-    dag = dag
-)
-
-# dummy task to link multiple sets of tasks
-dummy_task1 = DummyOperator(
-    task_id = 'stg_tables_created',
-    dag = dag
-)
-
-# dummy task to link multiple sets of tasks
-dummy_task2 = DummyOperator(
-    task_id = 'core_tables_created',
-    dag = dag
+# task to store the fingerprints of the source files once the run has loaded and validated them
+record_source_fingerprints_task = PythonOperator(
+    task_id = 'record_source_fingerprints',
+    dag = dag,
+    provide_context = True,
+    python_callable = record_source_fingerprints
 )
 
 # final task at the end
@@ -524,21 +1061,17 @@ end_task = DummyOperator(
     dag = dag
 )
 
-# Define order of execution of the tasks in the DAG
+# task to report the critical path of the run, whether it succeeded or not
+report_critical_path_task = PythonOperator(
+    task_id = 'report_critical_path',
+    dag = dag,
+    trigger_rule = 'all_done',
+    provide_context = True,
+    python_callable = report_critical_path
+)
 
-start_task >> create_airports_file_task >> [create_stg_src_airport_codes_table_task, create_stg_src_us_accidents_table_task,
-                                            create_stg_src_dc_taxi_trips_table_task] >> dummy_task
-dummy_task >> [create_stg_address_table_task, create_stg_accident_condition_table_task, create_stg_airport_table_task,
-               create_stg_weather_condition_table_task, create_stg_provider_table_task, create_stg_source_table_task,
-               create_stg_accident_table_task, create_stg_trip_table_task] >> dummy_task1
-dummy_task1 >> [create_dim_date_table_task, create_dim_time_table_task, create_dim_address_table_task, create_dim_acc_cond_task,
-                create_dim_airport_task, create_dim_wthr_cond_task, create_lkp_provider_task, create_lkp_source_task, create_fact_accident_task,
-                create_fact_trip_task] >> dummy_task2
-dummy_task2 >> [copy_stg_src_airport_codes_task, copy_stg_src_us_accidents_task, copy_stg_src_dc_taxi_trips_task] >> validate_row_cnt_stg_src_tables_task
-validate_row_cnt_stg_src_tables_task >> [insert_stg_address_task, insert_stg_accident_condition_task, insert_stg_airport_task,
-                                 insert_stg_weather_condition_task, insert_stg_provider_task, insert_stg_source_task,
-                                 insert_stg_accident_task, insert_stg_trip_task] >> validate_row_cnt_stg_tables_task
-validate_row_cnt_stg_tables_task >> [ins_upd_dim_date_task, ins_upd_dim_time_task, ins_upd_dim_address_task, ins_upd_dim_acc_cond_task,
-                             ins_upd_dim_airport_task, ins_upd_dim_wthr_cond_task, ins_upd_lkp_provider_task, ins_upd_lkp_source_task] >> create_indexes_task
-create_indexes_task >> [ins_upd_fact_accident_task, ins_upd_fact_trip_task] >> validate_row_cnt_core_tables_task >> validate_nat_keys_dup_tables_task >> end_task
+# Define order of execution of the tasks in the DAG
+# The dependencies are generated from the tables each task reads and writes (see dataflow module)
 
+dataflow.set_dependencies(dag.task_dict, start_task, end_task)
+end_task >> report_critical_path_task
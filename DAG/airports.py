@@ -0,0 +1,202 @@
+'''
+This module builds the list of US airport codes used by the create_airports_file task.
+The state pages on airnav.com are fetched concurrently through a thread pool.
+Every request passes through a per-host token bucket, so the total request rate never exceeds what the site allows,
+and failed requests are retried with exponential backoff.
+The fetch backend is pluggable: any callable that accepts a url and returns the page html can be used,
+e.g. FixtureFetcher to parse saved html pages offline.
+'''
+
+# Import necessary modules
+import hashlib
+import logging
+import os
+import random
+import socket
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from io import StringIO
+from urllib.error import HTTPError, URLError
+from urllib.parse import quote, urlparse
+from urllib.request import Request, urlopen
+
+import pandas as pd
+from pandas import DataFrame
+
+STATE_CODES_URL = 'https://developers.google.com/public-data/docs/canonical/states_csv'
+AIRNAV_STATE_URL = 'https://www.airnav.com/airports/us/{}'
+
+# columns of the airport table (4th table on each airnav state page) that are kept
+AIRPORT_COLUMNS = ['ID', 'City', 'Name']
+
+# airnav answers with service unavailable when it is called continuously: the default is the rate the original
+# scraper was known to work at (one page every 5 seconds), a higher rate has to be asked for explicitly
+DEFAULT_REQUESTS_PER_SEC = 0.2
+DEFAULT_BURST = 1
+# at the default rate two workers are enough to overlap the parsing of a page with the wait for the next one
+DEFAULT_MAX_WORKERS = 2
+DEFAULT_RETRIES = 4
+DEFAULT_BACKOFF_SEC = 5
+
+# http status codes which are worth retrying
+RETRYABLE_STATUS = (429, 500, 502, 503, 504)
+
+USER_AGENT = 'Mozilla/5.0 (compatible; udacity-dend-capstone)'
+
+
+class TokenBucket(object):
+    '''
+    Thread safe token bucket.
+    Tokens are refilled at `rate` tokens per second up to `capacity`; acquire() blocks until a token is available.
+    '''
+
+    def __init__(self, rate, capacity=1):
+        self.rate = float(rate)
+        self.capacity = float(capacity)
+        self.tokens = float(capacity)
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        '''Block until a token is available and consume it'''
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+
+class HostRateLimiter(object):
+    '''Keeps one token bucket per host, so that different sites are throttled independently'''
+
+    def __init__(self, rate=DEFAULT_REQUESTS_PER_SEC, capacity=DEFAULT_BURST):
+        self.rate = rate
+        self.capacity = capacity
+        self.buckets = {}
+        self.lock = threading.Lock()
+
+    def acquire(self, url):
+        '''Block until a request to the host of the url is allowed'''
+        host = urlparse(url).netloc
+        with self.lock:
+            bucket = self.buckets.get(host)
+            if bucket is None:
+                bucket = self.buckets[host] = TokenBucket(self.rate, self.capacity)
+        bucket.acquire()
+
+
+# function used as the default fetch backend
+def urllib_fetch(url, timeout=30):
+    '''Fetch the url over http and return the response body as text'''
+    request = Request(url, headers={'User-Agent': USER_AGENT})
+    with urlopen(request, timeout=timeout) as response:
+        charset = response.headers.get_content_charset() or 'utf-8'
+        return response.read().decode(charset, errors='replace')
+
+
+class FixtureFetcher(object):
+    '''
+    Offline fetch backend which serves saved html pages from a directory.
+    The file name for a url is its quoted form, e.g. https%3A%2F%2Fwww.airnav.com%2Fairports%2Fus%2FCA.html
+    '''
+
+    def __init__(self, fixtures_dir):
+        self.fixtures_dir = fixtures_dir
+
+    @staticmethod
+    def file_name(url):
+        '''Return the fixture file name for the url'''
+        return quote(url, safe='') + '.html'
+
+    def __call__(self, url):
+        with open(os.path.join(self.fixtures_dir, self.file_name(url)), encoding='utf-8') as fixture:
+            return fixture.read()
+
+
+# function to fetch a url honouring the rate limit and retrying transient failures
+def fetch_with_retries(fetch, url, limiter, retries=DEFAULT_RETRIES, backoff_sec=DEFAULT_BACKOFF_SEC):
+    '''
+    Fetch the url using the fetch backend.
+    Every attempt waits for a token from the limiter, unless the backend reports (via needs_network) that the url is served locally.
+    Transient failures (connection errors, timeouts, 429/5xx responses) are retried with exponential backoff and jitter.
+    '''
+    needs_network = getattr(fetch, 'needs_network', None)
+    if needs_network is not None and not needs_network(url):
+        return fetch(url)
+    attempt = 0
+    while True:
+        limiter.acquire(url)
+        try:
+            return fetch(url)
+        except HTTPError as err:
+            if err.code not in RETRYABLE_STATUS or attempt >= retries:
+                raise
+            retry_after = err.headers.get('Retry-After') if err.headers else None
+            delay = float(retry_after) if retry_after and retry_after.isdigit() else backoff_sec * (2 ** attempt)
+        except (URLError, socket.timeout, ConnectionError):
+            if attempt >= retries:
+                raise
+            delay = backoff_sec * (2 ** attempt)
+        attempt += 1
+        delay += random.uniform(0, backoff_sec)
+        logging.warning('Fetching ' + url + ' failed, retry ' + str(attempt) + ' of ' + str(retries) + ' in ' + str(round(delay, 1)) + ' seconds')
+        time.sleep(delay)
+
+
+# function to parse the list of state codes out of the states page
+def parse_state_codes(html):
+    '''Return the list of US state codes from the html of the states page'''
+    return list(pd.read_html(StringIO(html))[0]['state'])
+
+
+# function to parse the airport codes out of an airnav state page
+def parse_airport_codes(html):
+    '''Return a dataframe with the airport codes from the html of an airnav state page'''
+    return pd.read_html(StringIO(html))[3][AIRPORT_COLUMNS]
+
+
+# function to fetch the airport codes of all US states
+def fetch_airport_codes(fetch=urllib_fetch, requests_per_sec=DEFAULT_REQUESTS_PER_SEC, burst=DEFAULT_BURST,
+                        max_workers=DEFAULT_MAX_WORKERS, retries=DEFAULT_RETRIES, backoff_sec=DEFAULT_BACKOFF_SEC):
+    '''
+    Fetch the list of state codes and then the airnav page of each state concurrently.
+    Pages are parsed in the worker threads as soon as they arrive, so parsing overlaps with waiting on the rate limit.
+    A state whose page can not be fetched or parsed is logged and skipped.
+    Returns a single dataframe sorted by airport ID.
+    '''
+
+    limiter = HostRateLimiter(requests_per_sec, burst)
+    state_codes = parse_state_codes(fetch_with_retries(fetch, STATE_CODES_URL, limiter, retries, backoff_sec))
+
+    def fetch_state(state_code):
+        url = AIRNAV_STATE_URL.format(state_code)
+        try:
+            df = parse_airport_codes(fetch_with_retries(fetch, url, limiter, retries, backoff_sec))
+        except Exception as err:
+            logging.warning('Skipping ' + url + ' : ' + repr(err))
+            return None
+        logging.info(url)
+        return df
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        frames = [df for df in executor.map(fetch_state, state_codes) if df is not None]
+
+    # concatenate once at the end instead of growing the dataframe in the loop
+    if frames:
+        airport_codes = pd.concat(frames, ignore_index=True)
+    else:
+        airport_codes = DataFrame(columns=AIRPORT_COLUMNS)
+    airport_codes.sort_values(by=['ID'], inplace=True)
+    return airport_codes
+
+
+# function to fingerprint the parsed airport codes
+def table_digest(airport_codes):
+    '''Return the sha256 of the airport codes dataframe as it is written to the .csv file'''
+    return hashlib.sha256(airport_codes.to_csv(index=False).encode('utf-8')).hexdigest()
@@ -0,0 +1,92 @@
+'''
+This module implements the bulk load mode for the src/stg tables.
+These tables are dropped and recreated on every run, so they do not need crash safety:
+in bulk load mode they are created UNLOGGED (no WAL) and without their primary key.
+Single stream COPYs use FREEZE inside the transaction that truncates the table, and the primary key
+is built once, with a single sort, after the table is loaded instead of being maintained row by row.
+The load time of each table is kept per mode, so the speedup of one mode over the other can be reported.
+'''
+
+# Import necessary modules
+import json
+import logging
+import os
+import re
+
+from SQLs import DICT_TRANSIENT_TABLES, HAS_PRIMARY_KEY_SQL, ADD_PRIMARY_KEY_SQL
+
+CREATE_TABLE_PATTERN = re.compile(r'CREATE TABLE (\S+) \(')
+PRIMARY_KEY_PATTERN = re.compile(r',\s*PRIMARY KEY\s*\(([^)]*)\)\);')
+INSERT_INTO_PATTERN = re.compile(r'INSERT INTO\s+(\S+)', re.IGNORECASE)
+
+# dictionary of transient table name (lower case) and its create table SQL
+TRANSIENT_TABLES = dict((row['table'].lower(), row['create_sql']) for row in DICT_TRANSIENT_TABLES)
+
+
+# function to return the table name of a create table SQL
+def created_table(create_sql):
+    '''Return the name of the table created by the SQL, or None'''
+    match = CREATE_TABLE_PATTERN.search(create_sql)
+    return match.group(1) if match else None
+
+
+# function to return the table name of an insert SQL
+def inserted_table(insert_sql):
+    '''Return the name of the table loaded by the INSERT SQL, or None'''
+    match = INSERT_INTO_PATTERN.search(insert_sql)
+    return match.group(1) if match else None
+
+
+# function to check whether a table is dropped and recreated every run
+def is_transient(table):
+    '''Return True for the src/stg tables which are dropped and recreated every run'''
+    return table is not None and table.lower() in TRANSIENT_TABLES
+
+
+# function to return the primary key columns of a transient table
+def primary_key(table):
+    '''Return the primary key columns of the transient table as in its create table SQL'''
+    return PRIMARY_KEY_PATTERN.search(TRANSIENT_TABLES[table.lower()]).group(1)
+
+
+# function to rewrite a create table SQL for the bulk load mode
+def bulk_load_ddl(create_sql):
+    '''Return the create table SQL of a transient table as an UNLOGGED table without its primary key'''
+    if not is_transient(created_table(create_sql)):
+        return create_sql
+    create_sql = create_sql.replace('CREATE TABLE', 'CREATE UNLOGGED TABLE', 1)
+    return PRIMARY_KEY_PATTERN.sub(');', create_sql, count=1)
+
+
+# function to build the primary key of a table after the bulk load
+def ensure_primary_key(cursor, table):
+    '''Add the primary key of the transient table, unless the table already has one'''
+    cursor.execute(HAS_PRIMARY_KEY_SQL.format(table))
+    if cursor.fetchone()[0]:
+        return
+    columns = primary_key(table)
+    logging.info('Adding primary key (' + columns + ') on ' + table)
+    cursor.execute(ADD_PRIMARY_KEY_SQL.format(table, columns))
+
+
+# function to keep the load time of a table per mode and report the speedup
+def record_load_time(stats_file, table, bulk_mode, seconds):
+    '''
+    Save the load time of the table for the mode (bulk/normal) in the json stats file and log the speedup
+    compared to the last load of the table in the other mode, if there is one.
+    '''
+    try:
+        with open(stats_file) as stats_json:
+            stats = json.load(stats_json)
+    except (OSError, ValueError):
+        stats = {}
+    mode, other_mode = ('bulk', 'normal') if bulk_mode else ('normal', 'bulk')
+    table_stats = stats.setdefault(table.lower(), {})
+    table_stats[mode] = seconds
+    if other_mode in table_stats:
+        bulk_seconds, normal_seconds = table_stats['bulk'], table_stats['normal']
+        logging.info('{} : bulk load {:.1f} s, normal load {:.1f} s, speedup {:.2f}x'.format(
+            table, bulk_seconds, normal_seconds, normal_seconds / max(bulk_seconds, 1e-6)))
+    os.makedirs(os.path.dirname(stats_file), exist_ok=True)
+    with open(stats_file, 'w') as stats_json:
+        json.dump(stats, stats_json, indent=2)
@@ -0,0 +1,97 @@
+'''
+This module loads a fact table in chunks instead of one multi-million row INSERT.
+The stage table is walked in ranges of its key (ID), chunk_rows keys at a time, in key order.
+Each chunk runs the fact SQL limited to its key range and is committed together with its checkpoint
+(the upper key of the chunk, in the etl_checkpoint table), so a failed load keeps the chunks committed before it,
+and a retry of the same run resumes after the last committed chunk instead of starting over.
+Every chunk logs its latency and throughput.
+'''
+
+# Import necessary modules
+import logging
+import time
+
+from SQLs import GET_CHECKPOINT_SQL, NEXT_CHUNK_SQL, SAVE_CHECKPOINT_SQL
+
+# number of stage rows per chunk
+DEFAULT_CHUNK_ROWS = 250 * 1000
+
+# lower bound of the first chunk (every key is greater than the empty string)
+FIRST_KEY = ''
+
+
+class ChunkedFactLoader(object):
+    '''
+    Loads a fact table with chunk_sql (a fact SQL with the %(low)s/%(high)s key range parameters)
+    from the stage table, chunk by chunk, over the connection (psycopg2).
+    load_name identifies the load in the checkpoint table, run_id the run loading it:
+    a checkpoint of the same run which did not complete is resumed, any other checkpoint is started over.
+    metrics has the chunks and rows committed by this load, the seconds spent, and the latency of the slowest chunk,
+    and run_rows, the rows committed by the run (those of the load resumed from included, as in the checkpoint).
+    '''
+
+    def __init__(self, conn, load_name, run_id, chunk_sql, stage_table, stage_key='ID', chunk_rows=DEFAULT_CHUNK_ROWS):
+        self.conn = conn
+        self.load_name = load_name
+        self.run_id = run_id
+        self.chunk_sql = chunk_sql
+        self.next_chunk_sql = NEXT_CHUNK_SQL.format(key=stage_key, table=stage_table)
+        self.chunk_rows = chunk_rows
+        self.metrics = {'chunks': 0, 'rows': 0, 'run_rows': 0, 'seconds': 0.0, 'max_chunk_seconds': 0.0}
+
+    def checkpoint(self, cursor):
+        '''Return (last key, chunks, rows) to resume the load from'''
+        cursor.execute(GET_CHECKPOINT_SQL, {'load_name': self.load_name})
+        row = cursor.fetchone()
+        if row is None:
+            return FIRST_KEY, 0, 0
+        run_id, last_key, chunks, rows, completed = row
+        if run_id != self.run_id or completed:
+            return FIRST_KEY, 0, 0
+        logging.info('{} : resuming run {} after key {} ({:,} chunks, {:,} rows committed)'.format(
+            self.load_name, run_id, last_key, chunks, rows))
+        return last_key, chunks, rows
+
+    def save_checkpoint(self, cursor, last_key, chunks, rows, completed):
+        cursor.execute(SAVE_CHECKPOINT_SQL, {'load_name': self.load_name, 'run_id': self.run_id, 'last_key': last_key,
+                                             'chunks': chunks, 'rows': rows, 'completed': completed})
+
+    def load(self):
+        '''Load the fact table chunk by chunk from the checkpoint; returns the metrics'''
+        started = time.monotonic()
+        cursor = self.conn.cursor()
+        try:
+            low, chunks, rows = self.checkpoint(cursor)
+            self.conn.commit()
+            while True:
+                chunk_started = time.monotonic()
+                cursor.execute(self.next_chunk_sql, {'low': low, 'rows': self.chunk_rows})
+                high, stage_rows = cursor.fetchone()
+                if stage_rows == 0:
+                    break
+                cursor.execute(self.chunk_sql, {'low': low, 'high': high})
+                chunk_rows = max(cursor.rowcount, 0)
+                chunks += 1
+                rows += chunk_rows
+                self.save_checkpoint(cursor, high, chunks, rows, False)
+                self.conn.commit()
+                elapsed = max(time.monotonic() - chunk_started, 1e-6)
+                self.metrics['chunks'] += 1
+                self.metrics['rows'] += chunk_rows
+                self.metrics['max_chunk_seconds'] = max(self.metrics['max_chunk_seconds'], elapsed)
+                logging.info('{} : chunk {} ({} .. {}] {:,} stage rows, {:,} rows loaded in {:.2f} s ({:,.0f} rows/sec)'.format(
+                    self.load_name, chunks, low, high, stage_rows, chunk_rows, elapsed, chunk_rows / elapsed))
+                low = high
+            self.save_checkpoint(cursor, low, chunks, rows, True)
+            self.conn.commit()
+            self.metrics['run_rows'] = rows
+        except Exception:
+            self.conn.rollback()
+            raise
+        finally:
+            cursor.close()
+        self.metrics['seconds'] = time.monotonic() - started
+        logging.info('{} : {:,} chunks, {:,} rows loaded in {:.1f} s ({:,.0f} rows/sec, slowest chunk {:.2f} s)'.format(
+            self.load_name, self.metrics['chunks'], self.metrics['rows'], self.metrics['seconds'],
+            self.metrics['rows'] / max(self.metrics['seconds'], 1e-6), self.metrics['max_chunk_seconds']))
+        return self.metrics
@@ -0,0 +1,156 @@
+'''
+This module is a process-wide pool of database connections, shared by the task functions of the DAG, so a task running
+many small statements (or the threads of a task) does not pay for a new connection per statement.
+A connection is acquired from the pool and explicitly released back to it (or used with the connection() context
+manager). At most max_size connections are open at a time; acquire waits for a released connection beyond that.
+Idle connections are health checked before they are handed out again: a closed connection is discarded, and one idle
+for longer than the health check interval is probed with SELECT 1 and discarded when the probe fails.
+A released connection is rolled back (if a transaction is open) and set back to autocommit off.
+'''
+
+# Import necessary modules
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+# default number of connections open at a time
+DEFAULT_MAX_SIZE = 8
+
+# seconds a connection can be idle before it is probed when acquired
+HEALTH_CHECK_INTERVAL = 30
+
+# default seconds acquire waits for a connection when max_size connections are in use
+DEFAULT_TIMEOUT = 300
+
+# pools of the process (name as key), see shared_pool
+_POOLS = {}
+_POOLS_LOCK = threading.Lock()
+
+
+class PoolTimeout(Exception):
+    '''Raised when no connection was released within the timeout of acquire'''
+
+
+class ConnectionPool(object):
+    '''
+    Pool of the connections (psycopg2) returned by connect(), at most max_size open at a time. Thread safe.
+    stats has the connections opened, reused and discarded (closed or failing their health check).
+    '''
+
+    def __init__(self, connect, max_size=DEFAULT_MAX_SIZE, health_check_interval=HEALTH_CHECK_INTERVAL):
+        self.connect = connect
+        self.max_size = max_size
+        self.health_check_interval = health_check_interval
+        # idle connections with the time they were released, most recent last
+        self.idle = []
+        # connections open, idle or in use
+        self.open = 0
+        self.condition = threading.Condition()
+        self.stats = {'opened': 0, 'reused': 0, 'discarded': 0}
+
+    def _healthy(self, conn, released):
+        if conn.closed:
+            return False
+        if time.monotonic() - released < self.health_check_interval:
+            return True
+        try:
+            cursor = conn.cursor()
+            try:
+                cursor.execute('SELECT 1')
+                cursor.fetchone()
+            finally:
+                cursor.close()
+            conn.rollback()
+            return True
+        except Exception:
+            logging.warning('Discarding a pooled connection which failed its health check', exc_info=True)
+            return False
+
+    def _discard(self, conn):
+        try:
+            conn.close()
+        except Exception:
+            pass
+        with self.condition:
+            self.open -= 1
+            self.stats['discarded'] += 1
+            self.condition.notify()
+
+    def acquire(self, timeout=DEFAULT_TIMEOUT):
+        '''Return a healthy connection, a new one if none is idle; waits up to timeout seconds when the pool is full'''
+        deadline = time.monotonic() + timeout
+        while True:
+            with self.condition:
+                while not self.idle and self.open >= self.max_size:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        raise PoolTimeout('No connection released within {} s ({} open)'.format(timeout, self.open))
+                    self.condition.wait(remaining)
+                if self.idle:
+                    conn, released = self.idle.pop()
+                else:
+                    conn, released = None, None
+                    self.open += 1
+            if conn is None:
+                try:
+                    conn = self.connect()
+                except Exception:
+                    with self.condition:
+                        self.open -= 1
+                        self.condition.notify()
+                    raise
+                with self.condition:
+                    self.stats['opened'] += 1
+                return conn
+            # the health check runs outside of the lock
+            if self._healthy(conn, released):
+                with self.condition:
+                    self.stats['reused'] += 1
+                return conn
+            self._discard(conn)
+
+    def release(self, conn, discard=False):
+        '''Give the connection back to the pool, rolled back; discard closes it instead (e.g. after an error)'''
+        if not discard and not conn.closed:
+            try:
+                conn.rollback()
+                conn.autocommit = False
+            except Exception:
+                discard = True
+        if discard or conn.closed:
+            self._discard(conn)
+            return
+        with self.condition:
+            self.idle.append((conn, time.monotonic()))
+            self.condition.notify()
+
+    @contextmanager
+    def connection(self, timeout=DEFAULT_TIMEOUT):
+        '''Context manager acquiring a connection and releasing it at the end (discarded when it was closed)'''
+        conn = self.acquire(timeout)
+        try:
+            yield conn
+        finally:
+            self.release(conn)
+
+    def close_all(self):
+        '''Close the idle connections; the connections in use are closed when released'''
+        with self.condition:
+            idle, self.idle = self.idle, []
+        for conn, _ in idle:
+            self._discard(conn)
+
+
+# function to return the pool of the process
+def shared_pool(name, connect, max_size=DEFAULT_MAX_SIZE):
+    '''
+    Return the pool named name of this process, created with connect and max_size on first use.
+    A forked process (e.g. a task run by the executor) gets pools of its own, as connections can not be shared by processes
+    '''
+    key = (name, os.getpid())
+    with _POOLS_LOCK:
+        if key not in _POOLS:
+            _POOLS[key] = ConnectionPool(connect, max_size)
+        return _POOLS[key]
@@ -0,0 +1,286 @@
+'''
+This module generates the dependencies of the DAG from a registry of the tables (and files) each task reads and writes.
+The registry lists the tasks in the order of a sequential run of the pipeline. A task depends on the task which last
+wrote a table it reads or writes (read after write, write after write), and on the tasks which read a table it writes
+since that table was last written (write after read); redundant dependencies are removed (transitive reduction).
+So a task waits only for the tasks it shares a table with: e.g. the trip tasks do not wait for the accident tasks,
+except for dim_address, which both fact tables use.
+Rows of a shared control table which belong to one load (etl_watermark, etl_checkpoint) are registered per load,
+so the accident and trip loads do not serialize on them.
+The row count validations gate the loads per source chain: a validation reads the tables it checks and writes their
+validated state, which the next loads of the chain read, so e.g. the trip stg loads wait for the row count validation
+of the trip src table, not for the accident COPY. The core validations run once the core tables are loaded, and the
+source fingerprints are only recorded when every validation passed, so a failed validation makes the next run load again.
+The module also reports the critical path of a run: the chain of tasks, from the last task to finish back to the
+start, where each task was released by its upstream task which finished last.
+'''
+
+# Import necessary modules
+import logging
+from collections import namedtuple
+
+# task and the tables/files it reads and writes
+Step = namedtuple('Step', ['task_id', 'reads', 'writes'])
+
+# source files
+ACCIDENTS_FILE = 'US_Accidents_Dec19.csv'
+TRIPS_FILE = 'taxi_final.csv'
+AIRPORTS_FILE = 'airnav_airport_codes.csv'
+
+# file of the fingerprints recorded after a run, and result of the natural key validation
+SOURCE_FINGERPRINTS_FILE = 'source_fingerprints.json'
+NATURAL_KEY_VALIDATION = 'natural key validation'
+
+SRC_AIRPORT_CODES = '"SRC_DB".stg_src_airport_codes'
+SRC_US_ACCIDENTS = '"SRC_DB".stg_src_us_accidents'
+SRC_DC_TAXI_TRIPS = '"SRC_DB".stg_src_dc_taxi_trips'
+STG_ADDRESS = '"STG_DB".stg_address'
+STG_ACCIDENT_CONDITION = '"STG_DB".stg_accident_condition'
+STG_AIRPORT = '"STG_DB".stg_airport'
+STG_WEATHER_CONDITION = '"STG_DB".stg_weather_condition'
+STG_PROVIDER = '"STG_DB".stg_provider'
+STG_SOURCE = '"STG_DB".stg_source'
+STG_ACCIDENT = '"STG_DB".stg_accident'
+STG_TRIP = '"STG_DB".stg_trip'
+DIM_DATE = '"CORE_DB".dim_date'
+DIM_TIME = '"CORE_DB".dim_time'
+DIM_ADDRESS = '"CORE_DB".dim_address'
+DIM_ACC_COND = '"CORE_DB".dim_acc_cond'
+DIM_AIRPORT = '"CORE_DB".dim_airport'
+DIM_WTHR_COND = '"CORE_DB".dim_wthr_cond'
+LKP_PROVIDER = '"CORE_DB".lkp_provider'
+LKP_SOURCE = '"CORE_DB".lkp_source'
+FACT_ACCIDENT = '"CORE_DB".fact_accident'
+FACT_TRIP = '"CORE_DB".fact_trip'
+ETL_WATERMARK = '"CORE_DB".etl_watermark'
+ETL_CHECKPOINT = '"CORE_DB".etl_checkpoint'
+
+SRC_TABLES = [SRC_AIRPORT_CODES, SRC_US_ACCIDENTS, SRC_DC_TAXI_TRIPS]
+STG_TABLES = [STG_ADDRESS, STG_ACCIDENT_CONDITION, STG_AIRPORT, STG_WEATHER_CONDITION, STG_PROVIDER, STG_SOURCE,
+              STG_ACCIDENT, STG_TRIP]
+CORE_TABLES = [DIM_DATE, DIM_TIME, DIM_ADDRESS, DIM_ACC_COND, DIM_AIRPORT, DIM_WTHR_COND, LKP_PROVIDER, LKP_SOURCE,
+               FACT_ACCIDENT, FACT_TRIP]
+
+# stg tables loaded from one source file only, validated together
+STG_ACCIDENT_TABLES = [STG_ACCIDENT_CONDITION, STG_WEATHER_CONDITION, STG_SOURCE, STG_ACCIDENT]
+STG_TRIP_TABLES = [STG_PROVIDER, STG_TRIP]
+
+
+# function to return the fingerprint of a source file (pushed to XCom by its fingerprint task)
+def fingerprint(filename):
+    return filename + ' fingerprint'
+
+
+# function to return the parquet file of a source file
+def parquet(filename):
+    return filename + ' parquet'
+
+
+# function to return the rows of a control table which belong to one load
+def rows_of(table, load):
+    return table + ' rows of ' + load
+
+
+# function to return the validated state of a table (written by its row count validation)
+def validated(table):
+    return table + ' validated'
+
+
+# function to return the tables and their validated state, for a step which may only read validated tables
+def checked(*tables):
+    return list(tables) + [validated(table) for table in tables]
+
+
+# function to return the step of a row count validation
+def row_count_validation(task_id, tables):
+    return Step(task_id, tables, [validated(table) for table in tables])
+
+
+# dimensions and date/time key functions (created with dim_date and dim_time) of the fact loads
+ACCIDENT_DIMENSIONS = [DIM_DATE, DIM_TIME, DIM_ADDRESS, DIM_ACC_COND, DIM_AIRPORT, DIM_WTHR_COND, LKP_SOURCE]
+TRIP_DIMENSIONS = [DIM_DATE, DIM_TIME, DIM_ADDRESS, LKP_PROVIDER]
+
+# The tasks of the DAG in the order of a sequential run
+STEPS = [
+    Step('fingerprint_us_accidents_file', [ACCIDENTS_FILE], [fingerprint(ACCIDENTS_FILE)]),
+    Step('fingerprint_dc_taxi_trips_file', [TRIPS_FILE], [fingerprint(TRIPS_FILE)]),
+    Step('create_airports_file', [], [AIRPORTS_FILE]),
+    Step('convert_us_accidents_to_parquet', [ACCIDENTS_FILE, fingerprint(ACCIDENTS_FILE)], [parquet(ACCIDENTS_FILE)]),
+    Step('convert_dc_taxi_trips_to_parquet', [TRIPS_FILE, fingerprint(TRIPS_FILE)], [parquet(TRIPS_FILE)]),
+
+    # the DDL of the core tables, then of the src/stg tables, which keeps the tables of unchanged sources
+    # (see schema_deploy module). In stage view mode the stg accident/trip views are created over their src table
+    # (with the watermark filter in incremental mode)
+    Step('deploy_core_schema', [], CORE_TABLES + [ETL_WATERMARK, ETL_CHECKPOINT]),
+    Step('deploy_stage_schema', [AIRPORTS_FILE, fingerprint(ACCIDENTS_FILE), fingerprint(TRIPS_FILE), ETL_WATERMARK],
+         SRC_TABLES + STG_TABLES),
+
+    Step('copy_stg_src_airport_codes_table', [AIRPORTS_FILE], [SRC_AIRPORT_CODES]),
+    Step('copy_stg_src_us_accidents_table', [ACCIDENTS_FILE, fingerprint(ACCIDENTS_FILE), parquet(ACCIDENTS_FILE)],
+         [SRC_US_ACCIDENTS]),
+    Step('copy_stg_src_dc_taxi_trips_table', [TRIPS_FILE, fingerprint(TRIPS_FILE), parquet(TRIPS_FILE)],
+         [SRC_DC_TAXI_TRIPS]),
+
+    # the row count validation of each src table gates the stg loads of its source
+    row_count_validation('validate_row_cnt_stg_src_airport_codes_table', [SRC_AIRPORT_CODES]),
+    row_count_validation('validate_row_cnt_stg_src_us_accidents_table', [SRC_US_ACCIDENTS]),
+    row_count_validation('validate_row_cnt_stg_src_dc_taxi_trips_table', [SRC_DC_TAXI_TRIPS]),
+
+    Step('insert_stg_address_table', checked(SRC_US_ACCIDENTS, SRC_DC_TAXI_TRIPS), [STG_ADDRESS]),
+    Step('insert_stg_accident_condition_table', checked(SRC_US_ACCIDENTS), [STG_ACCIDENT_CONDITION]),
+    Step('insert_stg_airport_table', checked(SRC_AIRPORT_CODES), [STG_AIRPORT]),
+    Step('insert_stg_weather_condition_table', checked(SRC_US_ACCIDENTS), [STG_WEATHER_CONDITION]),
+    Step('insert_stg_provider_table', checked(SRC_DC_TAXI_TRIPS), [STG_PROVIDER]),
+    Step('insert_stg_source_table', checked(SRC_US_ACCIDENTS), [STG_SOURCE]),
+    Step('insert_stg_accident_table',
+         [fingerprint(ACCIDENTS_FILE), ETL_WATERMARK, rows_of(ETL_WATERMARK, 'us_accidents')] + checked(SRC_US_ACCIDENTS),
+         [STG_ACCIDENT]),
+    Step('insert_stg_trip_table',
+         [fingerprint(TRIPS_FILE), ETL_WATERMARK, rows_of(ETL_WATERMARK, 'dc_taxi_trips')] + checked(SRC_DC_TAXI_TRIPS),
+         [STG_TRIP]),
+
+    # the row count validation of the stg tables of each source (stg_address has two) gates the core loads of the source
+    row_count_validation('validate_row_cnt_stg_address_table', [STG_ADDRESS]),
+    row_count_validation('validate_row_cnt_stg_airport_table', [STG_AIRPORT]),
+    row_count_validation('validate_row_cnt_stg_accident_tables', STG_ACCIDENT_TABLES),
+    row_count_validation('validate_row_cnt_stg_trip_tables', STG_TRIP_TABLES),
+
+    Step('insert_update_dim_date_table', [], [DIM_DATE]),
+    Step('insert_update_dim_time_table', [], [DIM_TIME]),
+    Step('insert_update_dim_address_table', checked(STG_ADDRESS), [DIM_ADDRESS]),
+    Step('insert_update_dim_acc_cond_table', checked(STG_ACCIDENT_CONDITION), [DIM_ACC_COND]),
+    Step('insert_update_dim_airport_table', checked(STG_AIRPORT), [DIM_AIRPORT]),
+    Step('insert_update_dim_wthr_cond_table', checked(STG_WEATHER_CONDITION), [DIM_WTHR_COND]),
+    Step('insert_update_lkp_provider_table', checked(STG_PROVIDER), [LKP_PROVIDER]),
+    Step('insert_update_lkp_source_table', checked(STG_SOURCE), [LKP_SOURCE]),
+
+    # the registered indexes of the tables (see indexes module) of each fact load
+    Step('create_accident_indexes', [], [STG_ACCIDENT, DIM_ACC_COND, DIM_WTHR_COND]),
+    Step('create_trip_indexes', [], [STG_TRIP, LKP_PROVIDER]),
+
+    Step('insert_update_fact_accident_table',
+         [fingerprint(ACCIDENTS_FILE), ETL_WATERMARK, ETL_CHECKPOINT] + checked(STG_ACCIDENT) + ACCIDENT_DIMENSIONS,
+         [FACT_ACCIDENT, rows_of(ETL_WATERMARK, 'us_accidents'), rows_of(ETL_CHECKPOINT, FACT_ACCIDENT)]),
+    Step('insert_update_fact_trip_table',
+         [fingerprint(TRIPS_FILE), ETL_WATERMARK, ETL_CHECKPOINT] + checked(STG_TRIP) + TRIP_DIMENSIONS,
+         [FACT_TRIP, rows_of(ETL_WATERMARK, 'dc_taxi_trips'), rows_of(ETL_CHECKPOINT, FACT_TRIP)]),
+
+    row_count_validation('validate_row_cnt_core_tables', CORE_TABLES),
+    Step('validate_nat_keys_dup_core_tables', CORE_TABLES, [NATURAL_KEY_VALIDATION]),
+    Step('record_source_fingerprints',
+         [fingerprint(ACCIDENTS_FILE), fingerprint(TRIPS_FILE), NATURAL_KEY_VALIDATION] +
+         [validated(table) for table in CORE_TABLES],
+         [SOURCE_FINGERPRINTS_FILE])
+]
+
+
+# function to remove the redundant dependencies
+def transitive_reduction(edges):
+    '''Return the (upstream, downstream) edges without those implied by a longer path between the same tasks'''
+    downstream = {}
+    for upstream_id, downstream_id in edges:
+        downstream.setdefault(upstream_id, set()).add(downstream_id)
+
+    def reachable(source, target):
+        # whether target is reachable from source other than by the direct edge
+        stack = [task_id for task_id in downstream.get(source, ()) if task_id != target]
+        seen = set(stack)
+        while stack:
+            task_id = stack.pop()
+            if task_id == target:
+                return True
+            for next_id in downstream.get(task_id, ()):
+                if next_id not in seen:
+                    seen.add(next_id)
+                    stack.append(next_id)
+        return False
+
+    return set(edge for edge in edges if not reachable(*edge))
+
+
+# function to derive the dependencies of the tasks from the tables they read and write
+def derive_dependencies(steps=STEPS):
+    '''Return the set of (upstream task_id, downstream task_id) dependencies of the steps'''
+    last_writer = {}
+    readers = {}
+    edges = set()
+    for step in steps:
+        for table in step.reads:
+            if table in last_writer:
+                edges.add((last_writer[table], step.task_id))
+        for table in step.writes:
+            if table in last_writer:
+                edges.add((last_writer[table], step.task_id))
+            edges.update((reader, step.task_id) for reader in readers.get(table, ()))
+        for table in step.reads:
+            readers.setdefault(table, []).append(step.task_id)
+        for table in step.writes:
+            last_writer[table] = step.task_id
+            readers[table] = []
+    return transitive_reduction(set((upstream_id, downstream_id) for upstream_id, downstream_id in edges
+                                    if upstream_id != downstream_id))
+
+
+# function to return the tasks which write a table
+def writers(table, steps=STEPS):
+    '''Return the task_ids of the steps which write the table (any case)'''
+    return [step.task_id for step in steps if table.lower() in [written.lower() for written in step.writes]]
+
+
+# function to set the dependencies of the tasks of a DAG
+def set_dependencies(tasks, start, end, steps=STEPS):
+    '''
+    Set the dependencies derived from the steps between the tasks (a dictionary of task_id and task, e.g. dag.task_dict).
+    The tasks without an upstream task are set downstream of start, those without a downstream task upstream of end.
+    Returns the dependencies
+    '''
+    edges = derive_dependencies(steps)
+    for upstream_id, downstream_id in sorted(edges):
+        tasks[upstream_id].set_downstream(tasks[downstream_id])
+    upstream_ids = set(upstream_id for upstream_id, _ in edges)
+    downstream_ids = set(downstream_id for _, downstream_id in edges)
+    for step in steps:
+        if step.task_id not in downstream_ids:
+            start.set_downstream(tasks[step.task_id])
+        if step.task_id not in upstream_ids:
+            tasks[step.task_id].set_downstream(end)
+    return edges
+
+
+# function to find the critical path of a run
+def critical_path(timings, upstream):
+    '''
+    Return the critical path of a run as a list of dictionaries (task_id, upstream task_id, seconds, wait_seconds),
+    first task first. timings is a dictionary of task_id and (start, end) datetimes of the finished tasks,
+    upstream a dictionary of task_id and its upstream task_ids. The path goes back from the last task to finish,
+    each time to the upstream task which finished last (the dependency which released the task)
+    '''
+    finished = dict((task_id, (start, end)) for task_id, (start, end) in timings.items()
+                    if start is not None and end is not None)
+    path = []
+    task_id = max(finished, key=lambda task: finished[task][1]) if finished else None
+    while task_id is not None:
+        start, end = finished[task_id]
+        previous = [upstream_id for upstream_id in upstream.get(task_id, ()) if upstream_id in finished]
+        upstream_id = max(previous, key=lambda task: finished[task][1]) if previous else None
+        wait = (start - finished[upstream_id][1]).total_seconds() if upstream_id else 0.0
+        path.append({'task_id': task_id, 'upstream': upstream_id, 'seconds': (end - start).total_seconds(),
+                     'wait_seconds': max(wait, 0.0)})
+        task_id = upstream_id
+    path.reverse()
+    return path
+
+
+# function to log the critical path of a run
+def log_critical_path(path):
+    '''Log the tasks and dependencies of the critical path, and the task which took the longest'''
+    if not path:
+        logging.info('No finished tasks, no critical path')
+        return
+    for step in path:
+        edge = (step['upstream'] + ' >> ' if step['upstream'] else '') + step['task_id']
+        logging.info('{} : {:.1f} s (waited {:.1f} s)'.format(edge, step['seconds'], step['wait_seconds']))
+    longest = max(path, key=lambda step: step['seconds'])
+    logging.info('Critical path of {} tasks, {:.1f} s; bounded by {} ({:.1f} s)'.format(
+        len(path), sum(step['seconds'] + step['wait_seconds'] for step in path), longest['task_id'],
+        longest['seconds']))
@@ -0,0 +1,308 @@
+'''
+This module builds the fact tables outside of postgres, as an alternative to the multi-way LEFT JOIN fact SQLs.
+The natural key -> surrogate key map of every dimension is loaded into memory once (the dimensions are small),
+the stage rows are streamed in pandas batches, all foreign keys of a batch are resolved with vectorized hash lookups,
+the date/time keys are computed like the "CORE_DB".date_sk/time_sk functions, and the finished fact rows are bulk COPYed.
+The stage rows are split into partitions by a hash of their natural key, and each partition is built by its own
+worker process over its own connection, so the throughput scales with the number of workers.
+Each partition is committed on its own; rows already in the fact table are never read again, so a failed build can be rerun.
+'''
+
+# Import necessary modules
+import datetime
+import functools
+import io
+import logging
+import time
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+import keys
+from SQLs import DIM_KEY_MAP_SQL, FACT_STAGE_ROWS_SQL, COPY_COLUMNS_SQL
+
+# number of stage rows built and copied at a time
+DEFAULT_BATCH_SIZE = 100 * 1000
+
+# a foreign key of a fact resolved from a dimension: foreign key column, dimension table, surrogate key of the dimension,
+# natural key columns of the stage row and of the dimension (same order), and the value a null key column compares as
+Lookup = namedtuple('Lookup', ['fk', 'table', 'sk', 'stage_columns', 'dim_columns', 'defaults'])
+
+# a date and a time foreign key of a fact computed from a timestamp column of the stage row
+DateTimeKeys = namedtuple('DateTimeKeys', ['date_fk', 'time_fk', 'stage_column'])
+
+ACC_COND_FLAGS = ['amenity', 'bump', 'crossing', 'give_way', 'junction', 'no_exit', 'railway', 'roundabout',
+                  'station', 'stop', 'traffic_calming', 'traffic_signal', 'turning_loop']
+ACC_COND_TWILIGHTS = ['sunrise_sunset', 'civil_twilight', 'nautical_twilight', 'astronomical_twilight']
+
+# how each fact table is built from its stage table, the same way as INSERT_UPDATE_FACT_ACCIDENT_SQL/INSERT_UPDATE_FACT_TRIP_SQL.
+# columns are the (fact column, stage column) pairs copied as they are; partition_key is the start date key
+# the fact table is partitioned by, -1 when there is no start date (see partitions module)
+FACTS = {
+    '"CORE_DB".fact_accident': {
+        'stage_table': '"STG_DB".stg_accident',
+        'sk': 'accident_sk',
+        'natural_key': ('accident_id', 'id'),
+        'partition_key': 'start_date_fk',
+        'lookups': [
+            Lookup('source_fk', '"CORE_DB".lkp_source', 'source_sk', ['source'], ['source_name'], ['']),
+            Lookup('address_fk', '"CORE_DB".dim_address', 'address_sk', ['address_key'], ['address_key'], ['']),
+            Lookup('airport_fk', '"CORE_DB".dim_airport', 'airport_sk', ['airport_code'], ['id'], ['']),
+            Lookup('weather_cond_fk', '"CORE_DB".dim_wthr_cond', 'weather_cond_sk',
+                   ['wind_direction', 'weather_condition'], ['wind_direction', 'weather_condition'], ['', '']),
+            Lookup('acc_cond_fk', '"CORE_DB".dim_acc_cond', 'acc_cond_sk',
+                   ACC_COND_FLAGS + ACC_COND_TWILIGHTS, ACC_COND_FLAGS + ACC_COND_TWILIGHTS,
+                   [False] * len(ACC_COND_FLAGS) + [''] * len(ACC_COND_TWILIGHTS))
+        ],
+        'date_times': [
+            DateTimeKeys('start_date_fk', 'start_time_fk', 'start_time'),
+            DateTimeKeys('end_date_fk', 'end_time_fk', 'end_time'),
+            DateTimeKeys('weather_date_fk', 'weather_time_fk', 'weather_timestamp')
+        ],
+        'columns': [
+            ('accident_id', 'id'), ('tmc', 'tmc'), ('severity', 'severity'), ('start_ts', 'start_time'),
+            ('end_ts', 'end_time'), ('start_lat', 'start_lat'), ('start_lng', 'start_lng'), ('end_lat', 'end_lat'),
+            ('end_lng', 'end_lng'), ('distance_mi', 'distance_mi'), ('description', 'description'),
+            ('timezone', 'timezone'), ('weather_timestamp', 'weather_timestamp'), ('temperature_f', 'temperature_f'),
+            ('wind_chill_f', 'wind_chill_f'), ('humidity_pct', 'humidity_pct'), ('pressure_in', 'pressure_in'),
+            ('visibility_mi', 'visibility_mi'), ('wind_speed_mph', 'wind_speed_mph'),
+            ('precipitation_in', 'precipitation_in')
+        ]
+    },
+    '"CORE_DB".fact_trip': {
+        'stage_table': '"STG_DB".stg_trip',
+        'sk': 'trip_sk',
+        'natural_key': ('trip_id', 'id'),
+        'partition_key': 'start_date_fk',
+        'lookups': [
+            Lookup('provider_fk', '"CORE_DB".lkp_provider', 'provider_sk', ['providername'], ['provider_name'], ['']),
+            Lookup('origin_address_fk', '"CORE_DB".dim_address', 'address_sk',
+                   ['origin_address_key'], ['address_key'], ['']),
+            Lookup('destination_address_fk', '"CORE_DB".dim_address', 'address_sk',
+                   ['destination_address_key'], ['address_key'], [''])
+        ],
+        'date_times': [
+            DateTimeKeys('start_date_fk', 'start_time_fk', 'startdatetime'),
+            DateTimeKeys('datecreated_date_fk', 'datecreated_time_fk', 'datecreated'),
+            DateTimeKeys('start1_date_fk', 'start1_time_fk', 'startdatetime1'),
+            DateTimeKeys('end_date_fk', 'end_time_fk', 'enddatetime')
+        ],
+        'columns': [
+            ('trip_id', 'id'), ('trip_type', 'type'), ('external_id', 'externalid'), ('fare_amt', 'fareamount'),
+            ('gratuity_amt', 'gratuityamount'), ('srchrg_amt', 'surchargeamount'),
+            ('extra_fare_amt', 'extrafareamount'), ('toll_amt', 'tollamount'), ('total_amt', 'totalamount'),
+            ('pymt_type', 'paymenttype'), ('origin_lat', 'originlatitude'), ('origin_lon', 'originlongitude'),
+            ('dest_lat', 'destinationlatitude'), ('dest_lon', 'destinationlongitude'), ('milage', 'milage'),
+            ('trip_duration', 'duration'), ('misc', 'misc')
+        ]
+    }
+}
+
+AUDIT_COLUMNS = ['create_ts', 'create_user', 'last_updt_ts', 'last_updt_user']
+
+
+# function to hash the natural keys of a frame
+def key_hashes(frame, columns, defaults):
+    '''
+    Return a uint64 array with the hash of the natural key (columns) of each row.
+    Null values are replaced by their default first, like the COALESCEs of the fact SQLs,
+    and every value is hashed as text, so the stage rows and the dimension rows hash alike.
+    '''
+    normalized = pd.DataFrame(dict((column, frame[column].where(frame[column].notna(), default).astype(str))
+                                   for column, default in zip(columns, defaults)))
+    return pd.util.hash_pandas_object(normalized, index=False).to_numpy()
+
+
+class DimensionMap(object):
+    '''
+    The natural key -> surrogate key map of the dimension of a Lookup, held in memory as a hash index.
+    resolve returns the surrogate keys of a batch of stage rows, -1 for the rows not in the dimension.
+    '''
+
+    def __init__(self, cursor, lookup):
+        self.defaults = lookup.defaults
+        cursor.execute(DIM_KEY_MAP_SQL.format(columns=', '.join(lookup.dim_columns), sk=lookup.sk, table=lookup.table))
+        frame = pd.DataFrame(cursor.fetchall(), columns=lookup.dim_columns + [lookup.sk])
+        hashes = key_hashes(frame, lookup.dim_columns, lookup.defaults)
+        # a natural key is unique in its dimension (see DICT_NAT_KEYS_DUP_VALDTN), keep the first key otherwise
+        unique = ~pd.Series(hashes).duplicated().to_numpy()
+        self.index = pd.Index(hashes[unique])
+        self.keys = frame[lookup.sk].to_numpy(dtype='int64')[unique]
+        logging.info(lookup.table + ' : ' + str(len(self.keys)) + ' natural keys loaded')
+
+    def __len__(self):
+        return len(self.keys)
+
+    def resolve(self, batch, columns):
+        '''
+        Return an int64 array with the surrogate key of each row of the batch, -1 where it is not found.
+        columns are the natural key columns of the batch, in the order of the natural key of the dimension
+        '''
+        positions = self.index.get_indexer(key_hashes(batch, columns, self.defaults))
+        if len(self.keys) == 0:
+            return np.full(len(positions), -1, dtype='int64')
+        return np.where(positions >= 0, self.keys[np.maximum(positions, 0)], -1)
+
+
+# function to compute the date key of timestamps
+def date_keys(values):
+    '''Return the date keys (yyyymmdd, as "CORE_DB".date_sk) of the timestamps, null where the timestamp is null'''
+    values = pd.to_datetime(values)
+    return (values.dt.year * 10000 + values.dt.month * 100 + values.dt.day).astype('Int64')
+
+
+# function to compute the time key of timestamps
+def time_keys(values):
+    '''Return the time keys (seconds since midnight, as "CORE_DB".time_sk) of the timestamps, null where the timestamp is null'''
+    values = pd.to_datetime(values)
+    return (values.dt.hour * 3600 + values.dt.minute * 60 + values.dt.second).astype('Int64')
+
+
+class FactBuilder(object):
+    '''
+    Builds the rows of a fact table (one of FACTS) from its stage table over a connection (psycopg2) returned by connect.
+    The dimension maps are loaded on the first build, the surrogate keys are reserved in blocks (keys.KeyAllocator).
+    metrics has the rows and batches built, the seconds spent, and the rows of each foreign key not found in its dimension.
+    '''
+
+    def __init__(self, fact_table, connect, batch_size=DEFAULT_BATCH_SIZE):
+        self.fact_table = fact_table
+        self.spec = FACTS[fact_table]
+        self.connect = connect
+        self.batch_size = batch_size
+        self.allocator = keys.KeyAllocator(connect, fact_table, block_size=batch_size)
+        self.dimensions = None
+        self.metrics = {'rows': 0, 'batches': 0, 'seconds': 0.0,
+                        'unresolved': dict((lookup.fk, 0) for lookup in self.spec['lookups'])}
+
+    def stage_columns(self):
+        '''Return the stage columns read to build the facts'''
+        columns = [self.spec['natural_key'][1]]
+        for lookup in self.spec['lookups']:
+            columns.extend(lookup.stage_columns)
+        columns.extend(date_time.stage_column for date_time in self.spec['date_times'])
+        columns.extend(stage_column for fact_column, stage_column in self.spec['columns'])
+        return list(dict.fromkeys(columns))
+
+    def fact_columns(self):
+        '''Return the fact columns loaded, in the order of the fact table'''
+        columns = [self.spec['sk']] + [lookup.fk for lookup in self.spec['lookups']]
+        for date_time in self.spec['date_times']:
+            columns.extend([date_time.date_fk, date_time.time_fk])
+        return columns + [fact_column for fact_column, stage_column in self.spec['columns']] + AUDIT_COLUMNS
+
+    def load_dimensions(self, cursor):
+        '''Load the natural key -> surrogate key map of every dimension of the fact (once per table)'''
+        dimensions = {}
+        for lookup in self.spec['lookups']:
+            if lookup.table not in dimensions:
+                dimensions[lookup.table] = DimensionMap(cursor, lookup)
+        self.dimensions = dimensions
+
+    def build(self, batch):
+        '''Return the fact rows of a batch of stage rows as a DataFrame with the fact_columns'''
+        facts = pd.DataFrame(index=batch.index)
+        facts[self.spec['sk']] = self.allocator.next_keys(len(batch))
+        for lookup in self.spec['lookups']:
+            resolved = self.dimensions[lookup.table].resolve(batch, lookup.stage_columns)
+            self.metrics['unresolved'][lookup.fk] += int((resolved == -1).sum())
+            facts[lookup.fk] = resolved
+        for date_time in self.spec['date_times']:
+            facts[date_time.date_fk] = date_keys(batch[date_time.stage_column])
+            facts[date_time.time_fk] = time_keys(batch[date_time.stage_column])
+        facts[self.spec['partition_key']] = facts[self.spec['partition_key']].fillna(-1)
+        for fact_column, stage_column in self.spec['columns']:
+            facts[fact_column] = batch[stage_column]
+        now = datetime.datetime.now()
+        facts['create_ts'] = now
+        facts['create_user'] = 'ETL_USR'
+        facts['last_updt_ts'] = now
+        facts['last_updt_user'] = 'ETL_USR'
+        return facts[self.fact_columns()]
+
+    def copy(self, cursor, facts):
+        '''COPY the fact rows into the fact table; returns the bytes sent'''
+        buffer = io.StringIO()
+        facts.to_csv(buffer, header=False, index=False, na_rep='\\N')
+        sent_bytes = buffer.tell()
+        buffer.seek(0)
+        cursor.copy_expert(COPY_COLUMNS_SQL.format(self.fact_table, ', '.join(facts.columns)), buffer)
+        return sent_bytes
+
+    def load(self, partition=0, partitions=1):
+        '''
+        Build and load the facts of one partition of the stage rows (all of them with a single partition),
+        and commit them. Returns the metrics.
+        '''
+        started = time.monotonic()
+        sent_bytes = 0
+        stage_columns = self.stage_columns()
+        fact_key, stage_key = self.spec['natural_key']
+        conn = self.connect()
+        try:
+            cursor = conn.cursor()
+            if self.dimensions is None:
+                self.load_dimensions(cursor)
+            # server side cursor, so the stage rows are streamed batch by batch
+            stage_cursor = conn.cursor(name='fact_stage_rows')
+            stage_cursor.itersize = self.batch_size
+            stage_cursor.execute(FACT_STAGE_ROWS_SQL.format(
+                columns=', '.join('stg.' + column for column in stage_columns), stage_table=self.spec['stage_table'],
+                fact_table=self.fact_table, fact_key=fact_key, stage_key=stage_key,
+                partitions=partitions, partition=partition))
+            while True:
+                rows = stage_cursor.fetchmany(self.batch_size)
+                if not rows:
+                    break
+                facts = self.build(pd.DataFrame(rows, columns=stage_columns))
+                sent_bytes += self.copy(cursor, facts)
+                self.metrics['rows'] += len(facts)
+                self.metrics['batches'] += 1
+            stage_cursor.close()
+            conn.commit()
+        finally:
+            conn.close()
+        elapsed = max(time.monotonic() - started, 1e-6)
+        self.metrics['seconds'] += elapsed
+        logging.info('{} : partition {} of {} built {:,} rows in {:.1f} s ({:,.0f} rows/sec, {:,.0f} bytes/sec), '
+                     'unresolved foreign keys {}'.format(self.fact_table, partition + 1, partitions, self.metrics['rows'],
+                                                         elapsed, self.metrics['rows'] / elapsed, sent_bytes / elapsed,
+                                                         self.metrics['unresolved']))
+        return self.metrics
+
+
+# function to build one partition of a fact table in a worker process
+def build_fact_partition(fact_table, connect_kwargs, partition, partitions, batch_size=DEFAULT_BATCH_SIZE):
+    '''Build and load one partition of the fact table over a new psycopg2 connection (connect_kwargs); returns the metrics'''
+    import psycopg2
+    builder = FactBuilder(fact_table, functools.partial(psycopg2.connect, **connect_kwargs), batch_size)
+    return builder.load(partition, partitions)
+
+
+# function to build a fact table with a number of worker processes
+def build_fact(fact_table, connect_kwargs, workers=1, batch_size=DEFAULT_BATCH_SIZE):
+    '''
+    Build and load the fact table from its stage table with workers processes, one partition of the stage rows each.
+    connect_kwargs are the psycopg2.connect arguments of the database (a worker process opens its own connections).
+    Returns the metrics summed over the partitions; raises the error of the first failed partition.
+    '''
+    started = time.monotonic()
+    if workers <= 1:
+        results = [build_fact_partition(fact_table, connect_kwargs, 0, 1, batch_size)]
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            futures = [executor.submit(build_fact_partition, fact_table, connect_kwargs, partition, workers, batch_size)
+                       for partition in range(workers)]
+            results = [future.result() for future in futures]
+    metrics = {'rows': 0, 'batches': 0, 'seconds': time.monotonic() - started,
+               'unresolved': dict((lookup.fk, 0) for lookup in FACTS[fact_table]['lookups'])}
+    for result in results:
+        metrics['rows'] += result['rows']
+        metrics['batches'] += result['batches']
+        for fk, count in result['unresolved'].items():
+            metrics['unresolved'][fk] += count
+    logging.info('{} : built {:,} rows with {} workers in {:.1f} s ({:,.0f} rows/sec)'.format(
+        fact_table, metrics['rows'], workers, metrics['seconds'], metrics['rows'] / max(metrics['seconds'], 1e-6)))
+    return metrics
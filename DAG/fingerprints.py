@@ -0,0 +1,65 @@
+'''
+This module fingerprints the source files, so that the load of a source which did not change since
+the last successful run can be skipped.
+A fingerprint has the path, size, mtime and sha256 of the file. The content is hashed by streaming the file in blocks;
+when the size and mtime are the same as in the stored fingerprint, the stored hash is reused and the file is not read at all.
+The fingerprints are kept in a json file keyed by path.
+'''
+
+# Import necessary modules
+import hashlib
+import json
+import os
+
+# size of the blocks read while hashing a file
+HASH_BLOCK_SIZE = 8 * 1024 * 1024
+
+
+# function to compute the fingerprint of a file
+def file_fingerprint(path, previous=None, block_size=HASH_BLOCK_SIZE):
+    '''
+    Return the fingerprint (dictionary with path, size, mtime and sha256) of the file.
+    If the previous fingerprint has the same size and mtime, its sha256 is reused without reading the file.
+    '''
+    stat = os.stat(path)
+    fingerprint = {'path': path, 'size': stat.st_size, 'mtime': stat.st_mtime}
+    if previous is not None and previous.get('size') == stat.st_size and previous.get('mtime') == stat.st_mtime:
+        fingerprint['sha256'] = previous['sha256']
+        return fingerprint
+    digest = hashlib.sha256()
+    with open(path, 'rb') as source:
+        for block in iter(lambda: source.read(block_size), b''):
+            digest.update(block)
+    fingerprint['sha256'] = digest.hexdigest()
+    return fingerprint
+
+
+# function to compare two fingerprints
+def is_unchanged(previous, current):
+    '''Return True when the content of the file is the same as when the previous fingerprint was taken'''
+    return previous is not None and previous.get('size') == current['size'] and previous.get('sha256') == current['sha256']
+
+
+class FingerprintStore(object):
+    '''Fingerprints of the last successfully loaded source files, persisted in a json file'''
+
+    def __init__(self, store_file):
+        self.store_file = store_file
+        try:
+            with open(store_file) as store_json:
+                self.fingerprints = json.load(store_json)
+        except (OSError, ValueError):
+            self.fingerprints = {}
+
+    def get(self, path):
+        '''Return the stored fingerprint of the file, or None'''
+        return self.fingerprints.get(path)
+
+    def put(self, fingerprint):
+        '''Store the fingerprint and save the store'''
+        self.fingerprints[fingerprint['path']] = fingerprint
+        os.makedirs(os.path.dirname(self.store_file), exist_ok=True)
+        tmp_file = self.store_file + '.tmp'
+        with open(tmp_file, 'w') as store_json:
+            json.dump(self.fingerprints, store_json, indent=2)
+        os.replace(tmp_file, self.store_file)
@@ -0,0 +1,151 @@
+'''
+This module provides a persistent on-disk http cache used as a fetch backend by the airports module.
+Page bodies are stored content-addressed (by the sha256 of the body), and each url has a small json entry
+with the hash of its body, the ETag/Last-Modified validators and the time it was last fetched or revalidated.
+Within its TTL a url is served from disk. After the TTL the page is revalidated with a conditional request,
+so an unchanged page costs a 304 response instead of a full download.
+In offline mode nothing is requested and only cached pages are served; the urls which are not cached are kept in
+missing, so the caller can tell an incomplete offline run from a complete one.
+'''
+
+# Import necessary modules
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from urllib.error import HTTPError
+from urllib.request import Request, urlopen
+
+# default TTL (seconds) per url prefix; the first matching prefix wins
+DEFAULT_TTLS = [
+    ('https://developers.google.com/public-data/docs/canonical/states_csv', 30 * 24 * 3600),
+    ('https://www.airnav.com/airports/us/', 7 * 24 * 3600),
+]
+DEFAULT_TTL = 24 * 3600
+
+USER_AGENT = 'Mozilla/5.0 (compatible; udacity-dend-capstone)'
+
+
+class CacheMissError(LookupError):
+    '''Raised in offline mode when a url is not present in the cache'''
+
+
+class CachingFetcher(object):
+    '''
+    Fetch backend with a persistent cache under cache_dir.
+    ttls is a list of (url prefix, seconds) pairs; urls without a matching prefix use default_ttl.
+    '''
+
+    def __init__(self, cache_dir, ttls=DEFAULT_TTLS, default_ttl=DEFAULT_TTL, offline=False, timeout=30):
+        self.cache_dir = cache_dir
+        self.ttls = list(ttls)
+        self.default_ttl = default_ttl
+        self.offline = offline
+        self.timeout = timeout
+        self.stats = {'fresh': 0, 'revalidated': 0, 'downloaded': 0}
+        # urls not in the cache in offline mode
+        self.missing = []
+        # the fetcher is called from the fetch threads of the airports module
+        self.stats_lock = threading.Lock()
+        os.makedirs(os.path.join(cache_dir, 'objects'), exist_ok=True)
+        os.makedirs(os.path.join(cache_dir, 'entries'), exist_ok=True)
+
+    def ttl(self, url):
+        '''Return the TTL in seconds for the url'''
+        for prefix, seconds in self.ttls:
+            if url.startswith(prefix):
+                return seconds
+        return self.default_ttl
+
+    def _entry_path(self, url):
+        return os.path.join(self.cache_dir, 'entries', hashlib.sha256(url.encode('utf-8')).hexdigest() + '.json')
+
+    def _object_path(self, digest):
+        return os.path.join(self.cache_dir, 'objects', digest[:2], digest)
+
+    @staticmethod
+    def _write_atomic(path, data):
+        tmp_path = path + '.' + str(threading.get_ident()) + '.tmp'
+        with open(tmp_path, 'wb') as tmp:
+            tmp.write(data)
+        os.replace(tmp_path, path)
+
+    def _load_entry(self, url):
+        try:
+            with open(self._entry_path(url), encoding='utf-8') as entry_file:
+                entry = json.load(entry_file)
+        except (OSError, ValueError):
+            return None
+        if not os.path.exists(self._object_path(entry['sha256'])):
+            return None
+        return entry
+
+    def _save_entry(self, url, entry):
+        self._write_atomic(self._entry_path(url), json.dumps(entry).encode('utf-8'))
+
+    def _read_object(self, entry):
+        with open(self._object_path(entry['sha256']), 'rb') as body:
+            return body.read().decode(entry.get('charset') or 'utf-8', errors='replace')
+
+    def _is_fresh(self, entry, url):
+        return entry is not None and time.time() - entry['fetched_at'] < self.ttl(url)
+
+    def _count(self, outcome):
+        with self.stats_lock:
+            self.stats[outcome] += 1
+
+    def needs_network(self, url):
+        '''Return False when the url will be served from the cache without any request'''
+        return not self.offline and not self._is_fresh(self._load_entry(url), url)
+
+    def __call__(self, url):
+        entry = self._load_entry(url)
+        if self.offline:
+            if entry is None:
+                with self.stats_lock:
+                    self.missing.append(url)
+                raise CacheMissError('Offline mode: ' + url + ' is not cached')
+            self._count('fresh')
+            return self._read_object(entry)
+        if self._is_fresh(entry, url):
+            self._count('fresh')
+            return self._read_object(entry)
+
+        headers = {'User-Agent': USER_AGENT}
+        if entry is not None:
+            if entry.get('etag'):
+                headers['If-None-Match'] = entry['etag']
+            if entry.get('last_modified'):
+                headers['If-Modified-Since'] = entry['last_modified']
+        try:
+            with urlopen(Request(url, headers=headers), timeout=self.timeout) as response:
+                body = response.read()
+                response_headers = response.headers
+        except HTTPError as err:
+            if err.code != 304 or entry is None:
+                raise
+            # not modified: keep the cached body and restart its TTL
+            entry['fetched_at'] = time.time()
+            self._save_entry(url, entry)
+            self._count('revalidated')
+            return self._read_object(entry)
+
+        digest = hashlib.sha256(body).hexdigest()
+        object_path = self._object_path(digest)
+        if not os.path.exists(object_path):
+            os.makedirs(os.path.dirname(object_path), exist_ok=True)
+            self._write_atomic(object_path, body)
+        entry = {
+            'url': url,
+            'sha256': digest,
+            'etag': response_headers.get('ETag'),
+            'last_modified': response_headers.get('Last-Modified'),
+            'charset': response_headers.get_content_charset(),
+            'fetched_at': time.time()
+        }
+        self._save_entry(url, entry)
+        self._count('downloaded')
+        logging.info('Cached ' + url + ' as ' + digest)
+        return self._read_object(entry)
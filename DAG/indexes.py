@@ -0,0 +1,134 @@
+'''
+This module is the index lifecycle manager: a registry of the secondary indexes of the tables, each with a load policy.
+REBUILD indexes are dropped before the bulk load of their table and built after it, instead of being maintained
+row by row during a multi-million row INSERT (the stg tables are dropped and created again every run, so their indexes
+are always built after the load). CONCURRENT indexes are on live core tables which the other loads read and write:
+they are kept through the loads, and built with CREATE INDEX CONCURRENTLY (which does not block writes) when missing.
+The indexes of a list of tables are built in parallel, each over its own connection, and every build is timed.
+The primary keys and natural key indexes, which the upserts need, are part of the create table SQLs and not managed here.
+'''
+
+# Import necessary modules
+import logging
+import time
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+
+from SQLs import CREATE_INDEX_SQL, DROP_INDEX_SQL, INDEX_IS_VALID_SQL
+
+# load policies
+REBUILD = 'rebuild'
+CONCURRENT = 'concurrent'
+
+# number of indexes built at the same time
+DEFAULT_WORKERS = 4
+
+# name, table (schema qualified), indexed columns or expressions, and load policy of an index.
+# CONCURRENT can not be used on the partitioned fact tables, whose indexes can not be built concurrently
+TableIndex = namedtuple('TableIndex', ['name', 'table', 'columns', 'policy'])
+
+# accident condition flags and twilights, which the fact loads compare as COALESCE(flag,'False') and COALESCE(twilight,'')
+ACC_COND_FLAGS = ['Amenity', 'Bump', 'Crossing', 'Give_Way', 'Junction', 'No_Exit', 'Railway', 'Roundabout', 'Station',
+                  'Stop', 'Traffic_Calming', 'Traffic_Signal', 'Turning_Loop']
+ACC_COND_TWILIGHTS = ['Sunrise_Sunset', 'Civil_Twilight', 'Nautical_Twilight', 'Astronomical_Twilight']
+
+
+# function to return index expressions of columns compared as COALESCE(column,default)
+def coalesced(columns, default=''):
+    '''Return the index expressions (COALESCE(column,'default')) of the columns, comma separated'''
+    return ', '.join("(COALESCE({},'{}'))".format(column, default) for column in columns)
+
+
+INDEXES = [
+    # stage tables: the dimension keys of the fact loads
+    TableIndex('idx_Address', '"STG_DB".stg_accident', 'Address_Key', REBUILD),
+    TableIndex('idx_AccCond', '"STG_DB".stg_accident', ', '.join(ACC_COND_FLAGS + ACC_COND_TWILIGHTS), REBUILD),
+    TableIndex('idx_OriginAddress', '"STG_DB".stg_trip', 'Origin_Address_Key', REBUILD),
+    TableIndex('idx_DestinationAddress', '"STG_DB".stg_trip', 'Destination_Address_Key', REBUILD),
+    # dimensions: the expressions the fact loads look them up on (dim_address, dim_airport and lkp_source
+    # are looked up on their natural key indexes)
+    TableIndex('idx_dim_acc_cond_lookup', '"CORE_DB".dim_acc_cond',
+               coalesced(ACC_COND_FLAGS, 'False') + ', ' + coalesced(ACC_COND_TWILIGHTS), CONCURRENT),
+    TableIndex('idx_dim_wthr_cond_lookup', '"CORE_DB".dim_wthr_cond',
+               coalesced(['Wind_Direction', 'Weather_Condition']), CONCURRENT),
+    TableIndex('idx_lkp_provider_lookup', '"CORE_DB".lkp_provider', coalesced(['Provider_Name']), CONCURRENT),
+    # facts: the address keys, which the accidents and the trips share
+    TableIndex('idx_fact_accident_address', '"CORE_DB".fact_accident', 'Address_FK', REBUILD),
+    TableIndex('idx_fact_trip_origin_address', '"CORE_DB".fact_trip', 'Origin_Address_FK', REBUILD),
+    TableIndex('idx_fact_trip_destination_address', '"CORE_DB".fact_trip', 'Destination_Address_FK', REBUILD)
+]
+
+
+# function to return the registered indexes of a table
+def table_indexes(table, policy=None):
+    '''Return the indexes of the table (schema qualified, any case) in the registry, only those of the policy if given'''
+    return [index for index in INDEXES
+            if index.table.lower() == table.lower() and (policy is None or index.policy == policy)]
+
+
+# function to return the schema qualified name of an index
+def qualified_name(index):
+    '''Return the name of the index qualified with the schema of its table, e.g. "STG_DB".idx_Address'''
+    return index.table.split('.')[0] + '.' + index.name
+
+
+# function to drop the indexes of a table before its bulk load
+def drop_indexes(cursor, table):
+    '''Drop the REBUILD indexes of the table, in the transaction of the cursor; returns their names'''
+    dropped = []
+    for index in table_indexes(table, REBUILD):
+        cursor.execute(DROP_INDEX_SQL.format(concurrently='', index=qualified_name(index)))
+        dropped.append(index.name)
+    if dropped:
+        logging.info(table + ' : dropped indexes ' + ', '.join(dropped) + ' before the load')
+    return dropped
+
+
+# function to build an index
+def build_index(connect, index, release=None):
+    '''
+    Build the index, unless it exists already, over a connection from connect(); returns the elapsed seconds.
+    The connection is given to release(conn) at the end if given (e.g. a connection pool), closed otherwise.
+    A CONCURRENT index is built with CREATE INDEX CONCURRENTLY; an invalid one left by a failed build is dropped first
+    '''
+    started = time.monotonic()
+    concurrently = 'CONCURRENTLY ' if index.policy == CONCURRENT else ''
+    conn = connect()
+    try:
+        # autocommit, as CREATE/DROP INDEX CONCURRENTLY can not run in a transaction
+        conn.autocommit = True
+        cursor = conn.cursor()
+        try:
+            cursor.execute(INDEX_IS_VALID_SQL.format(qualified_name(index)))
+            if cursor.fetchone()[0] is False:
+                logging.warning(qualified_name(index) + ' is invalid, dropping it before it is built again')
+                cursor.execute(DROP_INDEX_SQL.format(concurrently=concurrently, index=qualified_name(index)))
+            cursor.execute(CREATE_INDEX_SQL.format(concurrently=concurrently, name=index.name, table=index.table,
+                                                   columns=index.columns))
+        finally:
+            cursor.close()
+    finally:
+        if release is not None:
+            release(conn)
+        else:
+            conn.close()
+    elapsed = time.monotonic() - started
+    logging.info('{} : index {} ({}) built in {:.2f} s'.format(index.table, index.name, index.policy, elapsed))
+    return elapsed
+
+
+# function to build the indexes of tables in parallel
+def build_indexes(connect, tables, workers=DEFAULT_WORKERS, release=None):
+    '''
+    Build the registered indexes of the tables which do not exist yet, workers at a time, each over its own connection
+    from connect() (given back to release(conn), see build_index). Returns a dictionary with the elapsed seconds of each index build
+    '''
+    registered = [index for table in tables for index in table_indexes(table)]
+    if not registered:
+        return {}
+    started = time.monotonic()
+    with ThreadPoolExecutor(max_workers=min(workers, len(registered))) as executor:
+        seconds = list(executor.map(lambda index: build_index(connect, index, release), registered))
+    timings = {index.name: elapsed for index, elapsed in zip(registered, seconds)}
+    logging.info('Built {} indexes in {:.1f} s : {}'.format(len(timings), time.monotonic() - started, timings))
+    return timings
@@ -0,0 +1,69 @@
+'''
+This module is the key allocation service for the surrogate keys of the dim/lkp/fact tables.
+Every table has a sequence (see CREATE_SK_SEQUENCE_SQL in the SQLs module), which the SQL loads use with NEXTVAL.
+Python side loaders reserve keys from the same sequences in blocks, one round trip per block,
+so parallel or partitioned loaders can share a table without handing out colliding keys.
+'''
+
+# Import necessary modules
+import threading
+
+from SQLs import ALLOCATE_KEYS_SQL
+
+# sequence of each table with a surrogate key
+SK_SEQUENCES = {
+    '"CORE_DB".dim_address': '"CORE_DB".dim_address_sk_seq',
+    '"CORE_DB".dim_acc_cond': '"CORE_DB".dim_acc_cond_sk_seq',
+    '"CORE_DB".dim_airport': '"CORE_DB".dim_airport_sk_seq',
+    '"CORE_DB".dim_wthr_cond': '"CORE_DB".dim_wthr_cond_sk_seq',
+    '"CORE_DB".lkp_provider': '"CORE_DB".lkp_provider_sk_seq',
+    '"CORE_DB".lkp_source': '"CORE_DB".lkp_source_sk_seq',
+    '"CORE_DB".fact_accident': '"CORE_DB".fact_accident_sk_seq',
+    '"CORE_DB".fact_trip': '"CORE_DB".fact_trip_sk_seq'
+}
+
+# number of keys reserved per round trip
+DEFAULT_BLOCK_SIZE = 10000
+
+
+# function to reserve keys of a table
+def allocate_keys(cursor, table, count):
+    '''Reserve count keys from the sequence of the table and return them as a list'''
+    cursor.execute(ALLOCATE_KEYS_SQL.format(SK_SEQUENCES[table]), (count,))
+    return [row[0] for row in cursor.fetchall()]
+
+
+class KeyAllocator(object):
+    '''
+    Hands out keys of a table from blocks reserved from its sequence.
+    Thread safe, so the workers of a parallel loader can share one allocator.
+    Keys reserved but not handed out are lost (a gap in the keys), which is harmless for surrogate keys.
+    '''
+
+    def __init__(self, connect, table, block_size=DEFAULT_BLOCK_SIZE):
+        self.connect = connect
+        self.table = table
+        self.block_size = block_size
+        self.keys = []
+        self.lock = threading.Lock()
+
+    def _reserve(self, count):
+        conn = self.connect()
+        try:
+            # autocommit, so the reservation does not depend on the transaction of the loader
+            conn.autocommit = True
+            cursor = conn.cursor()
+            try:
+                return allocate_keys(cursor, self.table, count)
+            finally:
+                cursor.close()
+        finally:
+            conn.close()
+
+    def next_keys(self, count):
+        '''Return a list of count new keys of the table'''
+        with self.lock:
+            if len(self.keys) < count:
+                self.keys.extend(self._reserve(max(self.block_size, count - len(self.keys))))
+            keys, self.keys = self.keys[:count], self.keys[count:]
+        return keys
@@ -0,0 +1,160 @@
+'''
+This module converts the source .csv files into a parquet landing zone.
+The .csv file is parsed once, in streaming blocks, with the column types of the src table (see schemas module),
+and written as parquet with row groups of a fixed number of rows.
+The DECIMAL columns are parsed with a wider scale and rounded to the scale of the column (half away from zero, like
+PostgreSQL does on COPY), as the source values often have more fractional digits than the column keeps.
+Later stages stream typed Arrow record batches from the parquet file instead of parsing the .csv file again,
+reading only the columns they need (column pruning) and only the row groups that can match a filter (predicate pushdown).
+'''
+
+# Import necessary modules
+import io
+import logging
+import os
+import time
+
+import pyarrow as pa
+import pyarrow.compute as pa_compute
+import pyarrow.csv as pa_csv
+import pyarrow.dataset as pa_ds
+import pyarrow.parquet as pq
+
+import schemas
+from SQLs import COPY_PARTITION_SQL
+
+# number of rows per parquet row group
+DEFAULT_ROW_GROUP_SIZE = 256 * 1024
+
+# size of the blocks the .csv file is parsed in
+CSV_BLOCK_SIZE = 64 * 1024 * 1024
+
+# precision of the decimal type the DECIMAL columns are parsed with
+PARSE_DECIMAL_PRECISION = 38
+
+
+# function to map a column of a table to an arrow type
+def arrow_type(column):
+    '''Return the arrow type for the Column'''
+    if column.sql_type == 'VARCHAR':
+        return pa.string()
+    if column.sql_type == 'DECIMAL':
+        return pa.decimal128(column.size, column.scale or 0)
+    if column.sql_type == 'INTEGER':
+        return pa.int32()
+    if column.sql_type == 'TIMESTAMP':
+        return pa.timestamp('us')
+    if column.sql_type == 'DATE':
+        return pa.date32()
+    if column.sql_type == 'BOOLEAN':
+        return pa.bool_()
+    raise ValueError('No arrow type for ' + column.sql_type)
+
+
+# function to map a column of a table to the arrow type it is parsed with
+def parse_type(column):
+    '''
+    Return the arrow type the Column is parsed from the .csv file with: for a DECIMAL column, a decimal with the integer
+    digits of the column and the rest of PARSE_DECIMAL_PRECISION as scale, so extra fractional digits parse exactly
+    '''
+    if column.sql_type == 'DECIMAL':
+        integer_digits = column.size - (column.scale or 0)
+        return pa.decimal128(PARSE_DECIMAL_PRECISION, PARSE_DECIMAL_PRECISION - integer_digits)
+    return arrow_type(column)
+
+
+# function to derive the arrow schema of a table
+def arrow_schema(create_sql):
+    '''Return the arrow schema of the table created by the SQL'''
+    return pa.schema([pa.field(column.name, arrow_type(column)) for column in schemas.table_columns(create_sql)])
+
+
+# function to derive the arrow schema a table is parsed with
+def parse_schema(create_sql):
+    '''Return the arrow schema the .csv file of the table created by the SQL is parsed with (see parse_type)'''
+    return pa.schema([pa.field(column.name, parse_type(column)) for column in schemas.table_columns(create_sql)])
+
+
+# function to cast a parsed record batch to the schema of the table
+def fit_batch(batch, schema):
+    '''
+    Return the record batch cast to the schema, rounding the decimal columns to the scale of the schema
+    (half away from zero). A value with more integer digits than the column allows raises ArrowInvalid, as COPY would fail
+    '''
+    columns = []
+    for array, field in zip(batch.columns, schema):
+        if pa.types.is_decimal(field.type) and array.type != field.type:
+            array = pa_compute.round(array, ndigits=field.type.scale, round_mode='half_towards_infinity')
+        columns.append(array.cast(field.type))
+    return pa.RecordBatch.from_arrays(columns, schema=schema)
+
+
+# function to convert a .csv file into parquet
+def csv_to_parquet(csv_path, parquet_path, create_sql, row_group_size=DEFAULT_ROW_GROUP_SIZE):
+    '''
+    Convert the .csv file into a parquet file typed with the schema of the table created by create_sql.
+    The .csv header is skipped and the columns are named after the table columns (positional, like COPY).
+    The file is written to a temporary path and renamed at the end, so readers never see a partial file.
+    Returns the number of rows written.
+    '''
+    started = time.monotonic()
+    schema = arrow_schema(create_sql)
+    read_options = pa_csv.ReadOptions(column_names=schema.names, skip_rows=1, block_size=CSV_BLOCK_SIZE)
+    parse_options = pa_csv.ParseOptions(newlines_in_values=True)
+    convert_options = pa_csv.ConvertOptions(column_types=parse_schema(create_sql), strings_can_be_null=True,
+                                            quoted_strings_can_be_null=False)
+    os.makedirs(os.path.dirname(parquet_path), exist_ok=True)
+    tmp_path = parquet_path + '.tmp'
+    rows = 0
+    reader = pa_csv.open_csv(csv_path, read_options=read_options, parse_options=parse_options,
+                             convert_options=convert_options)
+    with pq.ParquetWriter(tmp_path, schema, compression='snappy') as writer:
+        for batch in reader:
+            writer.write_table(pa.Table.from_batches([fit_batch(batch, schema)]), row_group_size=row_group_size)
+            rows += batch.num_rows
+    os.replace(tmp_path, parquet_path)
+    elapsed = max(time.monotonic() - started, 1e-6)
+    logging.info('{} : converted {:,} rows to {} in {:.1f} s ({:,.0f} rows/sec)'.format(
+        csv_path, rows, parquet_path, elapsed, rows / elapsed))
+    return rows
+
+
+# function to stream record batches from the landing zone
+def iter_batches(parquet_path, columns=None, filter=None, batch_size=DEFAULT_ROW_GROUP_SIZE):
+    '''
+    Yield arrow record batches from the parquet file.
+    columns limits the columns read; filter is a pyarrow.dataset expression, e.g. pyarrow.dataset.field('state') == 'CA',
+    which also skips the row groups whose statistics can not match.
+    '''
+    dataset = pa_ds.dataset(parquet_path, format='parquet')
+    for batch in dataset.to_batches(columns=columns, filter=filter, batch_size=batch_size):
+        yield batch
+
+
+# function to load a table from the landing zone
+def copy_from_parquet(conn, tablename, parquet_path, batch_size=DEFAULT_ROW_GROUP_SIZE):
+    '''
+    Load the table from the parquet file over the connection (psycopg2), one COPY per record batch.
+    Each batch is written as .csv into an in-memory buffer, so memory is bounded by the batch size.
+    The transaction is not committed; that is left to the caller.
+    Returns a dictionary with the rows loaded, bytes sent and elapsed seconds.
+    '''
+    started = time.monotonic()
+    rows = 0
+    sent_bytes = 0
+    write_options = pa_csv.WriteOptions(include_header=False)
+    cursor = conn.cursor()
+    try:
+        for batch in iter_batches(parquet_path, batch_size=batch_size):
+            buffer = io.BytesIO()
+            pa_csv.write_csv(batch, buffer, write_options=write_options)
+            sent_bytes += buffer.tell()
+            buffer.seek(0)
+            cursor.copy_expert(COPY_PARTITION_SQL.format(tablename), buffer)
+            rows += batch.num_rows
+    finally:
+        cursor.close()
+    elapsed = max(time.monotonic() - started, 1e-6)
+    logging.info('{} : loaded {:,} rows from {} in {:.1f} s ({:,.0f} bytes/sec, {:,.0f} rows/sec)'.format(
+        tablename, rows, parquet_path, elapsed, sent_bytes / elapsed, rows / elapsed))
+    return {'rows': rows, 'bytes': sent_bytes, 'seconds': elapsed}
@@ -0,0 +1,373 @@
+'''
+This module loads the source files into the src tables with COPY ... FROM STDIN.
+The file is read on the airflow worker and streamed to the postgres server in fixed-size chunks,
+so memory stays flat however large the file is, and the server does not need access to the file.
+Files ending in .gz or .zst are decompressed on the fly.
+Progress (bytes/sec and rows/sec) is logged while the load runs.
+Large uncompressed files can be split into byte ranges aligned to record boundaries,
+which are loaded at the same time over separate connections and committed all together or rolled back all together.
+The byte ranges are loaded without the primary key of the table, which is added back once the load is committed.
+'''
+
+# Import necessary modules
+import gzip
+import logging
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from SQLs import COPY_SQL, COPY_PARTITION_SQL, COPY_FREEZE_SQL, TRUNCATE_TABLE_SQL, PRIMARY_KEY_CONSTRAINT_SQL, \
+    DROP_CONSTRAINT_SQL, ADD_CONSTRAINT_SQL
+
+# size of each chunk sent to the server
+DEFAULT_CHUNK_SIZE = 1024 * 1024
+
+# seconds between two progress log lines
+DEFAULT_REPORT_INTERVAL = 10
+
+# size of the blocks scanned while looking for record boundaries
+SCAN_BLOCK_SIZE = 16 * 1024 * 1024
+
+
+class ProgressReader(object):
+    '''
+    Wraps a binary file object and counts the bytes and lines read through it.
+    Logs the throughput at most once every report_interval seconds.
+    Lines are counted on the raw data, so a quoted value spanning several lines is counted more than once;
+    the exact number of rows is the rowcount of the COPY.
+    '''
+
+    def __init__(self, source, label, report_interval=DEFAULT_REPORT_INTERVAL):
+        self.source = source
+        self.label = label
+        self.report_interval = report_interval
+        self.bytes = 0
+        self.lines = 0
+        self.started = time.monotonic()
+        self.reported = self.started
+
+    def read(self, size=-1):
+        data = self.source.read(size)
+        self.bytes += len(data)
+        self.lines += data.count(b'\n')
+        now = time.monotonic()
+        if now - self.reported >= self.report_interval:
+            self.reported = now
+            self.log_progress(now)
+        return data
+
+    def readline(self, size=-1):
+        data = self.source.readline(size)
+        self.bytes += len(data)
+        self.lines += data.count(b'\n')
+        return data
+
+    def log_progress(self, now=None):
+        '''Log the bytes and lines read so far and the rate per second'''
+        elapsed = max((now or time.monotonic()) - self.started, 1e-6)
+        logging.info('{} : {:,} bytes, {:,} lines in {:.1f} s ({:,.0f} bytes/sec, {:,.0f} rows/sec)'.format(
+            self.label, self.bytes, self.lines, elapsed, self.bytes / elapsed, self.lines / elapsed))
+
+
+# function to open a source file, decompressing it on the fly if needed
+def open_source(filename):
+    '''Open the file for binary reading; .gz and .zst files are decompressed as they are read'''
+    if filename.endswith('.gz'):
+        return gzip.open(filename, 'rb')
+    if filename.endswith('.zst'):
+        try:
+            import zstandard
+        except ImportError:
+            raise ImportError('The zstandard package is required to load ' + filename)
+        return zstandard.ZstdDecompressor().stream_reader(open(filename, 'rb'), closefd=True)
+    return open(filename, 'rb')
+
+
+# function to stream a source file into a table through COPY FROM STDIN
+def copy_from_file(conn, tablename, filename, chunk_size=DEFAULT_CHUNK_SIZE, report_interval=DEFAULT_REPORT_INTERVAL,
+                   freeze=False):
+    '''
+    Stream the .csv file into the table over the connection (psycopg2).
+    With freeze, the table is truncated and loaded with COPY FREEZE in the same transaction
+    (the rows are written already frozen, so they are not rewritten by the first vacuum).
+    The transaction is not committed; that is left to the caller.
+    Returns a dictionary with the rows loaded, bytes read and elapsed seconds.
+    '''
+    started = time.monotonic()
+    with open_source(filename) as source:
+        reader = ProgressReader(source, tablename, report_interval)
+        cursor = conn.cursor()
+        try:
+            if freeze:
+                cursor.execute(TRUNCATE_TABLE_SQL.format(tablename))
+                cursor.copy_expert(COPY_FREEZE_SQL.format(tablename), reader, size=chunk_size)
+            else:
+                cursor.copy_expert(COPY_SQL.format(tablename), reader, size=chunk_size)
+            rows = cursor.rowcount
+        finally:
+            cursor.close()
+    elapsed = max(time.monotonic() - started, 1e-6)
+    logging.info('{} : loaded {:,} rows, {:,} bytes in {:.1f} s ({:,.0f} bytes/sec, {:,.0f} rows/sec)'.format(
+        tablename, rows, reader.bytes, elapsed, reader.bytes / elapsed, rows / elapsed))
+    return {'rows': rows, 'bytes': reader.bytes, 'seconds': elapsed}
+
+
+class IterableReader(object):
+    '''Binary file object which reads from an iterable of bytes chunks (e.g. the clean rows of the pre-load validation)'''
+
+    def __init__(self, chunks):
+        self.chunks = iter(chunks)
+        self.current = b''
+        self.pos = 0
+
+    def read(self, size=-1):
+        parts = []
+        while size != 0:
+            if self.pos >= len(self.current):
+                chunk = next(self.chunks, None)
+                if chunk is None:
+                    break
+                self.current, self.pos = chunk, 0
+                continue
+            end = len(self.current) if size < 0 else min(len(self.current), self.pos + size)
+            parts.append(self.current[self.pos:end])
+            if size > 0:
+                size -= end - self.pos
+            self.pos = end
+        return b''.join(parts)
+
+
+# function to stream .csv chunks into a table through COPY FROM STDIN
+def copy_from_chunks(conn, tablename, chunks, chunk_size=DEFAULT_CHUNK_SIZE, report_interval=DEFAULT_REPORT_INTERVAL):
+    '''
+    Stream an iterable of .csv bytes chunks (without header) into the table over the connection (psycopg2).
+    The transaction is not committed; that is left to the caller.
+    Returns a dictionary with the rows loaded, bytes read and elapsed seconds.
+    '''
+    started = time.monotonic()
+    reader = ProgressReader(IterableReader(chunks), tablename, report_interval)
+    cursor = conn.cursor()
+    try:
+        cursor.copy_expert(COPY_PARTITION_SQL.format(tablename), reader, size=chunk_size)
+        rows = cursor.rowcount
+    finally:
+        cursor.close()
+    elapsed = max(time.monotonic() - started, 1e-6)
+    logging.info('{} : loaded {:,} rows, {:,} bytes in {:.1f} s ({:,.0f} bytes/sec, {:,.0f} rows/sec)'.format(
+        tablename, rows, reader.bytes, elapsed, reader.bytes / elapsed, rows / elapsed))
+    return {'rows': rows, 'bytes': reader.bytes, 'seconds': elapsed}
+
+
+class RangeReader(object):
+    '''Binary file object which reads only the bytes [start, end) of a file'''
+
+    def __init__(self, filename, start, end):
+        self.source = open(filename, 'rb')
+        self.source.seek(start)
+        self.remaining = end - start
+
+    def read(self, size=-1):
+        if size < 0 or size > self.remaining:
+            size = self.remaining
+        data = self.source.read(size)
+        self.remaining -= len(data)
+        return data
+
+    def close(self):
+        self.source.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+# function to split a .csv file into byte ranges which start and end on record boundaries
+def find_split_points(filename, partitions, block_size=SCAN_BLOCK_SIZE):
+    '''
+    Return the offsets [data_start, ..., file_size] that split the records of the file (after the header line)
+    into at most `partitions` ranges of about the same size.
+    A split is only made after a newline which is outside a quoted value, so values with embedded newlines
+    (e.g. Description) are never cut. The quote parity is tracked from the start of the file with bytes.count,
+    which scans the file at memory speed; escaped quotes ("") do not change the parity.
+    '''
+    size = os.path.getsize(filename)
+    with open(filename, 'rb') as source:
+        source.readline()
+        data_start = source.tell()
+        targets = [data_start + (size - data_start) * i // partitions for i in range(1, partitions)]
+        points = [data_start]
+        pos = data_start
+        quotes = 0
+        while targets:
+            block = source.read(block_size)
+            if not block:
+                break
+            block_end = pos + len(block)
+            while targets and targets[0] < block_end:
+                idx = max(targets[0] - pos, points[-1] - pos, 0)
+                parity = quotes + block.count(b'"', 0, idx)
+                boundary = None
+                while True:
+                    newline = block.find(b'\n', idx)
+                    if newline == -1:
+                        break
+                    parity += block.count(b'"', idx, newline)
+                    if parity % 2 == 0:
+                        boundary = pos + newline + 1
+                        break
+                    idx = newline + 1
+                if boundary is None:
+                    # no record boundary left in this block, continue the search in the next one
+                    targets[0] = block_end
+                    break
+                targets.pop(0)
+                if data_start < boundary < size and boundary > points[-1]:
+                    points.append(boundary)
+            quotes += block.count(b'"')
+            pos = block_end
+    points.append(size)
+    return points
+
+
+# function to drop the primary key of a table before a partitioned load
+def drop_primary_key(connect, tablename):
+    '''
+    Drop the primary key of the table and return its (name, definition) to add it back after the load, or None
+    when the table has no primary key
+    '''
+    conn = connect()
+    try:
+        cursor = conn.cursor()
+        cursor.execute(PRIMARY_KEY_CONSTRAINT_SQL.format(tablename))
+        primary_key = cursor.fetchone()
+        if primary_key is not None:
+            logging.info(tablename + ' : dropping primary key ' + primary_key[0] + ' for the partitioned load')
+            cursor.execute(DROP_CONSTRAINT_SQL.format(tablename, primary_key[0]))
+        conn.commit()
+        return primary_key
+    finally:
+        conn.close()
+
+
+# function to add back the primary key of a table after a partitioned load
+def add_primary_key(connect, tablename, primary_key):
+    '''
+    Add back the primary key dropped by drop_primary_key. Should the loaded rows hold a duplicate key,
+    the table is truncated before the primary key is added, and the error is raised.
+    '''
+    name, definition = primary_key
+    conn = connect()
+    try:
+        cursor = conn.cursor()
+        try:
+            cursor.execute(ADD_CONSTRAINT_SQL.format(tablename, name, definition))
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            logging.error(tablename + ' : the loaded rows break the primary key ' + name + ', truncating the table')
+            cursor.execute(TRUNCATE_TABLE_SQL.format(tablename))
+            cursor.execute(ADD_CONSTRAINT_SQL.format(tablename, name, definition))
+            conn.commit()
+            raise
+    finally:
+        conn.close()
+
+
+# function to load a .csv file into a table over several connections at the same time
+def copy_from_file_parallel(connect, tablename, filename, partitions, chunk_size=DEFAULT_CHUNK_SIZE,
+                            report_interval=DEFAULT_REPORT_INTERVAL):
+    '''
+    Load the .csv file into the table with one COPY per byte range, each over its own connection from connect().
+    All ranges are committed only after every COPY succeeded; if any COPY fails the others are cancelled and
+    every transaction is rolled back. Should a commit fail half way, the table is truncated, so the load is all or nothing.
+    The ranges are loaded without the primary key: with it, the COPY of a key already copied by another range
+    would wait for the transaction of that range, which is only committed once every range is done.
+    The primary key is added back after the commits; a duplicate key then truncates the table and fails the load.
+    Compressed files can not be split and are loaded over a single connection.
+    Returns a dictionary with the rows loaded, bytes read and elapsed seconds.
+    '''
+    if partitions <= 1 or filename.endswith(('.gz', '.zst')):
+        conn = connect()
+        try:
+            stats = copy_from_file(conn, tablename, filename, chunk_size, report_interval)
+            conn.commit()
+        finally:
+            conn.close()
+        return stats
+
+    started = time.monotonic()
+    points = find_split_points(filename, partitions)
+    ranges = list(zip(points[:-1], points[1:]))
+    logging.info(tablename + ' : loading ' + str(len(ranges)) + ' byte ranges in parallel ' + str(ranges))
+    conns = []
+
+    def copy_range(ix):
+        start, end = ranges[ix]
+        with RangeReader(filename, start, end) as source:
+            reader = ProgressReader(source, tablename + '[' + str(ix) + ']', report_interval)
+            cursor = conns[ix].cursor()
+            try:
+                cursor.copy_expert(COPY_PARTITION_SQL.format(tablename), reader, size=chunk_size)
+                return cursor.rowcount, reader.bytes
+            except Exception:
+                # stop the other ranges early, the whole load is rolled back anyway
+                for other in conns:
+                    if other is not conns[ix]:
+                        try:
+                            other.cancel()
+                        except Exception:
+                            pass
+                raise
+            finally:
+                cursor.close()
+
+    primary_key = drop_primary_key(connect, tablename)
+    try:
+        try:
+            for _ in ranges:
+                conns.append(connect())
+            with ThreadPoolExecutor(max_workers=len(ranges)) as executor:
+                results = list(executor.map(copy_range, range(len(ranges))))
+        except Exception:
+            for conn in conns:
+                try:
+                    conn.rollback()
+                except Exception:
+                    pass
+            raise
+        committed = 0
+        try:
+            for conn in conns:
+                conn.commit()
+                committed += 1
+        except Exception:
+            logging.error(tablename + ' : commit of a byte range failed, truncating the table')
+            # the transactions of the ranges not committed (the failed one included) still hold the locks of their COPY,
+            # which the TRUNCATE would wait for: roll them back and close their connections first
+            for conn in conns[committed:]:
+                try:
+                    conn.rollback()
+                except Exception:
+                    pass
+                conn.close()
+            cleanup_conn = connect()
+            try:
+                cleanup_conn.cursor().execute(TRUNCATE_TABLE_SQL.format(tablename))
+                cleanup_conn.commit()
+            finally:
+                cleanup_conn.close()
+            raise
+    finally:
+        for conn in conns:
+            conn.close()
+        if primary_key is not None:
+            add_primary_key(connect, tablename, primary_key)
+
+    rows = sum(result[0] for result in results)
+    loaded_bytes = sum(result[1] for result in results)
+    elapsed = max(time.monotonic() - started, 1e-6)
+    logging.info('{} : loaded {:,} rows, {:,} bytes in {:.1f} s over {} connections ({:,.0f} bytes/sec, {:,.0f} rows/sec)'.format(
+        tablename, rows, loaded_bytes, elapsed, len(ranges), loaded_bytes / elapsed, rows / elapsed))
+    return {'rows': rows, 'bytes': loaded_bytes, 'seconds': elapsed}
@@ -0,0 +1,88 @@
+'''
+This module measures how long the scheduler takes to parse the DAG file (Udacity_DEND_Capstone_Project.py),
+and fails when the parse is over a time budget or loads a heavy module (pandas, numpy, pyarrow).
+The scheduler parses the DAG file over and over, with airflow already imported, so every run imports the DAG file
+in a new python process, after the airflow modules it uses, and only the import of the DAG file is timed.
+Run it from the DAG directory, e.g. before a deployment:
+    python parse_time.py [budget in ms]
+It exits with status 1 when the median parse time of the runs is over the budget (or a heavy module was loaded).
+'''
+
+# Import necessary modules
+import json
+import logging
+import os
+import statistics
+import subprocess
+import sys
+
+# module of the DAG file
+DAG_MODULE = 'Udacity_DEND_Capstone_Project'
+
+# default parse time budget in milliseconds
+DEFAULT_BUDGET_MS = 100
+
+# number of runs, the median of which is compared with the budget
+DEFAULT_RUNS = 5
+
+# airflow modules imported before the DAG file is timed (already imported in the scheduler)
+AIRFLOW_MODULES = ['airflow', 'airflow.exceptions', 'airflow.models', 'airflow.operators.python_operator',
+                   'airflow.hooks.postgres_hook', 'airflow.operators.bash_operator', 'airflow.operators.dummy_operator']
+
+# modules which must not be loaded by the parse of the DAG file
+HEAVY_MODULES = ['pandas', 'numpy', 'pyarrow']
+
+# script run in the new python process: prints the parse time (ms) and the heavy modules loaded by the DAG file, as json
+PARSE_SCRIPT = '''
+import importlib, json, sys, time
+for module in {airflow_modules!r}:
+    importlib.import_module(module)
+loaded = set(sys.modules)
+started = time.perf_counter()
+importlib.import_module({dag_module!r})
+elapsed_ms = (time.perf_counter() - started) * 1000
+heavy = [module for module in {heavy_modules!r} if module in sys.modules and module not in loaded]
+print(json.dumps({{'ms': elapsed_ms, 'heavy': heavy}}))
+'''
+
+
+# function to time one parse of the DAG file
+def parse_once(dag_dir, dag_module=DAG_MODULE):
+    '''Import the DAG module in a new python process; returns (milliseconds, heavy modules loaded)'''
+    script = PARSE_SCRIPT.format(airflow_modules=AIRFLOW_MODULES, dag_module=dag_module, heavy_modules=HEAVY_MODULES)
+    output = subprocess.run([sys.executable, '-c', script], cwd=dag_dir, check=True,
+                            stdout=subprocess.PIPE, universal_newlines=True).stdout
+    # the last line is the json, airflow may log before it
+    result = json.loads(output.strip().splitlines()[-1])
+    return result['ms'], result['heavy']
+
+
+# function to check the parse time of the DAG file against a budget
+def check_parse_time(budget_ms=DEFAULT_BUDGET_MS, runs=DEFAULT_RUNS, dag_dir=None, dag_module=DAG_MODULE):
+    '''
+    Parse the DAG file runs times; returns (passed, median milliseconds, heavy modules loaded).
+    passed is False when the median is over budget_ms or a heavy module was loaded
+    '''
+    dag_dir = dag_dir or os.path.dirname(os.path.abspath(__file__))
+    timings = []
+    heavy = set()
+    for _ in range(runs):
+        elapsed_ms, heavy_modules = parse_once(dag_dir, dag_module)
+        timings.append(elapsed_ms)
+        heavy.update(heavy_modules)
+    median_ms = statistics.median(timings)
+    logging.info('{} : parsed in {:.1f} ms (median of {} runs, budget {} ms, timings {})'.format(
+        dag_module, median_ms, runs, budget_ms, ', '.join('{:.1f}'.format(ms) for ms in timings)))
+    if heavy:
+        logging.error(dag_module + ' loads ' + ', '.join(sorted(heavy)) + ' when it is parsed')
+    return median_ms <= budget_ms and not heavy, median_ms, sorted(heavy)
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO, format='%(message)s')
+    budget = float(sys.argv[1]) if len(sys.argv) > 1 else DEFAULT_BUDGET_MS
+    passed, median_ms, heavy = check_parse_time(budget)
+    if not passed:
+        logging.error('Parse time check FAILED : {:.1f} ms, budget {} ms'.format(median_ms, budget))
+        sys.exit(1)
+    logging.info('Parse time check PASSED : {:.1f} ms, budget {} ms'.format(median_ms, budget))
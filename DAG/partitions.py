@@ -0,0 +1,160 @@
+'''
+This module manages the range partitions of the fact tables, which are partitioned by their start date key (yyyymmdd).
+A partition holds one period (a year, or a month with PARTITION_GRAIN = 'month') and is named after it,
+e.g. "CORE_DB".fact_accident_2019 or "CORE_DB".fact_accident_201903; facts without a start date (-1) go to the default partition.
+Before a load, the partitions of the periods found in the stage table are created, and the load then runs
+partition by partition, so every INSERT writes a single partition and queries on the start date key get partition pruning.
+The indexes of a fact table are created on every partition, so a period can be detached (archived, dropped or
+reloaded on its own) and attached again cheaply.
+'''
+
+# Import necessary modules
+import logging
+import time
+
+import keys
+import schemas
+from SQLs import (STAGE_PERIODS_SQL, FACT_PERIODS_SQL, CREATE_PARTITION_SQL, DETACH_PARTITION_SQL, ATTACH_PARTITION_SQL,
+                  MIGRATE_UNPARTITIONED_FACT_SQL, TABLE_EXISTS_SQL, CREATE_TABLE_FACT_ACCIDENT_SQL,
+                  CREATE_TABLE_FACT_TRIP_SQL)
+
+# period of a partition: 'year' or 'month'
+PARTITION_GRAIN = 'year'
+
+# stage table, start timestamp column, DDL and surrogate key of each partitioned fact table
+FACT_PARTITIONS = {
+    '"CORE_DB".fact_accident': {'stage_table': '"STG_DB".stg_accident', 'start_column': 'Start_Time',
+                                'create_sql': CREATE_TABLE_FACT_ACCIDENT_SQL, 'sk': 'Accident_SK'},
+    '"CORE_DB".fact_trip': {'stage_table': '"STG_DB".stg_trip', 'start_column': 'StartDateTime',
+                            'create_sql': CREATE_TABLE_FACT_TRIP_SQL, 'sk': 'Trip_SK'}
+}
+
+# period of the facts without a start date, which go to the default partition
+DEFAULT_PERIOD = (-1, 0)
+
+
+# function to return the divisor which truncates a date key to its period
+def period_divisor(grain=PARTITION_GRAIN):
+    '''Return the divisor of a date key (yyyymmdd) giving its year (yyyy) or month (yyyymm)'''
+    return 100 if grain == 'month' else 10000
+
+
+# function to return the date key range of a period
+def period_bounds(period, grain=PARTITION_GRAIN):
+    '''Return the (low, high) date keys of the period (yyyy or yyyymm), low inclusive and high exclusive'''
+    if grain == 'month':
+        year, month = divmod(period, 100)
+        if month == 12:
+            return period * 100, (year + 1) * 10000 + 100
+        return period * 100, (period + 1) * 100
+    return period * 10000, (period + 1) * 10000
+
+
+# function to return the name of the partition of a period
+def partition_name(fact_table, period):
+    '''Return the name of the partition of the fact table for the period, e.g. "CORE_DB".fact_accident_2019'''
+    return fact_table + '_' + str(period)
+
+
+# function to create the partitions of periods
+def create_partitions(cursor, fact_table, periods, grain=PARTITION_GRAIN):
+    '''Create the partitions of the fact table for the periods (yyyy or yyyymm), unless they exist already'''
+    for period in sorted(periods):
+        low, high = period_bounds(period, grain)
+        cursor.execute(CREATE_PARTITION_SQL.format(partition=partition_name(fact_table, period), table=fact_table,
+                                                   low=low, high=high))
+
+
+# function to move the rows of a fact table created before the partitioning into the partitions
+def migrate_unpartitioned(cursor, fact_table, grain=PARTITION_GRAIN):
+    '''
+    Move the rows of <fact table>_unpartitioned (see RENAME_UNPARTITIONED_FACT_SQL), if there is one,
+    into the partitions of the fact table, drop it, and move the sequence of the surrogate key past the keys moved
+    '''
+    unpartitioned = fact_table + '_unpartitioned'
+    cursor.execute(TABLE_EXISTS_SQL.format(unpartitioned))
+    if not cursor.fetchone()[0]:
+        return
+    cursor.execute(FACT_PERIODS_SQL.format(divisor=period_divisor(grain), table=unpartitioned))
+    create_partitions(cursor, fact_table, [row[0] for row in cursor.fetchall()], grain)
+    partitions = FACT_PARTITIONS[fact_table]
+    columns = ', '.join(column.name for column in schemas.table_columns(partitions['create_sql']))
+    cursor.execute(MIGRATE_UNPARTITIONED_FACT_SQL.format(unpartitioned=unpartitioned, table=fact_table, columns=columns,
+                                                         sequence=keys.SK_SEQUENCES[fact_table], sk=partitions['sk']))
+    logging.info('Moved the rows of ' + unpartitioned + ' into the partitions of ' + fact_table)
+
+
+# function to create the partitions a load needs
+def ensure_partitions(cursor, fact_table, grain=PARTITION_GRAIN):
+    '''
+    Create the partitions of the fact table for the periods of its stage rows (and move the rows of an unpartitioned
+    fact table into them). Returns the list of (low, high) date key ranges of the periods, the default period last
+    '''
+    partitions = FACT_PARTITIONS[fact_table]
+    migrate_unpartitioned(cursor, fact_table, grain)
+    cursor.execute(STAGE_PERIODS_SQL.format(start=partitions['start_column'], divisor=period_divisor(grain),
+                                            table=partitions['stage_table']))
+    periods = sorted(row[0] for row in cursor.fetchall())
+    create_partitions(cursor, fact_table, periods, grain)
+    return [period_bounds(period, grain) for period in periods] + [DEFAULT_PERIOD]
+
+
+# function to load a fact table partition by partition
+def load_by_partition(conn, fact_table, period_sql, grain=PARTITION_GRAIN):
+    '''
+    Create the partitions the load needs, then load the fact table with period_sql (a fact SQL with the %(low)s/%(high)s
+    start date key parameters) one partition at a time over the connection (psycopg2), committing each partition.
+    Returns a dictionary with the rows loaded per partition and the elapsed seconds
+    '''
+    started = time.monotonic()
+    metrics = {'partitions': {}, 'rows': 0, 'seconds': 0.0}
+    cursor = conn.cursor()
+    try:
+        bounds = ensure_partitions(cursor, fact_table, grain)
+        conn.commit()
+        for low, high in bounds:
+            partition_started = time.monotonic()
+            cursor.execute(period_sql, {'low': low, 'high': high})
+            rows = max(cursor.rowcount, 0)
+            conn.commit()
+            elapsed = max(time.monotonic() - partition_started, 1e-6)
+            metrics['partitions'][str(low)] = rows
+            metrics['rows'] += rows
+            logging.info('{} : [{} .. {}) {:,} rows loaded in {:.2f} s ({:,.0f} rows/sec)'.format(
+                fact_table, low, high, rows, elapsed, rows / elapsed))
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cursor.close()
+    metrics['seconds'] = time.monotonic() - started
+    logging.info('{} : {:,} rows loaded into {} partitions in {:.1f} s'.format(
+        fact_table, metrics['rows'], len(bounds), metrics['seconds']))
+    return metrics
+
+
+# function to detach the partition of a period
+def detach_partition(cursor, fact_table, period):
+    '''
+    Detach the partition of the period (yyyy or yyyymm) from the fact table, e.g. to archive it.
+    The partition stays as a table of its own, with its rows and indexes; returns its name.
+    The loads do not create the partition again while the detached table exists: attach it back or drop it
+    before the period is loaded again
+    '''
+    partition = partition_name(fact_table, period)
+    cursor.execute(DETACH_PARTITION_SQL.format(table=fact_table, partition=partition))
+    logging.info('Detached ' + partition + ' from ' + fact_table)
+    return partition
+
+
+# function to attach the partition of a period
+def attach_partition(cursor, fact_table, period, grain=PARTITION_GRAIN):
+    '''
+    Attach the (detached) partition of the period back to the fact table, e.g. after it was reloaded on its own.
+    Returns its name
+    '''
+    partition = partition_name(fact_table, period)
+    low, high = period_bounds(period, grain)
+    cursor.execute(ATTACH_PARTITION_SQL.format(table=fact_table, partition=partition, low=low, high=high))
+    logging.info('Attached ' + partition + ' to ' + fact_table)
+    return partition
@@ -0,0 +1,149 @@
+'''
+This module validates a source .csv file against the schema of its src table before it is loaded.
+The file is read in chunks and every check is vectorized over a whole chunk (pandas):
+type (DECIMAL/INTEGER/TIMESTAMP/BOOLEAN), length (VARCHAR), and primary key (not null and unique within the file).
+Rows failing a check are written to a reject file with their reason codes, e.g. too_long:description;bad_timestamp:end_time;
+and the clean rows are yielded as .csv chunks, ready to be streamed into COPY.
+So a single malformed row no longer fails the whole load.
+The file is read as text in chunks sized to a memory budget (see readers module), parsed with pyarrow, which keeps a
+quoted empty value ("") apart from an empty unquoted one, and the clean rows are written back with pyarrow, so the
+clean chunks load an empty string and a NULL exactly as COPY loads the original file.
+'''
+
+# Import necessary modules
+import io
+import logging
+import os
+import time
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.csv as pa_csv
+
+import readers
+import schemas
+
+# values postgres accepts for a BOOLEAN column (compared in lower case)
+BOOLEAN_VALUES = ['t', 'true', 'f', 'false', 'y', 'yes', 'n', 'no', 'on', 'off', '1', '0']
+
+INTEGER_MIN = -2 ** 31
+INTEGER_MAX = 2 ** 31 - 1
+
+# literals postgres accepts for an INTEGER column: no fraction and no exponent
+INTEGER_PATTERN = r'\s*[+-]?\d+\s*'
+
+
+# function to parse timestamps as postgres would
+def to_timestamp(values):
+    '''Parse the strings as timestamps, NaT where a value can not be parsed'''
+    try:
+        return pd.to_datetime(values, errors='coerce', format='ISO8601')
+    except (TypeError, ValueError):
+        # pandas < 2.0 has no ISO8601 format, but infers it from the values
+        return pd.to_datetime(values, errors='coerce')
+
+
+# function to check the values of a column
+def invalid_values(values, column):
+    '''Return a boolean array marking the non null values that do not fit the Column'''
+    present = values.notna().to_numpy()
+    if column.sql_type == 'VARCHAR':
+        return present & (values.str.len().to_numpy(na_value=0) > column.size)
+    if column.sql_type in ('DECIMAL', 'INTEGER'):
+        numbers = pd.to_numeric(values, errors='coerce').to_numpy(dtype='float64')
+        with np.errstate(invalid='ignore'):
+            if column.sql_type == 'DECIMAL':
+                # postgres rounds the value to the scale (half away from zero) before it checks the precision
+                scale = 10.0 ** (column.scale or 0)
+                rounded = np.floor(np.abs(numbers) * scale + 0.5) / scale
+                fits = rounded < 10.0 ** (column.size - (column.scale or 0))
+            else:
+                literals = values.str.fullmatch(INTEGER_PATTERN).to_numpy(dtype=bool, na_value=False)
+                fits = literals & (numbers >= INTEGER_MIN) & (numbers <= INTEGER_MAX)
+        return present & ~fits
+    if column.sql_type in ('TIMESTAMP', 'DATE'):
+        return present & to_timestamp(values).isna().to_numpy()
+    if column.sql_type == 'BOOLEAN':
+        return present & ~values.str.lower().isin(BOOLEAN_VALUES).to_numpy()
+    return np.zeros(len(values), dtype=bool)
+
+
+# reason code of a failed check per SQL type
+REASON_CODES = {
+    'VARCHAR': 'too_long',
+    'DECIMAL': 'bad_decimal',
+    'INTEGER': 'bad_integer',
+    'TIMESTAMP': 'bad_timestamp',
+    'DATE': 'bad_date',
+    'BOOLEAN': 'bad_boolean'
+}
+
+
+class PreLoadValidator(object):
+    '''
+    Validates the chunks of a source file against the table created by create_sql.
+    Keeps the hashes of the primary keys seen so far (sorted numpy array), so duplicates are found across chunks.
+    '''
+
+    def __init__(self, create_sql):
+        self.create_sql = create_sql
+        self.columns = schemas.table_columns(create_sql)
+        self.names = [column.name for column in self.columns]
+        self.primary_key = schemas.primary_key_columns(create_sql)
+        self.seen_keys = np.empty(0, dtype=np.uint64)
+        self.rows = 0
+        self.rejected = 0
+
+    def validate(self, chunk):
+        '''Return a Series with the reason codes of each row of the chunk ('' for a clean row)'''
+        reasons = pd.Series('', index=chunk.index, dtype=object)
+        for column in self.columns:
+            invalid = invalid_values(chunk[column.name], column)
+            if invalid.any():
+                reasons[invalid] += REASON_CODES[column.sql_type] + ':' + column.name + ';'
+        if self.primary_key:
+            keys = chunk[self.primary_key]
+            null_key = keys.isna().any(axis=1).to_numpy()
+            if null_key.any():
+                reasons[null_key] += 'pk_null;'
+            hashes = pd.util.hash_pandas_object(keys, index=False).to_numpy()
+            positions = np.searchsorted(self.seen_keys, hashes)
+            seen_before = np.zeros(len(hashes), dtype=bool)
+            if len(self.seen_keys):
+                seen_before = self.seen_keys[np.minimum(positions, len(self.seen_keys) - 1)] == hashes
+            duplicate = (seen_before | pd.Series(hashes).duplicated().to_numpy()) & ~null_key
+            if duplicate.any():
+                reasons[duplicate] += 'pk_duplicate;'
+            self.seen_keys = np.union1d(self.seen_keys, hashes[~null_key])
+        self.rows += len(chunk)
+        self.rejected += int((reasons != '').sum())
+        return reasons
+
+    def iter_clean_csv(self, csv_path, reject_path, memory_budget=readers.DEFAULT_MEMORY_BUDGET):
+        '''
+        Validate the .csv file chunk by chunk (each of memory_budget bytes at most) and yield the clean rows of each
+        chunk as .csv bytes (without header).
+        An empty unquoted value is read as NULL (None) and a quoted empty value as an empty string, as COPY does, and
+        the clean rows are written back the same way: NULL empty and unquoted, every string quoted.
+        The rejected rows are written to reject_path with a reject_reason column.
+        '''
+        started = time.monotonic()
+        os.makedirs(os.path.dirname(reject_path), exist_ok=True)
+        reader = readers.ChunkedReader(csv_path, self.create_sql, memory_budget)
+        write_options = pa_csv.WriteOptions(include_header=False)
+        with open(reject_path, 'w', newline='') as reject_file:
+            reject_file.write(','.join(self.names + ['reject_reason']) + '\n')
+            for chunk in reader:
+                reasons = self.validate(chunk)
+                rejected = (reasons != '').to_numpy()
+                if rejected.any():
+                    rejects = chunk[rejected].assign(reject_reason=reasons[rejected])
+                    rejects.to_csv(reject_file, header=False, index=False)
+                clean = io.BytesIO()
+                pa_csv.write_csv(pa.RecordBatch.from_pandas(chunk[~rejected], schema=reader.text_schema,
+                                                            preserve_index=False), clean, write_options=write_options)
+                yield clean.getvalue()
+        elapsed = max(time.monotonic() - started, 1e-6)
+        logging.info('{} : validated {:,} rows in {:.1f} s ({:,.0f} rows/sec), {:,} rejected to {}'.format(
+            csv_path, self.rows, elapsed, self.rows / elapsed, self.rejected, reject_path))
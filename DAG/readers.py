@@ -0,0 +1,92 @@
+'''
+This module reads a source .csv file into pandas in chunks sized to a memory budget, for the pre-load validation
+(see prevalidate module). The columns of the src table (see schemas module) are read as the text of the file,
+parsed with pyarrow, so an empty unquoted value (NULL for COPY) is None and a quoted empty value ("") is ''.
+The number of rows per chunk is computed from the memory used by a sample of the file, and the reader keeps
+metrics about the chunks and the peak memory of the process.
+'''
+
+# Import necessary modules
+import logging
+
+import pyarrow as pa
+import pyarrow.csv as pa_csv
+
+import schemas
+
+# default memory budget of one chunk
+DEFAULT_MEMORY_BUDGET = 256 * 1024 * 1024
+
+# number of rows read to estimate the memory used per row
+SAMPLE_ROWS = 10000
+
+# smallest number of rows per chunk, whatever the memory budget
+MIN_CHUNK_ROWS = 1000
+
+# size of the blocks the .csv file is parsed in
+TEXT_BLOCK_SIZE = 16 * 1024 * 1024
+
+
+# function to return the peak resident memory of the process
+def peak_rss_bytes():
+    '''Return the peak resident set size of the process in bytes, or None where it is not available'''
+    try:
+        import resource
+    except ImportError:
+        return None
+    # ru_maxrss is in kilobytes on linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+class ChunkedReader(object):
+    '''
+    Iterates over a .csv file in pandas DataFrame chunks of the text of the columns of the create table SQL
+    (see text_schema), with as many rows per chunk as fit in memory_budget bytes.
+    metrics has the number of chunks and rows, the rows per chunk, the largest chunk in bytes and the peak RSS of the process.
+    '''
+
+    def __init__(self, csv_path, create_sql, memory_budget=DEFAULT_MEMORY_BUDGET):
+        self.csv_path = csv_path
+        self.names = [column.name for column in schemas.table_columns(create_sql)]
+        # arrow schema of the columns read as text
+        self.text_schema = pa.schema([pa.field(name, pa.string()) for name in self.names])
+        self.memory_budget = memory_budget
+        self.metrics = {'chunks': 0, 'rows': 0, 'chunk_rows': None, 'max_chunk_bytes': 0, 'peak_rss_bytes': None}
+
+    def chunks(self, chunk_rows):
+        '''Yield DataFrames of chunk_rows rows (the last one may be shorter) of the text of the columns'''
+        read_options = pa_csv.ReadOptions(column_names=self.names, skip_rows=1, block_size=TEXT_BLOCK_SIZE)
+        parse_options = pa_csv.ParseOptions(newlines_in_values=True)
+        convert_options = pa_csv.ConvertOptions(column_types=self.text_schema, strings_can_be_null=True,
+                                                quoted_strings_can_be_null=False)
+        reader = pa_csv.open_csv(self.csv_path, read_options=read_options, parse_options=parse_options,
+                                 convert_options=convert_options)
+        pending = pa.Table.from_batches([], schema=self.text_schema)
+        for batch in reader:
+            pending = pa.concat_tables([pending, pa.Table.from_batches([batch])])
+            while pending.num_rows >= chunk_rows:
+                yield pending.slice(0, chunk_rows).to_pandas()
+                pending = pending.slice(chunk_rows)
+        if pending.num_rows:
+            yield pending.to_pandas()
+
+    def chunk_rows(self):
+        '''Return the number of rows per chunk which fit in the memory budget, estimated from a sample of the file'''
+        sample = next(iter(self.chunks(SAMPLE_ROWS)), None)
+        if sample is None or len(sample) == 0:
+            return SAMPLE_ROWS
+        bytes_per_row = sample.memory_usage(deep=True, index=False).sum() / float(len(sample))
+        return max(MIN_CHUNK_ROWS, int(self.memory_budget / bytes_per_row))
+
+    def __iter__(self):
+        chunk_rows = self.chunk_rows()
+        self.metrics['chunk_rows'] = chunk_rows
+        for chunk in self.chunks(chunk_rows):
+            self.metrics['chunks'] += 1
+            self.metrics['rows'] += len(chunk)
+            self.metrics['max_chunk_bytes'] = max(self.metrics['max_chunk_bytes'],
+                                                  int(chunk.memory_usage(deep=True, index=False).sum()))
+            self.metrics['peak_rss_bytes'] = peak_rss_bytes()
+            yield chunk
+        logging.info(self.csv_path + ' : read ' + str(self.metrics))
+
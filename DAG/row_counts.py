@@ -0,0 +1,100 @@
+'''
+This module checks the minimum row counts of the tables without counting every row of them.
+The row count of a table is taken, in order, from:
+- the rows its load task wrote in the run (rowcount of the COPY/INSERT, pushed to XCom by the task): the exact count
+  of a src/stg table, which is created empty every run, and a lower bound for a core table, which keeps its rows
+- the catalog estimate (pg_class.reltuples, summed over the partitions of a partitioned table), taken only when it is
+  over the minimum by ESTIMATE_MARGIN, as it is an estimate as of the last VACUUM/ANALYZE of the table
+- a probe counting at most minimum rows (COUNT over a LIMIT), which reads as many rows as the minimum whatever the
+  size of the table; it tells whether the table has the minimum, not how many rows it has
+The tables which need a query are checked in parallel, each over its own connection.
+Only the exact counts (EXACT_METHODS) may be saved and reused by a later run: a lower bound or an estimate is checked
+again every run.
+'''
+
+# Import necessary modules
+import logging
+import time
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+
+from SQLs import ESTIMATE_ROW_CNT_SQL, PROBE_ROW_CNT_SQL
+
+# how the row count of a table was found
+LOADED = 'load rowcount'
+LOADED_LOWER_BOUND = 'load rowcount, lower bound'
+ESTIMATE = 'catalog estimate'
+PROBE = 'probe'
+PREVIOUS_RUN = 'previous run'
+
+# methods which give the exact row count of a table
+EXACT_METHODS = (LOADED, PREVIOUS_RUN)
+
+# factor by which the catalog estimate has to be over the minimum to be taken without a probe
+ESTIMATE_MARGIN = 1.05
+
+# number of tables checked at the same time
+DEFAULT_WORKERS = 4
+
+# rows of a table (a lower bound with LOADED_LOWER_BOUND and PROBE) and how they were found
+RowCount = namedtuple('RowCount', ['rows', 'method'])
+
+
+# function to tell whether a row count is exact
+def is_exact(count):
+    '''Return True when the RowCount is the exact row count of its table'''
+    return count.method in EXACT_METHODS
+
+
+# function to check the row count of a table with queries
+def query_row_count(connect, table, min_rows, release=None):
+    '''
+    Return the RowCount of the table from the catalog estimate, or from a probe of at most min_rows rows when the
+    estimate is not over the minimum by ESTIMATE_MARGIN. The queries run over a connection from connect(),
+    given back to release(conn) if given (e.g. a connection pool), closed otherwise
+    '''
+    conn = connect()
+    try:
+        cursor = conn.cursor()
+        try:
+            cursor.execute(ESTIMATE_ROW_CNT_SQL.format(table))
+            estimate = int(cursor.fetchone()[0])
+            if estimate >= min_rows * ESTIMATE_MARGIN:
+                return RowCount(estimate, ESTIMATE)
+            cursor.execute(PROBE_ROW_CNT_SQL.format(table), {'limit': min_rows})
+            return RowCount(int(cursor.fetchone()[0]), PROBE)
+        finally:
+            cursor.close()
+    finally:
+        if release is not None:
+            release(conn)
+        else:
+            conn.close()
+
+
+# function to find the row counts of tables
+def row_counts(connect, minimums, loaded=None, workers=DEFAULT_WORKERS, release=None):
+    '''
+    Return a dictionary of table and RowCount for the tables of minimums (a dictionary of table and minimum rows).
+    loaded is a dictionary of table and (rows written by its load in the run, whether it is the exact count); a table
+    whose rows are exact, or a lower bound over the minimum, is not queried. The other tables are queried (see
+    query_row_count) workers at a time, each over its own connection from connect()
+    '''
+    loaded = loaded or {}
+    started = time.monotonic()
+    counts = {}
+    queried = []
+    for table, min_rows in minimums.items():
+        rows, exact = loaded.get(table, (None, False))
+        if rows is not None and (exact or rows >= min_rows):
+            counts[table] = RowCount(rows, LOADED if exact else LOADED_LOWER_BOUND)
+        else:
+            queried.append(table)
+    if queried:
+        with ThreadPoolExecutor(max_workers=min(workers, len(queried))) as executor:
+            results = list(executor.map(lambda table: query_row_count(connect, table, minimums[table], release),
+                                        queried))
+        counts.update(zip(queried, results))
+    logging.info('Found the row counts of {} tables in {:.2f} s ({} from their load, {} queried)'.format(
+        len(counts), time.monotonic() - started, len(counts) - len(queried), len(queried)))
+    return counts
@@ -0,0 +1,107 @@
+'''
+This module deploys the DDL of the src/stg/core tables as a stage of a few transactions over one connection,
+instead of one task (with its scheduling delay, process and connection) per table.
+The core tables are versioned: the checksum of the DDL last applied to each of them is kept in the etl_schema_version
+table, and the DDL of a table only runs again when it changed since, or when the table is missing. The core DDL is
+idempotent (CREATE ... IF NOT EXISTS, ADD COLUMN IF NOT EXISTS), so running a changed DDL applies only what the database
+lacks, and the deployment of a current schema runs no DDL at all.
+The src/stg tables are not versioned: their DDL drops and creates them again, which empties them for the load of the run.
+A deployment runs in one transaction, so it is applied completely or not at all, and every DDL is timed.
+'''
+
+# Import necessary modules
+import hashlib
+import logging
+import time
+from collections import namedtuple
+
+from SQLs import (CREATE_TABLE_SRC_AIRPORT_CODES_SQL, CREATE_TABLE_SRC_US_ACCIDENTS_SQL, CREATE_TABLE_SRC_DC_TAXI_TRIPS_SQL,
+                  CREATE_TABLE_STG_ADDRESS_SQL, CREATE_TABLE_STG_ACCIDENT_CONDITION_SQL, CREATE_TABLE_STG_AIRPORT_SQL,
+                  CREATE_TABLE_STG_WEATHER_CONDITION_SQL, CREATE_TABLE_STG_PROVIDER_SQL, CREATE_TABLE_STG_SOURCE_SQL,
+                  CREATE_TABLE_STG_ACCIDENT_SQL, CREATE_TABLE_STG_TRIP_SQL, CREATE_TABLE_DIM_DATE_SQL, CREATE_TABLE_DIM_TIME_SQL,
+                  CREATE_TABLE_DIM_ADDRESS_SQL, CREATE_TABLE_DIM_ACC_COND_SQL, CREATE_TABLE_DIM_AIRPORT_SQL,
+                  CREATE_TABLE_DIM_WTHR_COND_SQL, CREATE_TABLE_LKP_PROVIDER_SQL, CREATE_TABLE_LKP_SOURCE_SQL,
+                  CREATE_TABLE_FACT_ACCIDENT_SQL, CREATE_TABLE_FACT_TRIP_SQL, CREATE_TABLE_ETL_WATERMARK_SQL,
+                  CREATE_TABLE_ETL_CHECKPOINT_SQL, CREATE_TABLE_ETL_SCHEMA_VERSION_SQL, SCHEMA_DEPLOY_LOCK_SQL,
+                  SCHEMA_VERSIONS_SQL, SAVE_SCHEMA_VERSION_SQL, TABLE_EXISTS_SQL)
+
+# table (schema qualified) and the DDL which creates it
+TableDDL = namedtuple('TableDDL', ['table', 'sql'])
+
+# core tables, created once and kept (in the order they are created)
+CORE_SCHEMA = [
+    TableDDL('"CORE_DB".dim_date', CREATE_TABLE_DIM_DATE_SQL),
+    TableDDL('"CORE_DB".dim_time', CREATE_TABLE_DIM_TIME_SQL),
+    TableDDL('"CORE_DB".dim_address', CREATE_TABLE_DIM_ADDRESS_SQL),
+    TableDDL('"CORE_DB".dim_acc_cond', CREATE_TABLE_DIM_ACC_COND_SQL),
+    TableDDL('"CORE_DB".dim_airport', CREATE_TABLE_DIM_AIRPORT_SQL),
+    TableDDL('"CORE_DB".dim_wthr_cond', CREATE_TABLE_DIM_WTHR_COND_SQL),
+    TableDDL('"CORE_DB".lkp_provider', CREATE_TABLE_LKP_PROVIDER_SQL),
+    TableDDL('"CORE_DB".lkp_source', CREATE_TABLE_LKP_SOURCE_SQL),
+    TableDDL('"CORE_DB".fact_accident', CREATE_TABLE_FACT_ACCIDENT_SQL),
+    TableDDL('"CORE_DB".fact_trip', CREATE_TABLE_FACT_TRIP_SQL),
+    TableDDL('"CORE_DB".etl_watermark', CREATE_TABLE_ETL_WATERMARK_SQL),
+    TableDDL('"CORE_DB".etl_checkpoint', CREATE_TABLE_ETL_CHECKPOINT_SQL)
+]
+
+# src/stg tables, dropped and created again every run. The src tables come first: the accident/trip src tables
+# are dropped with CASCADE, which drops the stg views over them (stage view mode)
+STAGE_SCHEMA = [
+    TableDDL('"SRC_DB".stg_src_airport_codes', CREATE_TABLE_SRC_AIRPORT_CODES_SQL),
+    TableDDL('"SRC_DB".stg_src_us_accidents', CREATE_TABLE_SRC_US_ACCIDENTS_SQL),
+    TableDDL('"SRC_DB".stg_src_dc_taxi_trips', CREATE_TABLE_SRC_DC_TAXI_TRIPS_SQL),
+    TableDDL('"STG_DB".stg_address', CREATE_TABLE_STG_ADDRESS_SQL),
+    TableDDL('"STG_DB".stg_accident_condition', CREATE_TABLE_STG_ACCIDENT_CONDITION_SQL),
+    TableDDL('"STG_DB".stg_airport', CREATE_TABLE_STG_AIRPORT_SQL),
+    TableDDL('"STG_DB".stg_weather_condition', CREATE_TABLE_STG_WEATHER_CONDITION_SQL),
+    TableDDL('"STG_DB".stg_provider', CREATE_TABLE_STG_PROVIDER_SQL),
+    TableDDL('"STG_DB".stg_source', CREATE_TABLE_STG_SOURCE_SQL),
+    TableDDL('"STG_DB".stg_accident', CREATE_TABLE_STG_ACCIDENT_SQL),
+    TableDDL('"STG_DB".stg_trip', CREATE_TABLE_STG_TRIP_SQL)
+]
+
+
+# function to return the checksum of a DDL
+def checksum(sql):
+    '''Return the md5 hex digest of the DDL'''
+    return hashlib.md5(sql.encode('utf-8')).hexdigest()
+
+
+# function to deploy the DDL of tables
+def deploy(conn, schema, versioned=False):
+    '''
+    Run the DDL of the schema (list of TableDDL) in order over the connection (psycopg2), in one transaction.
+    With versioned, the DDL of a table is skipped when its checksum is the one last applied and the table exists,
+    and the checksum of every DDL run is saved. Returns a dictionary with the elapsed seconds of each DDL run
+    '''
+    started = time.monotonic()
+    timings = {}
+    cursor = conn.cursor()
+    try:
+        cursor.execute(SCHEMA_DEPLOY_LOCK_SQL)
+        applied = {}
+        if versioned:
+            cursor.execute(CREATE_TABLE_ETL_SCHEMA_VERSION_SQL)
+            cursor.execute(SCHEMA_VERSIONS_SQL)
+            applied = dict(cursor.fetchall())
+        for ddl in schema:
+            ddl_checksum = checksum(ddl.sql)
+            if versioned and applied.get(ddl.table.lower()) == ddl_checksum:
+                cursor.execute(TABLE_EXISTS_SQL.format(ddl.table))
+                if cursor.fetchone()[0]:
+                    continue
+            ddl_started = time.monotonic()
+            cursor.execute(ddl.sql)
+            if versioned:
+                cursor.execute(SAVE_SCHEMA_VERSION_SQL, {'object_name': ddl.table.lower(), 'checksum': ddl_checksum})
+            timings[ddl.table] = time.monotonic() - ddl_started
+            logging.info('{} : DDL applied in {:.3f} s'.format(ddl.table, timings[ddl.table]))
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cursor.close()
+    logging.info('Deployed the DDL of {} of {} tables in {:.2f} s ({} current)'.format(
+        len(timings), len(schema), time.monotonic() - started, len(schema) - len(timings)))
+    return timings
@@ -0,0 +1,37 @@
+'''
+This module derives the column names and types of a table from its create table SQL in the SQLs module,
+so that the Python side stages (parquet landing zone, pre-load validation, chunked readers) use the same schema as the tables.
+The columns are positional, like COPY: the n-th column of the .csv file is the n-th column of the table.
+'''
+
+# Import necessary modules
+import re
+from collections import namedtuple
+
+# a column of a table: name, SQL type (upper case), length or precision, and scale (None when not given)
+Column = namedtuple('Column', ['name', 'sql_type', 'size', 'scale'])
+
+COLUMN_PATTERN = re.compile(r'^(\w+)\s+(VARCHAR|DECIMAL|INTEGER|TIMESTAMP|BOOLEAN|DATE)(?:\((\d+)(?:,(\d+))?\))?,?$', re.IGNORECASE)
+PRIMARY_KEY_PATTERN = re.compile(r'PRIMARY KEY\s*\(([^)]*)\)', re.IGNORECASE)
+
+
+# function to return the columns of a table
+def table_columns(create_sql):
+    '''Return the list of Column of the table created by the SQL, in the order of the table'''
+    columns = []
+    for line in create_sql.splitlines():
+        match = COLUMN_PATTERN.match(line.strip())
+        if match:
+            name, sql_type, size, scale = match.groups()
+            columns.append(Column(name.lower(), sql_type.upper(),
+                                  int(size) if size else None, int(scale) if scale else None))
+    return columns
+
+
+# function to return the primary key columns of a table
+def primary_key_columns(create_sql):
+    '''Return the list of primary key column names (lower case) of the table created by the SQL'''
+    match = PRIMARY_KEY_PATTERN.search(create_sql)
+    if not match:
+        return []
+    return [column.strip().lower() for column in match.group(1).split(',')]
@@ -0,0 +1,103 @@
+'''
+The modules of the DAG are flat modules of the DAG directory which import each other by name, as airflow puts
+the DAG directory on sys.path; the tests import them the same way.
+The tests replace postgres with FakeDatabase, whose connections and cursors behave like those of psycopg2;
+each test module subclasses it with the behavior of its tables.
+'''
+
+# Import necessary modules
+import os
+import sys
+import threading
+
+DAG_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, 'DAG')
+FIXTURES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures')
+
+sys.path.insert(0, os.path.abspath(DAG_DIR))
+
+
+class FakeDatabase(object):
+    '''
+    Hands out FakeConnections and runs the statements of their cursors with execute (and copy for COPY);
+    records the statements run, the commits and the rollbacks. Subclasses override the hooks with their tables.
+    '''
+
+    def __init__(self):
+        self.conns = []
+        self.executed = []
+        self.commits = 0
+        self.rollbacks = 0
+        self.lock = threading.Lock()
+
+    def connect(self):
+        with self.lock:
+            conn = FakeConnection(self, len(self.conns))
+            self.conns.append(conn)
+        return conn
+
+    def execute(self, cursor, sql, params):
+        '''Run the statement: set cursor.rows and cursor.rowcount'''
+
+    def copy(self, cursor, sql, data):
+        '''Run the COPY of the data read from the source'''
+
+    def commit(self, conn):
+        self.commits += 1
+
+    def rollback(self, conn):
+        self.rollbacks += 1
+
+
+class FakeConnection(object):
+
+    def __init__(self, db, number):
+        self.db = db
+        self.number = number
+        self.autocommit = False
+        self.closed = False
+
+    def cursor(self):
+        return FakeCursor(self)
+
+    def commit(self):
+        self.db.commit(self)
+
+    def rollback(self):
+        self.db.rollback(self)
+
+    def cancel(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+
+class FakeCursor(object):
+
+    def __init__(self, conn):
+        self.conn = conn
+        self.rows = []
+        self.rowcount = -1
+
+    def execute(self, sql, params=None):
+        with self.conn.db.lock:
+            self.conn.db.executed.append(sql)
+        self.conn.db.execute(self, sql, params)
+
+    def copy_expert(self, sql, source, size=8192):
+        data = b''
+        while True:
+            chunk = source.read(size)
+            if not chunk:
+                break
+            data += chunk
+        self.conn.db.copy(self, sql, data)
+
+    def fetchone(self):
+        return self.rows[0] if self.rows else None
+
+    def fetchall(self):
+        return self.rows
+
+    def close(self):
+        pass
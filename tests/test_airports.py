@@ -0,0 +1,116 @@
+'''Tests of the airports module, run offline against the saved pages of tests/fixtures/airports'''
+
+# Import necessary modules
+import importlib.util
+import os
+from urllib.error import HTTPError
+
+import pandas as pd
+import pytest
+
+import airports
+from conftest import FIXTURES_DIR
+
+AIRPORTS_FIXTURES_DIR = os.path.join(FIXTURES_DIR, 'airports')
+
+# pandas.read_html needs lxml, or BeautifulSoup with html5lib
+HAS_HTML_PARSER = importlib.util.find_spec('lxml') is not None or (
+    importlib.util.find_spec('bs4') is not None and importlib.util.find_spec('html5lib') is not None)
+requires_html_parser = pytest.mark.skipif(not HAS_HTML_PARSER, reason='pandas.read_html needs lxml or bs4/html5lib')
+
+
+class FlakyFetcher(object):
+    '''Fetch backend which fails with the given errors first, then serves the saved pages'''
+
+    def __init__(self, errors):
+        self.errors = list(errors)
+        self.fixtures = airports.FixtureFetcher(AIRPORTS_FIXTURES_DIR)
+        self.calls = 0
+
+    def __call__(self, url):
+        self.calls += 1
+        if self.errors:
+            raise self.errors.pop(0)
+        return self.fixtures(url)
+
+
+class ConcatCounter(object):
+    '''Stands in for the pandas module of the airports module and counts the calls of concat'''
+
+    def __init__(self):
+        self.concat_calls = 0
+
+    def __getattr__(self, name):
+        return getattr(pd, name)
+
+    def concat(self, *args, **kwargs):
+        self.concat_calls += 1
+        return pd.concat(*args, **kwargs)
+
+
+def unavailable(url):
+    return HTTPError(url, 503, 'Service Unavailable', None, None)
+
+
+def fetch_fast(fetch):
+    return airports.fetch_airport_codes(fetch=fetch, requests_per_sec=1000, burst=10, max_workers=2, backoff_sec=0)
+
+
+@requires_html_parser
+def test_parse_airport_codes_of_saved_state_page():
+    html = airports.FixtureFetcher(AIRPORTS_FIXTURES_DIR)(airports.AIRNAV_STATE_URL.format('RI'))
+    df = airports.parse_airport_codes(html)
+    assert list(df.columns) == airports.AIRPORT_COLUMNS
+    assert df.values.tolist() == [['PVD', 'PROVIDENCE', 'Theodore Francis Green State Airport'],
+                                  ['BID', 'BLOCK ISLAND', 'Block Island State Airport'],
+                                  ['WST', 'WESTERLY', 'Westerly State Airport']]
+
+
+@requires_html_parser
+def test_fetch_airport_codes_offline_concatenates_once(monkeypatch):
+    counter = ConcatCounter()
+    monkeypatch.setattr(airports, 'pd', counter)
+    # the states page lists RI and ZZ, which has no saved page: ZZ is skipped
+    df = fetch_fast(airports.FixtureFetcher(AIRPORTS_FIXTURES_DIR))
+    assert counter.concat_calls == 1
+    assert df['ID'].tolist() == ['BID', 'PVD', 'WST']
+
+
+@requires_html_parser
+def test_fetch_airport_codes_retries_unavailable_pages(monkeypatch):
+    sleeps = []
+    monkeypatch.setattr(airports.time, 'sleep', sleeps.append)
+    fetch = FlakyFetcher([unavailable(airports.STATE_CODES_URL), unavailable(airports.STATE_CODES_URL)])
+    df = fetch_fast(fetch)
+    assert len(sleeps) == 2
+    assert len(df) == 3
+
+
+def test_fetch_with_retries_backs_off_exponentially(monkeypatch):
+    sleeps = []
+    monkeypatch.setattr(airports.time, 'sleep', sleeps.append)
+    monkeypatch.setattr(airports.random, 'uniform', lambda low, high: 0)
+    url = airports.AIRNAV_STATE_URL.format('RI')
+    fetch = FlakyFetcher([unavailable(url), unavailable(url), unavailable(url)])
+    html = airports.fetch_with_retries(fetch, url, airports.HostRateLimiter(1000, 10), retries=4, backoff_sec=2)
+    assert 'PVD' in html
+    assert fetch.calls == 4
+    assert sleeps == [2, 4, 8]
+
+
+def test_fetch_with_retries_gives_up(monkeypatch):
+    monkeypatch.setattr(airports.time, 'sleep', lambda seconds: None)
+    url = airports.AIRNAV_STATE_URL.format('RI')
+    fetch = FlakyFetcher([unavailable(url)] * 3)
+    with pytest.raises(HTTPError):
+        airports.fetch_with_retries(fetch, url, airports.HostRateLimiter(1000, 10), retries=2, backoff_sec=0)
+    assert fetch.calls == 3
+
+
+def test_fetch_with_retries_does_not_retry_client_errors(monkeypatch):
+    monkeypatch.setattr(airports.time, 'sleep', lambda seconds: None)
+    url = airports.AIRNAV_STATE_URL.format('RI')
+    fetch = FlakyFetcher([HTTPError(url, 404, 'Not Found', None, None)])
+    with pytest.raises(HTTPError):
+        airports.fetch_with_retries(fetch, url, airports.HostRateLimiter(1000, 10))
+    assert fetch.calls == 1
@@ -0,0 +1,85 @@
+'''Tests of the chunks module, with the stage and checkpoint tables of postgres replaced by a fake'''
+
+# Import necessary modules
+import pytest
+
+import chunks
+from conftest import FakeDatabase
+from SQLs import GET_CHECKPOINT_SQL, SAVE_CHECKPOINT_SQL
+
+CHUNK_SQL = 'INSERT INTO fact SELECT ... WHERE ID > %(low)s AND ID <= %(high)s'
+
+
+class CheckpointDatabase(FakeDatabase):
+    '''A stage table of keys and the checkpoint table; the fact SQL fails after fail_after chunks'''
+
+    def __init__(self, keys, fail_after=None):
+        super(CheckpointDatabase, self).__init__()
+        self.keys = sorted(keys)
+        self.checkpoints = {}
+        self.committed_checkpoints = {}
+        self.fail_after = fail_after
+        self.chunks_run = 0
+
+    def commit(self, conn):
+        super(CheckpointDatabase, self).commit(conn)
+        self.committed_checkpoints = dict(self.checkpoints)
+
+    def rollback(self, conn):
+        super(CheckpointDatabase, self).rollback(conn)
+        self.checkpoints = dict(self.committed_checkpoints)
+
+    def execute(self, cursor, sql, params):
+        if sql == GET_CHECKPOINT_SQL:
+            checkpoint = self.checkpoints.get(params['load_name'])
+            cursor.rows = [checkpoint] if checkpoint else []
+        elif sql == SAVE_CHECKPOINT_SQL:
+            self.checkpoints[params['load_name']] = (params['run_id'], params['last_key'], params['chunks'],
+                                                     params['rows'], params['completed'])
+        elif sql == CHUNK_SQL:
+            if self.fail_after is not None and self.chunks_run == self.fail_after:
+                raise RuntimeError('server closed the connection')
+            self.chunks_run += 1
+            cursor.rowcount = len([key for key in self.keys if params['low'] < key <= params['high']])
+        else:
+            chunk = [key for key in self.keys if key > params['low']][:params['rows']]
+            cursor.rows = [(chunk[-1] if chunk else None, len(chunk))]
+
+
+def loader(db, run_id='run_1'):
+    return chunks.ChunkedFactLoader(db.connect(), 'fact_trip', run_id, CHUNK_SQL, 'stg_trip', chunk_rows=3)
+
+
+KEYS = ['K{:02d}'.format(number) for number in range(10)]
+
+
+def test_load_walks_the_stage_keys_in_chunks():
+    db = CheckpointDatabase(KEYS)
+    metrics = loader(db).load()
+    assert metrics['chunks'] == 4
+    assert metrics['rows'] == metrics['run_rows'] == 10
+    assert db.committed_checkpoints['fact_trip'] == ('run_1', 'K09', 4, 10, True)
+
+
+def test_resume_reports_the_rows_of_the_whole_run():
+    db = CheckpointDatabase(KEYS, fail_after=2)
+    with pytest.raises(RuntimeError):
+        loader(db).load()
+    assert db.committed_checkpoints['fact_trip'] == ('run_1', 'K05', 2, 6, False)
+    db.fail_after = None
+    metrics = loader(db).load()
+    # this attempt loaded the last 2 chunks, the run loaded all of them
+    assert metrics['chunks'] == 2
+    assert metrics['rows'] == 4
+    assert metrics['run_rows'] == 10
+    assert db.committed_checkpoints['fact_trip'] == ('run_1', 'K09', 4, 10, True)
+
+
+def test_checkpoint_of_another_run_is_started_over():
+    db = CheckpointDatabase(KEYS, fail_after=1)
+    with pytest.raises(RuntimeError):
+        loader(db).load()
+    db.fail_after = None
+    metrics = loader(db, run_id='run_2').load()
+    assert metrics['chunks'] == 4
+    assert metrics['rows'] == metrics['run_rows'] == 10
@@ -0,0 +1,152 @@
+'''Tests of the connection_pool module, with psycopg2 connections replaced by fakes'''
+
+# Import necessary modules
+import threading
+import time
+
+import pytest
+
+import connection_pool
+from conftest import FakeDatabase
+
+
+class PoolDatabase(FakeDatabase):
+    '''Records the connections probed by the health check, which fails on the connections in broken'''
+
+    def __init__(self):
+        super(PoolDatabase, self).__init__()
+        self.broken = set()
+        self.probed = []
+
+    def execute(self, cursor, sql, params):
+        self.probed.append(cursor.conn)
+        if cursor.conn in self.broken:
+            raise RuntimeError('server closed the connection unexpectedly')
+        cursor.rows = [(1,)]
+
+
+def test_released_connection_is_reused_rolled_back():
+    db = PoolDatabase()
+    pool = connection_pool.ConnectionPool(db.connect, max_size=2)
+    conn = pool.acquire()
+    conn.autocommit = True
+    pool.release(conn)
+    assert db.rollbacks == 1
+    assert not conn.autocommit
+    assert pool.acquire() is conn
+    assert pool.stats == {'opened': 1, 'reused': 1, 'discarded': 0}
+
+
+def test_full_pool_waits_for_a_release():
+    db = PoolDatabase()
+    pool = connection_pool.ConnectionPool(db.connect, max_size=1)
+    conn = pool.acquire()
+    threading.Timer(0.1, pool.release, [conn]).start()
+    assert pool.acquire(timeout=5) is conn
+    assert len(db.conns) == 1
+
+
+def test_full_pool_times_out():
+    pool = connection_pool.ConnectionPool(PoolDatabase().connect, max_size=1)
+    pool.acquire()
+    with pytest.raises(connection_pool.PoolTimeout):
+        pool.acquire(timeout=0.05)
+
+
+def test_stale_connection_failing_its_health_check_is_replaced():
+    db = PoolDatabase()
+    pool = connection_pool.ConnectionPool(db.connect, max_size=1, health_check_interval=0)
+    conn = pool.acquire()
+    pool.release(conn)
+    db.broken.add(conn)
+    replacement = pool.acquire()
+    assert replacement is not conn
+    assert conn.closed and db.probed == [conn]
+    assert pool.stats == {'opened': 2, 'reused': 0, 'discarded': 1}
+    assert pool.open == 1
+
+
+def test_recent_connection_is_not_probed():
+    db = PoolDatabase()
+    pool = connection_pool.ConnectionPool(db.connect, health_check_interval=60)
+    conn = pool.acquire()
+    pool.release(conn)
+    assert pool.acquire() is conn
+    assert db.probed == []
+
+
+def test_closed_and_discarded_connections_free_their_slot():
+    db = PoolDatabase()
+    pool = connection_pool.ConnectionPool(db.connect, max_size=1)
+    conn = pool.acquire()
+    conn.close()
+    pool.release(conn)
+    second = pool.acquire(timeout=0.05)
+    pool.release(second, discard=True)
+    assert second.closed
+    assert pool.acquire(timeout=0.05) not in (conn, second)
+    assert pool.stats['discarded'] == 2
+
+
+def test_connection_context_manager_releases():
+    pool = connection_pool.ConnectionPool(PoolDatabase().connect, max_size=1)
+    with pytest.raises(ValueError):
+        with pool.connection() as conn:
+            raise ValueError('failed statement')
+    assert pool.acquire(timeout=0.05) is conn
+
+
+def test_failed_connect_frees_its_slot():
+    def connect():
+        raise RuntimeError('could not connect to server')
+    pool = connection_pool.ConnectionPool(connect, max_size=1)
+    for _ in range(2):
+        with pytest.raises(RuntimeError):
+            pool.acquire(timeout=0.05)
+    assert pool.open == 0
+
+
+def test_threads_never_exceed_max_size():
+    db = PoolDatabase()
+    pool = connection_pool.ConnectionPool(db.connect, max_size=3)
+    in_use = []
+    peak = []
+    lock = threading.Lock()
+
+    def work():
+        for _ in range(20):
+            with pool.connection(timeout=5) as conn:
+                with lock:
+                    in_use.append(conn)
+                    peak.append(len(in_use))
+                time.sleep(0.001)
+                with lock:
+                    in_use.remove(conn)
+
+    threads = [threading.Thread(target=work) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert max(peak) <= 3
+    assert len(db.conns) <= 3
+    assert pool.stats['opened'] + pool.stats['reused'] == 160
+
+
+def test_close_all_closes_the_idle_connections():
+    db = PoolDatabase()
+    pool = connection_pool.ConnectionPool(db.connect)
+    conns = [pool.acquire() for _ in range(3)]
+    for conn in conns:
+        pool.release(conn)
+    pool.close_all()
+    assert all(conn.closed for conn in conns)
+    assert pool.open == 0
+
+
+def test_shared_pool_is_one_per_name_and_process():
+    db = PoolDatabase()
+    pool = connection_pool.shared_pool('test_shared_pool', db.connect, max_size=2)
+    assert connection_pool.shared_pool('test_shared_pool', db.connect) is pool
+    assert connection_pool.shared_pool('test_shared_pool_other', db.connect) is not pool
+    assert pool.max_size == 2
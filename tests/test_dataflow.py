@@ -0,0 +1,116 @@
+'''Tests of the dataflow module: dependencies derived from the tables the tasks read and write'''
+
+# Import necessary modules
+import datetime
+
+import dataflow
+from dataflow import Step
+
+
+def paths(edges):
+    '''Return a dictionary of task_id and the set of task_ids reachable from it'''
+    downstream = {}
+    for upstream_id, downstream_id in edges:
+        downstream.setdefault(upstream_id, set()).add(downstream_id)
+    reachable = {}
+    for task_id in downstream:
+        seen, stack = set(), [task_id]
+        while stack:
+            for next_id in downstream.get(stack.pop(), ()):
+                if next_id not in seen:
+                    seen.add(next_id)
+                    stack.append(next_id)
+        reachable[task_id] = seen
+    return reachable
+
+
+def test_transitive_reduction_drops_the_implied_edges():
+    edges = {('a', 'b'), ('b', 'c'), ('a', 'c'), ('c', 'd'), ('a', 'd'), ('x', 'd')}
+    assert dataflow.transitive_reduction(edges) == {('a', 'b'), ('b', 'c'), ('c', 'd'), ('x', 'd')}
+
+
+def test_read_after_write_write_after_write_and_write_after_read():
+    steps = [
+        Step('create', [], ['t']),
+        Step('load', [], ['t']),
+        Step('report_1', ['t'], ['r1']),
+        Step('report_2', ['t'], ['r2']),
+        Step('reload', [], ['t']),
+        Step('other', ['u'], ['v'])
+    ]
+    assert dataflow.derive_dependencies(steps) == {
+        ('create', 'load'),
+        ('load', 'report_1'), ('load', 'report_2'),
+        ('report_1', 'reload'), ('report_2', 'reload')
+    }
+
+
+def test_registry_is_acyclic_and_every_step_is_reached():
+    edges = dataflow.derive_dependencies()
+    reachable = paths(edges)
+    assert all(task_id not in reachable[task_id] for task_id in reachable)
+    task_ids = [step.task_id for step in dataflow.STEPS]
+    assert len(task_ids) == len(set(task_ids))
+    assert dataflow.transitive_reduction(edges) == edges
+
+
+def test_validations_gate_the_next_loads_of_their_source():
+    reachable = paths(dataflow.derive_dependencies())
+    for validation in [step for step in dataflow.STEPS if step.task_id.startswith('validate_row_cnt_')]:
+        for table in validation.reads:
+            later = [step for step in dataflow.STEPS if dataflow.validated(table) in step.reads]
+            assert all(step.task_id in reachable[validation.task_id] for step in later)
+    assert 'insert_stg_trip_table' in reachable['validate_row_cnt_stg_src_dc_taxi_trips_table']
+    assert 'insert_update_fact_trip_table' in reachable['validate_row_cnt_stg_trip_tables']
+    assert 'insert_update_fact_accident_table' in reachable['validate_row_cnt_stg_address_table']
+    assert 'record_source_fingerprints' in reachable['validate_row_cnt_core_tables']
+    assert 'record_source_fingerprints' in reachable['validate_nat_keys_dup_core_tables']
+
+
+def test_sources_load_in_parallel():
+    reachable = paths(dataflow.derive_dependencies())
+    # the trip chain does not wait for the accident COPY or its validation, except through stg_address
+    for task_id in ('copy_stg_src_us_accidents_table', 'validate_row_cnt_stg_src_us_accidents_table',
+                    'validate_row_cnt_stg_accident_tables'):
+        for trip_task_id in ('insert_stg_provider_table', 'insert_stg_trip_table', 'insert_update_lkp_provider_table',
+                             'validate_row_cnt_stg_src_dc_taxi_trips_table'):
+            assert trip_task_id not in reachable.get(task_id, ())
+    assert 'insert_stg_accident_table' not in reachable['copy_stg_src_dc_taxi_trips_table']
+    assert 'insert_update_fact_trip_table' in reachable['copy_stg_src_us_accidents_table']
+
+
+def test_writers():
+    assert dataflow.writers('"stg_db".STG_TRIP') == ['deploy_stage_schema', 'insert_stg_trip_table',
+                                                      'create_trip_indexes']
+
+
+class FakeTask(object):
+
+    def __init__(self, task_id):
+        self.task_id = task_id
+        self.downstream = set()
+
+    def set_downstream(self, task):
+        self.downstream.add(task.task_id)
+
+
+def test_set_dependencies_links_start_and_end():
+    steps = [Step('a', [], ['t']), Step('b', ['t'], ['u']), Step('c', [], ['v'])]
+    tasks = dict((task_id, FakeTask(task_id)) for task_id in 'abc')
+    start, end = FakeTask('start'), FakeTask('end')
+    edges = dataflow.set_dependencies(tasks, start, end, steps)
+    assert edges == {('a', 'b')}
+    assert start.downstream == {'a', 'c'}
+    assert tasks['a'].downstream == {'b'}
+    assert tasks['b'].downstream == tasks['c'].downstream == {'end'}
+
+
+def test_critical_path_follows_the_upstream_task_which_finished_last():
+    at = lambda seconds: datetime.datetime(2020, 1, 1) + datetime.timedelta(seconds=seconds)
+    timings = {'a': (at(0), at(10)), 'b': (at(0), at(30)), 'c': (at(32), at(40)), 'd': (None, None)}
+    upstream = {'c': ['a', 'b'], 'd': ['c']}
+    path = dataflow.critical_path(timings, upstream)
+    assert [step['task_id'] for step in path] == ['b', 'c']
+    assert path[1]['upstream'] == 'b'
+    assert path[1]['wait_seconds'] == 2.0
+    assert path[1]['seconds'] == 8.0
@@ -0,0 +1,94 @@
+'''Tests of the http_cache module, with urlopen replaced by a fake server'''
+
+# Import necessary modules
+import threading
+from email.message import Message
+from urllib.error import HTTPError
+
+import pytest
+
+import http_cache
+
+URL = 'https://www.airnav.com/airports/us/RI'
+
+
+class FakeResponse(object):
+
+    def __init__(self, body):
+        self.body = body
+        self.headers = Message()
+        self.headers['Content-Type'] = 'text/html; charset=utf-8'
+        self.headers['ETag'] = '"v1"'
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+    def read(self):
+        return self.body
+
+
+class FakeServer(object):
+    '''Stands in for urlopen: answers 304 to a request with a matching If-None-Match, the page otherwise'''
+
+    def __init__(self, body=b'<html>RI</html>'):
+        self.body = body
+        self.requests = []
+
+    def __call__(self, request, timeout=None):
+        self.requests.append(request)
+        if request.get_header('If-none-match') == '"v1"':
+            raise HTTPError(request.full_url, 304, 'Not Modified', None, None)
+        return FakeResponse(self.body)
+
+
+@pytest.fixture
+def server(monkeypatch):
+    server = FakeServer()
+    monkeypatch.setattr(http_cache, 'urlopen', server)
+    return server
+
+
+def test_serves_fresh_pages_from_disk(tmp_path, server):
+    fetch = http_cache.CachingFetcher(str(tmp_path))
+    assert fetch(URL) == '<html>RI</html>'
+    assert fetch(URL) == '<html>RI</html>'
+    assert len(server.requests) == 1
+    assert fetch.stats == {'fresh': 1, 'revalidated': 0, 'downloaded': 1}
+    assert not fetch.needs_network(URL)
+
+
+def test_revalidates_expired_pages(tmp_path, server):
+    fetch = http_cache.CachingFetcher(str(tmp_path), ttls=[], default_ttl=0)
+    fetch(URL)
+    assert fetch(URL) == '<html>RI</html>'
+    assert fetch.stats == {'fresh': 0, 'revalidated': 1, 'downloaded': 1}
+
+
+def test_offline_mode_serves_only_cached_pages(tmp_path, server):
+    http_cache.CachingFetcher(str(tmp_path))(URL)
+    offline = http_cache.CachingFetcher(str(tmp_path), offline=True)
+    assert offline(URL) == '<html>RI</html>'
+    with pytest.raises(http_cache.CacheMissError):
+        offline(URL + '/missing')
+    assert len(server.requests) == 1
+    # the caller can tell the run was incomplete
+    assert offline.missing == [URL + '/missing']
+
+
+def test_counts_the_hits_of_concurrent_threads(tmp_path, server):
+    fetch = http_cache.CachingFetcher(str(tmp_path))
+    fetch(URL)
+
+    def fetch_many():
+        for _ in range(200):
+            fetch(URL)
+
+    threads = [threading.Thread(target=fetch_many) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert fetch.stats['fresh'] == 8 * 200
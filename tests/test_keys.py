@@ -0,0 +1,66 @@
+'''Tests of the keys module, with the sequences of postgres replaced by a fake'''
+
+# Import necessary modules
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from conftest import FakeDatabase
+import keys
+
+
+class SequenceDatabase(FakeDatabase):
+    '''Postgres sequences: NEXTVAL over GENERATE_SERIES(1, count) returns the next count values of a sequence'''
+
+    def __init__(self):
+        super(SequenceDatabase, self).__init__()
+        self.values = {}
+        self.reservations = []
+
+    def execute(self, cursor, sql, params):
+        assert cursor.conn.autocommit
+        sequence = sql.split("'")[1]
+        count = params[0]
+        with self.lock:
+            last = self.values.get(sequence, 0)
+            self.values[sequence] = last + count
+            self.reservations.append(count)
+        cursor.rows = [(value,) for value in range(last + 1, last + count + 1)]
+
+
+def test_keys_are_handed_out_from_blocks():
+    sequences = SequenceDatabase()
+    allocator = keys.KeyAllocator(sequences.connect, '"CORE_DB".fact_trip', block_size=10)
+    assert allocator.next_keys(3) == [1, 2, 3]
+    assert allocator.next_keys(7) == [4, 5, 6, 7, 8, 9, 10]
+    assert allocator.next_keys(1) == [11]
+    # one round trip per block, a request larger than a block reserves what it lacks
+    assert allocator.next_keys(25) == list(range(12, 37))
+    assert sequences.reservations == [10, 10, 16]
+    assert sequences.values == {'"CORE_DB".fact_trip_sk_seq': 36}
+
+
+def test_parallel_workers_never_get_the_same_key():
+    sequences = SequenceDatabase()
+    allocator = keys.KeyAllocator(sequences.connect, '"CORE_DB".fact_accident', block_size=50)
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        handed_out = list(executor.map(allocator.next_keys, [7] * 200))
+    all_keys = [key for block in handed_out for key in block]
+    assert len(all_keys) == len(set(all_keys)) == 1400
+    assert all(len(block) == 7 for block in handed_out)
+
+
+def test_allocators_of_one_table_share_its_sequence():
+    sequences = SequenceDatabase()
+    first = keys.KeyAllocator(sequences.connect, '"CORE_DB".dim_address', block_size=5)
+    second = keys.KeyAllocator(sequences.connect, '"CORE_DB".dim_address', block_size=5)
+    assert first.next_keys(2) == [1, 2]
+    assert second.next_keys(2) == [6, 7]
+    # the keys reserved by the first allocator are not handed out again
+    assert first.next_keys(4) == [3, 4, 5, 11]
+
+
+def test_unknown_table_has_no_sequence():
+    allocator = keys.KeyAllocator(SequenceDatabase().connect, '"CORE_DB".dim_date')
+    with pytest.raises(KeyError):
+        allocator.next_keys(1)
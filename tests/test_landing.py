@@ -0,0 +1,63 @@
+'''Tests of the landing module: conversion of a .csv file into a typed parquet file'''
+
+# Import necessary modules
+from decimal import Decimal
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+import pytest
+
+import landing
+
+CREATE_SQL = '''CREATE TABLE IF NOT EXISTS "SRC_DB".stg_src_sample (
+ID VARCHAR(32),
+Start_Lat DECIMAL(10,2),
+Origin_Lat DECIMAL(10,6),
+Duration DECIMAL(20,4),
+Severity INTEGER
+);'''
+
+TEXT_CREATE_SQL = '''CREATE TABLE IF NOT EXISTS "SRC_DB".stg_src_text (
+ID VARCHAR(32),
+Street VARCHAR(64)
+);'''
+
+
+def convert(tmp_path, body, create_sql=CREATE_SQL, header='ID,Start_Lat,Origin_Lat,Duration,Severity'):
+    csv_path = tmp_path / 'sample.csv'
+    csv_path.write_text(header + '\n' + body)
+    parquet_path = str(tmp_path / 'landing' / 'sample.parquet')
+    rows = landing.csv_to_parquet(str(csv_path), parquet_path, create_sql)
+    return rows, pq.read_table(parquet_path)
+
+
+def test_extra_fractional_digits_are_rounded_to_the_scale(tmp_path):
+    rows, table = convert(tmp_path, 'A-1,39.865147,38.9071923,12.34565,2\n'
+                                    'A-2,-84.005,-77.0368707,1,3\n'
+                                    'A-3,,,,\n')
+    assert rows == 3
+    assert table.schema == landing.arrow_schema(CREATE_SQL)
+    assert table.column('start_lat').to_pylist() == [Decimal('39.87'), Decimal('-84.01'), None]
+    assert table.column('origin_lat').to_pylist() == [Decimal('38.907192'), Decimal('-77.036871'), None]
+    assert table.column('duration').to_pylist() == [Decimal('12.3457'), Decimal('1.0000'), None]
+    assert not (tmp_path / 'landing' / 'sample.parquet.tmp').exists()
+
+
+def test_too_many_integer_digits_fail_like_copy(tmp_path):
+    with pytest.raises(pa.ArrowInvalid):
+        convert(tmp_path, 'A-1,123456789.5,1,1,1\n')
+
+
+def test_decimal_columns_are_parsed_wider_than_the_table():
+    schema = landing.parse_schema(CREATE_SQL)
+    assert schema.field('start_lat').type == pa.decimal128(38, 30)
+    assert schema.field('duration').type == pa.decimal128(38, 22)
+    assert schema.field('id').type == pa.string()
+
+
+def test_quoted_empty_string_is_kept_like_copy(tmp_path):
+    # COPY ... CSV loads a quoted "" as an empty string and only an unquoted empty field as NULL
+    rows, table = convert(tmp_path, '"A1",""\n"A2",\n', TEXT_CREATE_SQL, 'ID,Street')
+    assert rows == 2
+    assert table.column('id').to_pylist() == ['A1', 'A2']
+    assert table.column('street').to_pylist() == ['', None]
@@ -0,0 +1,152 @@
+'''Tests of the loaders module, with psycopg2 connections replaced by fakes'''
+
+# Import necessary modules
+import csv
+import io
+
+import pytest
+
+from conftest import FakeDatabase
+import loaders
+
+HEADER = 'ID,Description,Severity\n'
+
+# records with unique keys and quoted values spanning lines, quotes escaped as "" and commas
+RECORD_TEMPLATES = [
+    'A{}-1,"plain",2\n',
+    'A{}-2,"two\nlines",3\n',
+    'A{}-3,"escaped ""quote""\nand newline\n",1\n',
+    'A{}-4,"comma, inside",4\n',
+    'A{}-5,"""starts quoted""\n",2\n',
+    'A{}-6,no quotes,2\n',
+    'A{}-7,"three\nline\nvalue",3\n',
+    'A{}-8,"",1\n'
+]
+RECORDS = [record.format(copy) for copy in range(5) for record in RECORD_TEMPLATES]
+
+# primary key of the fake src table, as returned by pg_constraint
+PRIMARY_KEY = ('src_pkey', 'PRIMARY KEY (ID)')
+
+
+@pytest.fixture
+def source_file(tmp_path):
+    path = tmp_path / 'accidents.csv'
+    path.write_text(HEADER + ''.join(RECORDS), newline='')
+    return str(path)
+
+
+def parse(data):
+    return list(csv.reader(io.StringIO(data.decode('utf-8'), newline='')))
+
+
+@pytest.mark.parametrize('partitions', [1, 2, 3, 7, 40])
+@pytest.mark.parametrize('block_size', [5, 64, loaders.SCAN_BLOCK_SIZE])
+def test_split_points_never_cut_quoted_values(source_file, partitions, block_size):
+    points = loaders.find_split_points(source_file, partitions, block_size=block_size)
+    with open(source_file, 'rb') as source:
+        data = source.read()
+    assert points[0] == len(HEADER)
+    assert points[-1] == len(data)
+    assert points == sorted(set(points))
+    assert len(points) - 1 <= partitions
+    ranges = [parse(data[start:end]) for start, end in zip(points[:-1], points[1:])]
+    assert [row for rows in ranges for row in rows] == parse(data)[1:]
+
+
+class TableDatabase(FakeDatabase):
+    '''
+    A table with a primary key: the rows copied by a connection are pending until it commits;
+    the commit of the connection number fail_commit fails
+    '''
+
+    def __init__(self, fail_commit=None):
+        super(TableDatabase, self).__init__()
+        self.fail_commit = fail_commit
+        self.rows = []
+        self.pending = {}
+        self.primary_key = PRIMARY_KEY
+
+    def copy(self, cursor, sql, data):
+        rows = parse(data)
+        with self.lock:
+            if self.primary_key is not None:
+                # the COPY of a key still uncommitted in another transaction waits for that transaction
+                others = set(row[0] for conn, pending in self.pending.items() if conn is not cursor.conn
+                             for row in pending)
+                assert not others.intersection(row[0] for row in rows), 'COPY waits on the index entry of another range'
+            self.pending.setdefault(cursor.conn, []).extend(rows)
+        cursor.rowcount = len(rows)
+
+    def execute(self, cursor, sql, params):
+        if 'TRUNCATE' in sql:
+            # the TRUNCATE waits for the locks of every open transaction on the table
+            assert not [conn for conn in self.pending if not conn.closed]
+            self.rows = []
+        elif 'pg_constraint' in sql:
+            cursor.rows = [self.primary_key] if self.primary_key else []
+        elif 'DROP CONSTRAINT' in sql:
+            self.primary_key = None
+        elif 'ADD CONSTRAINT' in sql:
+            keys = [row[0] for row in self.rows]
+            if len(keys) != len(set(keys)):
+                raise RuntimeError('could not create unique index')
+            self.primary_key = PRIMARY_KEY
+
+    def commit(self, conn):
+        super(TableDatabase, self).commit(conn)
+        if conn.number == self.fail_commit:
+            raise RuntimeError('commit failed')
+        self.rows.extend(self.pending.pop(conn, []))
+
+    def rollback(self, conn):
+        super(TableDatabase, self).rollback(conn)
+        self.pending.pop(conn, None)
+
+
+def test_parallel_copy_loads_every_record(source_file):
+    db = TableDatabase()
+    stats = loaders.copy_from_file_parallel(db.connect, 'src', source_file, 4)
+    assert stats['rows'] == len(RECORDS)
+    assert len(db.rows) == len(RECORDS)
+    assert db.primary_key == PRIMARY_KEY
+    assert db.pending == {}
+    assert all(conn.closed for conn in db.conns)
+
+
+def test_failed_commit_releases_the_ranges_before_the_truncate(source_file):
+    db = TableDatabase(fail_commit=2)
+    with pytest.raises(RuntimeError):
+        loaders.copy_from_file_parallel(db.connect, 'src', source_file, 4)
+    assert loaders.TRUNCATE_TABLE_SQL.format('src') in db.executed
+    assert db.rows == []
+    assert db.primary_key == PRIMARY_KEY
+    assert all(conn.closed for conn in db.conns)
+
+
+def test_duplicate_key_in_two_ranges_fails_without_waiting(tmp_path):
+    path = tmp_path / 'duplicates.csv'
+    path.write_text(HEADER + ''.join(RECORDS[:8]) + ''.join(RECORDS[:8]), newline='')
+    db = TableDatabase()
+    with pytest.raises(RuntimeError, match='unique index'):
+        loaders.copy_from_file_parallel(db.connect, 'src', str(path), 2)
+    assert db.rows == []
+    assert db.primary_key == PRIMARY_KEY
+    assert all(conn.closed for conn in db.conns)
+
+
+def test_connections_opened_before_a_failed_connect_are_closed(source_file):
+    db = TableDatabase()
+    connect = db.connect
+
+    def failing_connect():
+        if len(db.conns) == 3 and not failing_connect.failed:
+            failing_connect.failed = True
+            raise RuntimeError('too many clients')
+        return connect()
+
+    failing_connect.failed = False
+
+    with pytest.raises(RuntimeError, match='too many clients'):
+        loaders.copy_from_file_parallel(failing_connect, 'src', source_file, 4)
+    assert db.conns and all(conn.closed for conn in db.conns)
+    assert db.primary_key == PRIMARY_KEY
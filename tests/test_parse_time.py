@@ -0,0 +1,45 @@
+'''Tests of the parse_time module, and the parse time budget of the DAG file'''
+
+# Import necessary modules
+import pytest
+
+import parse_time
+from conftest import DAG_DIR
+
+
+@pytest.fixture
+def dag_dir(tmp_path, monkeypatch):
+    # the modules of the tests do not need airflow
+    monkeypatch.setattr(parse_time, 'AIRFLOW_MODULES', ['json'])
+    (tmp_path / 'light_dag.py').write_text('import collections\n')
+    (tmp_path / 'slow_dag.py').write_text('import time\ntime.sleep(0.25)\n')
+    (tmp_path / 'heavy_dag.py').write_text('import numpy\n')
+    return str(tmp_path)
+
+
+def test_light_module_is_within_budget(dag_dir):
+    passed, median_ms, heavy = parse_time.check_parse_time(100, runs=3, dag_dir=dag_dir, dag_module='light_dag')
+    assert passed
+    assert median_ms < 100
+    assert heavy == []
+
+
+def test_slow_module_is_over_budget(dag_dir):
+    passed, median_ms, _ = parse_time.check_parse_time(100, runs=1, dag_dir=dag_dir, dag_module='slow_dag')
+    assert not passed
+    assert median_ms >= 250
+
+
+def test_heavy_module_fails_whatever_the_budget(dag_dir):
+    pytest.importorskip('numpy')
+    passed, _, heavy = parse_time.check_parse_time(10 ** 6, runs=1, dag_dir=dag_dir, dag_module='heavy_dag')
+    assert not passed
+    assert heavy == ['numpy']
+
+
+def test_dag_file_parses_within_budget():
+    pytest.importorskip('airflow')
+    passed, median_ms, heavy = parse_time.check_parse_time(parse_time.DEFAULT_BUDGET_MS, dag_dir=DAG_DIR)
+    assert heavy == []
+    assert passed, 'the DAG file parses in {:.1f} ms, over the budget of {} ms'.format(
+        median_ms, parse_time.DEFAULT_BUDGET_MS)
@@ -0,0 +1,66 @@
+'''Tests of the partitions module: period math and the migration of an unpartitioned fact table'''
+
+# Import necessary modules
+import pytest
+
+from conftest import FakeDatabase
+import partitions
+
+
+@pytest.mark.parametrize('period, grain, bounds', [
+    (2019, 'year', (20190000, 20200000)),
+    (201903, 'month', (20190300, 20190400)),
+    (201912, 'month', (20191200, 20200100)),
+    (202001, 'month', (20200100, 20200200))
+])
+def test_period_bounds(period, grain, bounds):
+    assert partitions.period_bounds(period, grain) == bounds
+
+
+@pytest.mark.parametrize('grain', ['year', 'month'])
+def test_every_date_key_falls_in_the_bounds_of_its_period(grain):
+    divisor = partitions.period_divisor(grain)
+    for date_key in (20190101, 20190228, 20190331, 20191130, 20191201, 20191231, 20200101):
+        low, high = partitions.period_bounds(date_key // divisor, grain)
+        assert low <= date_key < high
+
+
+def test_month_periods_are_contiguous():
+    months = [year * 100 + month for year in (2019, 2020) for month in range(1, 13)]
+    bounds = [partitions.period_bounds(month, 'month') for month in months]
+    assert all(high == next_low for (_, high), (next_low, _) in zip(bounds, bounds[1:]))
+
+
+def test_partition_name():
+    assert partitions.partition_name('"CORE_DB".fact_accident', 201903) == '"CORE_DB".fact_accident_201903'
+
+
+class CatalogDatabase(FakeDatabase):
+    '''Whether the unpartitioned fact table exists, and the periods of its rows'''
+
+    def __init__(self, unpartitioned_exists, periods):
+        super(CatalogDatabase, self).__init__()
+        self.unpartitioned_exists = unpartitioned_exists
+        self.periods = periods
+
+    def execute(self, cursor, sql, params):
+        cursor.rows = [(self.unpartitioned_exists,)] if 'TO_REGCLASS' in sql.upper() else [(p,) for p in self.periods]
+
+
+def test_migration_lists_the_columns_and_moves_the_sequence():
+    db = CatalogDatabase(True, [2019, 2020])
+    partitions.migrate_unpartitioned(db.connect().cursor(), '"CORE_DB".fact_trip')
+    migration = db.executed[-1]
+    assert '"CORE_DB".fact_trip_2019 PARTITION OF' in db.executed[-3]
+    assert 'SELECT *' not in migration
+    assert 'INSERT INTO "CORE_DB".fact_trip (trip_sk, provider_fk, ' in migration
+    assert ', last_updt_user) SELECT trip_sk, ' in migration
+    # the sequence is moved after the rows are in the partitioned table
+    assert migration.index('SETVAL') > migration.index('INSERT INTO')
+    assert "SETVAL('\"CORE_DB\".fact_trip_sk_seq', MAX(Trip_SK))" in migration
+
+
+def test_no_migration_without_an_unpartitioned_table():
+    db = CatalogDatabase(False, [])
+    partitions.migrate_unpartitioned(db.connect().cursor(), '"CORE_DB".fact_accident')
+    assert len(db.executed) == 1
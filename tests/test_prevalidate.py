@@ -0,0 +1,84 @@
+'''Tests of the prevalidate module: checks of a source file against its src table and the clean .csv it writes back'''
+
+# Import necessary modules
+import csv
+import io
+
+import pandas as pd
+
+import prevalidate
+import schemas
+
+CREATE_SQL = '''CREATE TABLE IF NOT EXISTS "SRC_DB".stg_src_sample (
+ID VARCHAR(8),
+Street VARCHAR(20),
+Severity INTEGER,
+Start_Time TIMESTAMP,
+Amount DECIMAL(5,2),
+PRIMARY KEY (ID)
+);'''
+
+SOURCE = ('ID,Street,Severity,Start_Time,Amount\n'
+          'A-1,"",2,2020-01-01 10:00:00,1.50\n'
+          'A-2,,3,2020-01-02 11:00:00,\n'
+          'A-3,"Main St, 1",1,2020-01-03 12:00:00,2.25\n'
+          'A-4,"a ""quoted""\nstreet",x,2020-01-04 13:00:00,3\n'
+          'A-5,This street is far too long,2,2020-01-05 14:00:00,4\n'
+          'A-6,Side St,2,not a time,12345\n'
+          'A-1,Dup St,2,2020-01-06 15:00:00,5\n'
+          ',No Key,2,2020-01-07 16:00:00,6\n')
+
+
+def run(tmp_path, memory_budget=prevalidate.readers.DEFAULT_MEMORY_BUDGET):
+    csv_path = tmp_path / 'sample.csv'
+    csv_path.write_text(SOURCE, newline='')
+    reject_path = tmp_path / 'rejects' / 'sample.csv.rejects.csv'
+    validator = prevalidate.PreLoadValidator(CREATE_SQL)
+    clean = b''.join(validator.iter_clean_csv(str(csv_path), str(reject_path), memory_budget))
+    with open(str(reject_path), newline='') as reject_file:
+        rejects = {row['id']: row['reject_reason'] for row in csv.DictReader(reject_file)}
+    return validator, clean.decode('utf-8'), rejects
+
+
+def test_rows_failing_a_check_go_to_the_reject_file(tmp_path):
+    validator, clean, rejects = run(tmp_path)
+    assert validator.rows == 8
+    assert validator.rejected == 5
+    assert rejects == {
+        'A-4': 'bad_integer:severity;',
+        'A-5': 'too_long:street;',
+        'A-6': 'bad_timestamp:start_time;bad_decimal:amount;',
+        'A-1': 'pk_duplicate;',
+        '': 'pk_null;'
+    }
+    assert [row[0] for row in csv.reader(io.StringIO(clean, newline=''))] == ['A-1', 'A-2', 'A-3']
+
+
+def test_quoted_empty_string_stays_apart_from_null(tmp_path):
+    _, clean, _ = run(tmp_path)
+    lines = clean.splitlines()
+    # COPY ... CSV loads "" as an empty string and an empty unquoted value as NULL
+    assert lines[0].split(',')[1] == '""'
+    assert lines[1].split(',')[1] == ''
+    assert lines[1].endswith(',')
+    assert lines[2].split(',', 1)[1].startswith('"Main St, 1"')
+
+
+def test_duplicates_are_found_across_chunks(tmp_path, monkeypatch):
+    monkeypatch.setattr(prevalidate.readers, 'MIN_CHUNK_ROWS', 1)
+    validator, clean, rejects = run(tmp_path, memory_budget=1)
+    assert validator.rejected == 5
+    assert rejects['A-1'] == 'pk_duplicate;'
+    assert clean == run(tmp_path)[1]
+
+
+def test_integer_literals_need_no_fraction_or_exponent():
+    column = schemas.table_columns(CREATE_SQL)[2]
+    values = pd.Series(['1', ' -2 ', '+3', '1.0', '1e3', '2147483648', None], dtype=object)
+    assert list(prevalidate.invalid_values(values, column)) == [False, False, False, True, True, True, False]
+
+
+def test_decimals_are_rounded_to_the_scale_before_the_precision_check():
+    column = schemas.table_columns(CREATE_SQL)[4]
+    values = pd.Series(['999.99', '999.994', '999.995', '-999.999', '1e2', None], dtype=object)
+    assert list(prevalidate.invalid_values(values, column)) == [False, False, True, True, False, False]
@@ -0,0 +1,53 @@
+'''Tests of the readers module: chunks of the text of a source file sized to a memory budget'''
+
+# Import necessary modules
+import pytest
+
+import readers
+
+CREATE_SQL = '''CREATE TABLE IF NOT EXISTS "SRC_DB".stg_src_sample (
+ID VARCHAR(8),
+Type VARCHAR(20),
+Start_Time TIMESTAMP,
+Start_Lat DECIMAL(10,6),
+Amount DECIMAL(10,2),
+Severity INTEGER,
+Amenity BOOLEAN
+);'''
+
+
+@pytest.fixture
+def source_file(tmp_path):
+    lines = ['ID,Type,Start_Time,Start_Lat,Amount,Severity,Amenity']
+    for number in range(50):
+        lines.append('A-{0},{1},2020-01-01 10:{2:02d}:00,39.{0},{0}.5,{3},{4}'.format(
+            number, 'taxi' if number % 2 else '""', number % 60, number % 4 if number % 5 else '', 'true'))
+    path = tmp_path / 'sample.csv'
+    path.write_text('\n'.join(lines) + '\n')
+    return str(path)
+
+
+def test_chunks_fit_the_memory_budget(source_file, monkeypatch):
+    monkeypatch.setattr(readers, 'MIN_CHUNK_ROWS', 1)
+    sample = readers.ChunkedReader(source_file, CREATE_SQL)
+    bytes_per_row = next(sample.chunks(50)).memory_usage(deep=True, index=False).sum() / 50.0
+    reader = readers.ChunkedReader(source_file, CREATE_SQL, memory_budget=int(bytes_per_row * 12))
+    chunks = list(reader)
+    assert reader.metrics['chunk_rows'] in (11, 12)
+    assert [len(chunk) for chunk in chunks[:-1]] == [reader.metrics['chunk_rows']] * (len(chunks) - 1)
+    assert reader.metrics['chunks'] == len(chunks)
+    assert reader.metrics['rows'] == sum(len(chunk) for chunk in chunks) == 50
+    assert 0 < reader.metrics['max_chunk_bytes']
+    assert reader.metrics['peak_rss_bytes'] > 0
+
+
+def test_small_budget_keeps_the_minimum_chunk_rows(source_file):
+    reader = readers.ChunkedReader(source_file, CREATE_SQL, memory_budget=1)
+    assert reader.chunk_rows() == readers.MIN_CHUNK_ROWS
+
+
+def test_quoted_empty_strings_stay_apart_from_null(source_file):
+    chunk = next(iter(readers.ChunkedReader(source_file, CREATE_SQL)))
+    assert chunk['type'].tolist()[:2] == ['', 'taxi']
+    assert chunk['severity'].isna().sum() == 10
+    assert chunk['amount'].tolist()[:2] == ['0.5', '1.5']
@@ -0,0 +1,84 @@
+'''Tests of the row_counts module, with the tables of postgres replaced by a fake'''
+
+# Import necessary modules
+from conftest import FakeDatabase
+import row_counts
+from row_counts import RowCount
+from SQLs import ESTIMATE_ROW_CNT_SQL, PROBE_ROW_CNT_SQL
+
+
+class TablesDatabase(FakeDatabase):
+    '''Tables with their actual rows and their catalog estimate; records the queries run per table'''
+
+    def __init__(self, tables):
+        super(TablesDatabase, self).__init__()
+        self.tables = tables
+        self.queries = []
+        self.released = []
+
+    def release(self, conn):
+        with self.lock:
+            self.released.append(conn)
+
+    def execute(self, cursor, sql, params):
+        for table, (rows, estimate) in self.tables.items():
+            if sql == ESTIMATE_ROW_CNT_SQL.format(table):
+                cursor.rows = [(estimate,)]
+            elif sql == PROBE_ROW_CNT_SQL.format(table):
+                cursor.rows = [(min(rows, params['limit']),)]
+            else:
+                continue
+            with self.lock:
+                self.queries.append((table, 'probe' if params else 'estimate'))
+            return
+        raise AssertionError('unexpected query ' + sql)
+
+
+def test_estimate_well_over_the_minimum_is_taken_without_a_probe():
+    db = TablesDatabase({'t_big': (5000, 5000.0)})
+    assert row_counts.query_row_count(db.connect, 't_big', 1000) == RowCount(5000, row_counts.ESTIMATE)
+    assert db.queries == [('t_big', 'estimate')]
+
+
+def test_estimate_near_the_minimum_is_probed():
+    db = TablesDatabase({'t_near': (1200, 1040.0), 't_stale': (900, 0.0)})
+    assert row_counts.query_row_count(db.connect, 't_near', 1000) == RowCount(1000, row_counts.PROBE)
+    assert row_counts.query_row_count(db.connect, 't_stale', 1000) == RowCount(900, row_counts.PROBE)
+    assert db.queries == [('t_near', 'estimate'), ('t_near', 'probe'), ('t_stale', 'estimate'), ('t_stale', 'probe')]
+
+
+def test_connections_are_released_or_closed():
+    db = TablesDatabase({'t_one': (10, 10.0)})
+    row_counts.query_row_count(db.connect, 't_one', 5, release=db.release)
+    assert len(db.released) == 1 and not db.released[0].closed
+    conns = []
+    row_counts.query_row_count(lambda: conns.append(db.connect()) or conns[-1], 't_one', 5)
+    assert conns[0].closed
+
+
+def test_loaded_rows_are_used_when_exact_or_over_the_minimum():
+    db = TablesDatabase({'t_src': (0, 0.0), 't_core': (0, 0.0), 't_core_low': (800, 1000.0), 't_unloaded': (50, 0.0)})
+    minimums = {'t_src': 100, 't_core': 100, 't_core_low': 500, 't_unloaded': 10}
+    loaded = {'t_src': (40, True), 't_core': (150, False), 't_core_low': (20, False)}
+    counts = row_counts.row_counts(db.connect, minimums, loaded, workers=2, release=db.release)
+    assert counts == {
+        't_src': RowCount(40, row_counts.LOADED),
+        't_core': RowCount(150, row_counts.LOADED_LOWER_BOUND),
+        't_core_low': RowCount(1000, row_counts.ESTIMATE),
+        't_unloaded': RowCount(10, row_counts.PROBE)
+    }
+    assert sorted(set(table for table, _ in db.queries)) == ['t_core_low', 't_unloaded']
+
+
+def test_only_exact_counts_are_exact():
+    assert row_counts.is_exact(RowCount(40, row_counts.LOADED))
+    assert row_counts.is_exact(RowCount(40, row_counts.PREVIOUS_RUN))
+    for method in (row_counts.LOADED_LOWER_BOUND, row_counts.ESTIMATE, row_counts.PROBE):
+        assert not row_counts.is_exact(RowCount(40, method))
+
+
+def test_no_query_when_every_table_was_loaded():
+    db = TablesDatabase({})
+    counts = row_counts.row_counts(db.connect, {'t_src': 10}, {'t_src': (12, True)})
+    assert counts == {'t_src': RowCount(12, row_counts.LOADED)}
+    assert db.queries == []
@@ -0,0 +1,107 @@
+'''Tests of the schema_deploy module, with the database replaced by a fake'''
+
+# Import necessary modules
+import hashlib
+
+import pytest
+
+from conftest import FakeDatabase
+import schema_deploy
+from schema_deploy import TableDDL
+from SQLs import (CREATE_TABLE_ETL_SCHEMA_VERSION_SQL, SCHEMA_DEPLOY_LOCK_SQL, SCHEMA_VERSIONS_SQL,
+                  SAVE_SCHEMA_VERSION_SQL, TABLE_EXISTS_SQL)
+
+SCHEMA = [
+    TableDDL('"CORE_DB".dim_one', 'CREATE TABLE IF NOT EXISTS "CORE_DB".dim_one (ID INTEGER);'),
+    TableDDL('"CORE_DB".dim_two', 'CREATE TABLE IF NOT EXISTS "CORE_DB".dim_two (ID INTEGER);')
+]
+
+
+class LedgerDatabase(FakeDatabase):
+    '''The schema version ledger, the tables which exist, the DDL run; the DDL fail_sql fails'''
+
+    def __init__(self, versions=None, tables=(), fail_sql=None):
+        super(LedgerDatabase, self).__init__()
+        self.versions = dict(versions or {})
+        self.committed_versions = dict(self.versions)
+        self.tables = set(tables)
+        self.fail_sql = fail_sql
+        self.ddl = []
+
+    def commit(self, conn):
+        super(LedgerDatabase, self).commit(conn)
+        self.committed_versions = dict(self.versions)
+
+    def rollback(self, conn):
+        super(LedgerDatabase, self).rollback(conn)
+        self.versions = dict(self.committed_versions)
+
+    def execute(self, cursor, sql, params):
+        if sql == SCHEMA_VERSIONS_SQL:
+            cursor.rows = list(self.versions.items())
+        elif sql == SAVE_SCHEMA_VERSION_SQL:
+            self.versions[params['object_name']] = params['checksum']
+        elif sql.startswith(TABLE_EXISTS_SQL.split('{')[0]):
+            cursor.rows = [(sql.split("'")[1] in self.tables,)]
+        elif sql not in (SCHEMA_DEPLOY_LOCK_SQL, CREATE_TABLE_ETL_SCHEMA_VERSION_SQL):
+            if sql == self.fail_sql:
+                raise RuntimeError('syntax error')
+            self.ddl.append(sql)
+
+
+def test_checksum_is_the_md5_of_the_ddl():
+    assert schema_deploy.checksum('CREATE TABLE t (ID INTEGER);') == \
+        hashlib.md5(b'CREATE TABLE t (ID INTEGER);').hexdigest()
+    assert schema_deploy.checksum(SCHEMA[0].sql) != schema_deploy.checksum(SCHEMA[0].sql + ' ')
+
+
+def test_first_versioned_deployment_runs_and_records_every_ddl():
+    db = LedgerDatabase()
+    timings = schema_deploy.deploy(db.connect(), SCHEMA, versioned=True)
+    assert sorted(timings) == ['"CORE_DB".dim_one', '"CORE_DB".dim_two']
+    assert db.ddl == [ddl.sql for ddl in SCHEMA]
+    assert db.committed_versions == dict((ddl.table.lower(), schema_deploy.checksum(ddl.sql)) for ddl in SCHEMA)
+    assert db.commits == 1
+
+
+def test_current_schema_runs_no_ddl():
+    versions = dict((ddl.table.lower(), schema_deploy.checksum(ddl.sql)) for ddl in SCHEMA)
+    db = LedgerDatabase(versions, tables=[ddl.table for ddl in SCHEMA])
+    assert schema_deploy.deploy(db.connect(), SCHEMA, versioned=True) == {}
+    assert db.ddl == []
+
+
+def test_changed_or_missing_tables_run_their_ddl_again():
+    changed = SCHEMA[1]._replace(sql=SCHEMA[1].sql.replace('(ID INTEGER)', '(ID INTEGER, Name VARCHAR(10))'))
+    versions = dict((ddl.table.lower(), schema_deploy.checksum(ddl.sql)) for ddl in SCHEMA)
+    # dim_one is current but was dropped, dim_two exists but its DDL changed
+    db = LedgerDatabase(versions, tables=['"CORE_DB".dim_two'])
+    timings = schema_deploy.deploy(db.connect(), [SCHEMA[0], changed], versioned=True)
+    assert sorted(timings) == ['"CORE_DB".dim_one', '"CORE_DB".dim_two']
+    assert db.committed_versions['"core_db".dim_two'] == schema_deploy.checksum(changed.sql)
+
+
+def test_unversioned_deployment_always_runs_and_records_nothing():
+    db = LedgerDatabase(tables=[ddl.table for ddl in SCHEMA])
+    schema_deploy.deploy(db.connect(), SCHEMA)
+    schema_deploy.deploy(db.connect(), SCHEMA)
+    assert db.ddl == [ddl.sql for ddl in SCHEMA] * 2
+    assert db.committed_versions == {}
+
+
+def test_failed_ddl_rolls_the_whole_deployment_back():
+    db = LedgerDatabase(fail_sql=SCHEMA[1].sql)
+    with pytest.raises(RuntimeError):
+        schema_deploy.deploy(db.connect(), SCHEMA, versioned=True)
+    assert db.rollbacks == 1
+    assert db.commits == 0
+    assert db.committed_versions == {}
+
+
+def test_registries_cover_every_table_once():
+    for schema in (schema_deploy.CORE_SCHEMA, schema_deploy.STAGE_SCHEMA):
+        tables = [ddl.table.lower() for ddl in schema]
+        assert len(tables) == len(set(tables))
+        assert all(ddl.table.split('.')[1].lower() in ddl.sql.lower() for ddl in schema)
+    assert len(schema_deploy.CORE_SCHEMA) == 12
+    assert len(schema_deploy.STAGE_SCHEMA) == 11